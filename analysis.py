@@ -1,61 +1,48 @@
-import pandas as pd
-import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
-import ast
+import experiments.aggregate as aggregate
 
 sns.set_style("whitegrid")
 
-def plot_adaptation_times():
-    x = []
-    y = []
-    err = []
-    for c in [0.5,1.5,2.5,3.5,4.5,5.5,6.5,7.5,8.5,25,45]:#[1,2,3,4,5,6,7,8,9,15,25,45]
-        df = pd.read_csv(f'results/exp1/exp1_0.7/speed_0.002/exp1_{c}.csv')
-        df["adapted"] = df["adapted"].astype(int)
-        x.append(c)
-        y.append(df["adaptation_time"].mean())
-        err.append(df["adaptation_time"].std())
+# Written by storage.NpyWriter, older CSV results can be converted with python -m experiments.storage
+EXP1_PATH_FORMAT = 'results/exp1/exp1_0.7/speed_0.002/exp1_{communication_range}'
+COMMUNICATION_RANGES = [0.5,1.5,2.5,3.5,4.5,5.5,6.5,7.5,8.5,25,45]#[1,2,3,4,5,6,7,8,9,15,25,45]
+STATE_LABELS = [("Uncommitted", "black"), ("Orange", "sandybrown"), ("Blue", "lightskyblue")]
+
+def plot_adaptation_times(cells, key="communication_range", xlabel='Communication Range'):
+    """
+    params:
+      cells: (List : Tuple) params and summary of each cell, from aggregate.summarise_sweep_scalars
+    """
+    x = [params[key] for params, _ in cells]
+    y = [summary["mean"] for _, summary in cells]
+    # Asymmetric error bars from the bootstrap confidence interval
+    err = [[summary["mean"] - summary["lower"] for _, summary in cells], [summary["upper"] - summary["mean"] for _, summary in cells]]
 
     fig, ax = plt.subplots()
     eb = ax.errorbar(range(len(x)), y, err, linestyle='None', marker='^')
     eb[-1][0].set_linestyle('--')
-    ax.set(xlabel='Communication Range', ylabel='Average Adaptation Time')
+    ax.set(xlabel=xlabel, ylabel='Average Adaptation Time')
     plt.xticks(range(len(x)), x)
     plt.show()
 
-def plot_average_opinion(c):
-    df = pd.read_csv(f'results/exp1/exp1_0.7/speed_0.002/exp1_{c}.csv')
-    test = df["state_history"]
-    test = np.array([np.array(ast.literal_eval(i)) for i in test], dtype=object)
-    #col_history = df["color_history"].iloc[0]
-    #col_history = np.array(ast.literal_eval(col_history))[:,0]
-    max_length = 0
-    for i in test:
-        if i.shape[0] > max_length:
-            max_length = i.shape[0]
-    print(max_length)
-    for ind, i in enumerate(test):
-        print(i.shape)
-        if len(i) < max_length:
-            test[ind] = np.append(i, np.array([[0,50,0] for j in range(max_length - i.shape[0])]),0)
-    #col_history = np.append(col_history, np.array([0.8 for j in range(max_length - col_history.shape[0])]),0)
-    x = np.arange(0, max_length * 2, 2)
-    y0 = (np.sum(test)[:,0] / 30) / 50
-    y1 = (np.sum(test)[:,1] / 30) / 50
-    y2 = (np.sum(test)[:,2] / 30) / 50
-    #y3 = col_history
+def plot_average_opinion(summary, title=None):
+    """
+    params:
+      summary: (Dict) state_history summary from aggregate.summarise_history
+    """
     fig, ax = plt.subplots()
-    ax.plot(x, y0, label="Uncommitted", color="black")
-    ax.plot(x, y1, label="Orange", color="sandybrown")
-    ax.plot(x, y2, label="Blue", color="lightskyblue")
-    #ax.plot(x, y3, label="Orange Square Proportion", color="sandybrown", linestyle="--")
+    for state, (label, colour) in enumerate(STATE_LABELS):
+        ax.plot(summary["time"], summary["mean"][:, state], label=label, color=colour)
+        ax.fill_between(summary["time"], summary["lower"][:, state], summary["upper"][:, state], color=colour, alpha=0.3)
     ax.legend()
-    ax.set(xlabel='Time (seconds)', ylabel='Average state proportion')
+    ax.set(xlabel='Time', ylabel='Average state proportion',
+           title=title or f'{summary["replicates"]} replicates of {summary["robots"]} robots')
     plt.show()
 
-plot_average_opinion(0.5)
-#plot_average_opinion(6.5)
-plot_average_opinion(45)
+if __name__ == "__main__":
+    for c in [0.5, 45]:
+        plot_average_opinion(aggregate.summarise_history(EXP1_PATH_FORMAT.format(communication_range=c)), f'Communication range {c}')
 
-plot_adaptation_times()
+    cells = [{"communication_range": c} for c in COMMUNICATION_RANGES]
+    plot_adaptation_times(aggregate.summarise_sweep_scalars(EXP1_PATH_FORMAT, cells, "adaptation_time"))
@@ -0,0 +1,56 @@
+import time
+import benchmarks.common as common
+
+
+def ticks_per_second(environment):
+    start = time.perf_counter()
+    environment.run()
+    return environment.time / (time.perf_counter() - start)
+
+
+class SwarmSize:
+    """
+    Cost of Environment.run as the number of robots grows
+    """
+    params = [common.ENGINES, [10, 50, 200]]
+    param_names = ["engine", "num_robots"]
+
+    def setup(self, engine, num_robots):
+        self.environment = common.make_environment(engine, num_robots=num_robots)
+
+    def track_ticks_per_second(self, engine, num_robots):
+        return ticks_per_second(self.environment)
+    track_ticks_per_second.unit = "ticks/s"
+
+    def peakmem_run(self, engine, num_robots):
+        self.environment.run()
+
+
+class GridSize:
+    """
+    Cost of Environment.run as the grid grows
+    """
+    params = [common.ENGINES, [(20, 40), (40, 80), (80, 160)]]
+    param_names = ["engine", "grid_size"]
+
+    def setup(self, engine, grid_size):
+        self.environment = common.make_environment(engine, grid_size=grid_size)
+
+    def track_ticks_per_second(self, engine, grid_size):
+        return ticks_per_second(self.environment)
+    track_ticks_per_second.unit = "ticks/s"
+
+
+class CommunicationRange:
+    """
+    Cost of Environment.run as the communication range grows, i.e. as more robots hear each broadcast
+    """
+    params = [common.ENGINES, [0, 0.5, 2, 6, 20]]
+    param_names = ["engine", "communication_range"]
+
+    def setup(self, engine, communication_range):
+        self.environment = common.make_environment(engine, communication_range=communication_range)
+
+    def track_ticks_per_second(self, engine, communication_range):
+        return ticks_per_second(self.environment)
+    track_ticks_per_second.unit = "ticks/s"
@@ -0,0 +1,42 @@
+from dataclasses import replace
+import experiment_objects.Environment as e
+import experiments.experiment1 as e1
+import experiments.experiment2 as e2
+
+
+class Experiment1Replicate:
+    """
+    Wall time of one full replicate of experiment1's configuration
+    """
+    params = [["swarm", "event"]]
+    param_names = ["engine"]
+    repeat = 1
+    timeout = 1200
+
+    def setup(self, engine):
+        self.environment = e.Environment(replace(e1.environment_config({"communication_range": e1.COMMUNICATION_RANGE}), engine=engine), 0)
+
+    def time_replicate(self, engine):
+        self.environment.run()
+
+    def peakmem_replicate(self, engine):
+        self.environment.run()
+
+
+class Experiment2Replicate:
+    """
+    Wall time of one full replicate of experiment2's configuration, with gradual change
+    """
+    params = [["swarm", "event"], [1, 15, 45]]
+    param_names = ["engine", "sample_len"]
+    repeat = 1
+    timeout = 1200
+
+    def setup(self, engine, sample_len):
+        self.environment = e.Environment(replace(e2.environment_config({"sample_len": sample_len}), engine=engine), 0)
+
+    def time_replicate(self, engine, sample_len):
+        self.environment.run()
+
+    def peakmem_replicate(self, engine, sample_len):
+        self.environment.run()
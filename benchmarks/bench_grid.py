@@ -0,0 +1,23 @@
+import random
+import experiment_objects.Environment as e
+
+
+class Grid:
+    """
+    Creating a grid, and shifting its colour proportions as gradual change does
+    """
+    params = [[(20, 40), (100, 200), (500, 1000)]]
+    param_names = ["grid_size"]
+
+    def setup(self, grid_size):
+        self.rng = random.Random(0)
+        self.grid = e.create_grid(grid_size, [0.8, 0.2], self.rng)
+
+    def time_create_grid(self, grid_size):
+        e.create_grid(grid_size, [0.8, 0.2], self.rng)
+
+    def time_update_grid(self, grid_size):
+        e.update_grid(self.grid, [0.7, 0.3], self.rng)
+
+    def peakmem_create_grid(self, grid_size):
+        e.create_grid(grid_size, [0.8, 0.2], self.rng)
@@ -0,0 +1,43 @@
+import numpy as np
+import experiment_objects.SpatialIndex as si
+import benchmarks.common as common
+
+
+class FindAllNeighbours:
+    """
+    Robot.find_all_neighbours for every robot, with each spatial index
+    """
+    params = [["CellList", "KDTree", "BruteForce"], [50, 200, 1000], [2, 6]]
+    param_names = ["index", "num_robots", "communication_range"]
+
+    def setup(self, index, num_robots, communication_range):
+        if index == "KDTree" and si.cKDTree is None:
+            raise NotImplementedError("scipy is not installed")
+        self.environment = common.make_environment("robot", num_robots=num_robots, communication_range=communication_range)
+        positions = [robot.position for robot in self.environment.robots]
+        if index == "CellList":
+            self.environment.neighbour_index = si.CellList(communication_range, positions)
+        elif index == "KDTree":
+            self.environment.neighbour_index = si.KDTree(communication_range, positions)
+        else:
+            self.environment.neighbour_index = si.BruteForce(num_robots, communication_range)
+
+    def time_find_all_neighbours(self, index, num_robots, communication_range):
+        robots = self.environment.robots
+        for robot in robots:
+            robot.find_all_neighbours(robots)
+
+
+class FindPairs:
+    """
+    Vectorized neighbour search of the swarm engine, every robot broadcasting
+    """
+    params = [[50, 200, 1000], [2, 6]]
+    param_names = ["num_robots", "communication_range"]
+
+    def setup(self, num_robots, communication_range):
+        self.positions = np.random.default_rng(0).uniform((0, 0), common.c.GRID_SIZE, (num_robots, 2))
+        self.senders = np.arange(num_robots)
+
+    def time_find_pairs(self, num_robots, communication_range):
+        si.find_pairs(self.positions, self.senders, communication_range, common.c.GRID_SIZE)
@@ -0,0 +1,29 @@
+import experiment_objects.Robot as r
+import benchmarks.common as common
+
+# Ticks each step benchmark runs for
+NUM_STEP_TICKS = 100
+
+
+class RobotClass:
+    """
+    Robot against the slotted CompactRobot of the "compact" engine: cost of stepping every robot and
+    memory of the robots' state
+    """
+    params = [["robot", "compact"], [50, 1000]]
+    param_names = ["engine", "num_robots"]
+
+    def setup(self, engine, num_robots):
+        self.environment = common.make_environment(engine, num_robots=num_robots)
+        self.robot_class = r.CompactRobot if engine == "compact" else r.Robot
+
+    def time_step(self, engine, num_robots):
+        environment = self.environment
+        for _ in range(NUM_STEP_TICKS):
+            environment.step()
+            environment.time += environment.interval
+
+    def peakmem_robots(self, engine, num_robots):
+        # The robots share the global random module, so only their own state is measured
+        config = self.environment.config.robot
+        self.robots = [self.robot_class(i, self.environment, config) for i in range(num_robots)]
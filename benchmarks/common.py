@@ -0,0 +1,22 @@
+"""
+Helpers shared by the benchmarks. Benchmarks follow the asv conventions: classes with optional
+params/param_names and setup, whose time_, peakmem_ and track_ methods are measured by
+benchmarks.run (or asv itself).
+"""
+import experiment_objects.Config as c
+import experiment_objects.Environment as e
+import experiment_objects.Kernels as k
+
+# Ticks each scaling benchmark runs for
+NUM_TICKS = 1000
+# Engines benchmarked, the compiled engine only when its kernels are compiled
+ENGINES = ["robot", "swarm", "event", "compact"] + (["compiled"] if k.njit is not None else [])
+
+
+def make_environment(engine, num_robots=c.NUM_ROBOTS, grid_size=tuple(c.GRID_SIZE), communication_range=c.COMMUNICATION_RANGE, num_ticks=NUM_TICKS):
+    """
+    Environment with the default configuration apart from the given values, that never stops early
+    """
+    robot = c.RobotConfig(communication_range=communication_range, grid_size=grid_size)
+    config = c.EnvironmentConfig(grid_size=grid_size, num_robots=num_robots, robot=robot, experiment_length=num_ticks, engine=engine)
+    return e.Environment(config, seed=0, stopping=[])
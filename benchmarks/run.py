@@ -0,0 +1,196 @@
+import argparse
+import contextlib
+import datetime
+import importlib
+import inspect
+import io
+import itertools
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, "results")
+# Benchmark modules, in the order they are run
+MODULES = ["bench_grid", "bench_neighbours", "bench_robot", "bench_environment", "bench_experiments"]
+# Prefixes of the methods that are benchmarks, as in asv
+KINDS = ("time_", "peakmem_", "track_")
+DEFAULT_REPEAT = 3
+
+
+def discover(pattern=None):
+    """
+    Find every benchmark
+    params:
+      pattern: (str) regular expression the full name of a benchmark must contain
+    return: (List : Tuple) name, class, method name and parameter values of each benchmark
+    """
+    benchmarks = []
+    for module_name in MODULES:
+        module = importlib.import_module(f"benchmarks.{module_name}")
+        for class_name, cls in inspect.getmembers(module, inspect.isclass):
+            if cls.__module__ != module.__name__:
+                continue
+            params = getattr(cls, "params", [])
+            param_names = getattr(cls, "param_names", [])
+            for method in sorted(name for name in vars(cls) if name.startswith(KINDS)):
+                for values in itertools.product(*params):
+                    arguments = ", ".join(f"{name}={value!r}" for name, value in zip(param_names, values))
+                    name = f"{module_name}.{class_name}.{method}({arguments})"
+                    if pattern is None or re.search(pattern, name):
+                        benchmarks.append((name, cls, method, values))
+    return benchmarks
+
+
+def measure(cls, method, values, repeat):
+    """
+    Run one benchmark, calling setup before every repeat. Output of the simulation is discarded.
+    return: (Dict) samples, their median, unit and whether higher values are better
+    """
+    function = getattr(cls, method)
+    kind = method.split("_")[0]
+    repeat = 1 if kind == "peakmem" else getattr(cls, "repeat", repeat)
+    samples = []
+    for _ in range(repeat):
+        benchmark = cls()
+        with contextlib.redirect_stdout(io.StringIO()):
+            if hasattr(benchmark, "setup"):
+                benchmark.setup(*values)
+            bound = getattr(benchmark, method)
+            if kind == "time":
+                start = time.perf_counter()
+                bound(*values)
+                samples.append(time.perf_counter() - start)
+            elif kind == "peakmem":
+                tracemalloc.start()
+                bound(*values)
+                samples.append(tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+            else:
+                samples.append(float(bound(*values)))
+            if hasattr(benchmark, "teardown"):
+                benchmark.teardown(*values)
+    unit = {"time": "s", "peakmem": "bytes"}.get(kind, getattr(function, "unit", ""))
+    return {"value": statistics.median(samples), "samples": samples, "unit": unit, "higher_is_better": kind == "track"}
+
+
+def git_commit():
+    """
+    Commit of the working tree, suffixed with -dirty if it has uncommitted changes
+    """
+    def git(*args):
+        return subprocess.run(["git", *args], cwd=BENCHMARK_DIRECTORY, capture_output=True, text=True).stdout.strip()
+    commit = git("rev-parse", "--short", "HEAD") or "unknown"
+    if git("status", "--porcelain", "--untracked-files=no"):
+        commit += "-dirty"
+    return commit
+
+
+def machine_info():
+    return {"node": platform.node(), "machine": platform.machine(), "processor": platform.processor(), "cpu_count": os.cpu_count(),
+            "python": platform.python_version(), "numpy": np.__version__}
+
+
+def run(pattern=None, repeat=DEFAULT_REPEAT):
+    """
+    Run the benchmarks and store the results of the current commit in RESULTS_DIRECTORY
+    return: (str) path of the results file
+    """
+    commit = git_commit()
+    results = {}
+    for name, cls, method, values in discover(pattern):
+        try:
+            results[name] = measure(cls, method, values, repeat)
+        except NotImplementedError as error:
+            print(f"{name}: skipped ({error})")
+            continue
+        print(f"{name}: {format_value(results[name])}")
+    os.makedirs(RESULTS_DIRECTORY, exist_ok=True)
+    path = os.path.join(RESULTS_DIRECTORY, f"{commit}.json")
+    # Benchmarks run on their own (e.g. with a pattern) are added to the commit's earlier results
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)["results"]
+        results = {**previous, **results}
+    with open(path, "w") as f:
+        json.dump({"commit": commit, "date": datetime.datetime.now().isoformat(timespec="seconds"), "machine": machine_info(), "results": results}, f, indent=1)
+    return path
+
+
+def compare(base, head, factor=1.1):
+    """
+    Print the benchmarks that changed by more than factor between two stored commits
+    params:
+      base: (str) commit of the baseline results
+      head: (str) commit of the new results
+      factor: (float) ratio beyond which a change is reported
+    return: (int) number of regressions
+    """
+    base_results = load(base)["results"]
+    head_results = load(head)["results"]
+    regressions = 0
+    for name in sorted(set(base_results) & set(head_results)):
+        old, new = base_results[name], head_results[name]
+        if old["value"] == 0 or new["value"] == 0:
+            continue
+        # Ratio above 1 is always worse
+        ratio = old["value"] / new["value"] if old["higher_is_better"] else new["value"] / old["value"]
+        if ratio > factor:
+            label = "worse"
+            regressions += 1
+        elif ratio < 1 / factor:
+            label = "better"
+        else:
+            continue
+        print(f"{label:>6} {ratio:6.2f}x  {format_value(old)} -> {format_value(new)}  {name}")
+    for name in sorted(set(head_results) - set(base_results)):
+        print(f"   new          {format_value(head_results[name])}  {name}")
+    return regressions
+
+
+def load(commit):
+    with open(os.path.join(RESULTS_DIRECTORY, f"{commit}.json")) as f:
+        return json.load(f)
+
+
+def format_value(result):
+    value, unit = result["value"], result["unit"]
+    if unit == "s":
+        return f"{value * 1e3:.3f} ms" if value < 1 else f"{value:.2f} s"
+    if unit == "bytes":
+        return f"{value / 2 ** 20:.2f} MiB"
+    return f"{value:.4g} {unit}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the simulation benchmarks and compare their results across commits")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="run the benchmarks and store the results of the current commit")
+    run_parser.add_argument("--bench", help="regular expression selecting the benchmarks to run")
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="samples of each timing benchmark")
+    subparsers.add_parser("list", help="list the benchmarks and the commits with stored results")
+    compare_parser = subparsers.add_parser("compare", help="compare the stored results of two commits")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("head", nargs="?", help="the current commit by default")
+    compare_parser.add_argument("--factor", type=float, default=1.1)
+    args = parser.parse_args()
+    if args.command == "run":
+        print(f"Results written to {run(args.bench, args.repeat)}")
+    elif args.command == "list":
+        for name, _, _, _ in discover():
+            print(name)
+        if os.path.isdir(RESULTS_DIRECTORY):
+            print("Stored results: " + ", ".join(sorted(os.path.splitext(name)[0] for name in os.listdir(RESULTS_DIRECTORY))))
+    else:
+        if compare(args.base, args.head or git_commit(), args.factor):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
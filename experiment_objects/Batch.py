@@ -0,0 +1,247 @@
+import numpy as np
+import experiment_objects.Environment as e
+import experiment_objects.SwarmState as s
+import experiment_objects.SpatialIndex as si
+import experiment_objects.Recorder as rec
+import experiment_objects.Stopping as stop
+import experiment_objects.Profiler as pr
+import experiment_objects.SharedGrid as sg
+
+# How often the batch records the state of its replicates, as in Environment.run
+RECORD_INTERVAL = 200
+# Per-robot arrays of a SwarmState, sliced together when finished replicates are dropped
+ROBOT_ARRAYS = ("position", "chosen_waypoint", "motion_vector", "sample_colour", "sample_colour_occurences", "sample_evidence",
+                "self_evidence_estimate", "sample_count", "decision_state", "commited_estimation", "neighbour_message",
+                "new_recruit", "broadcast_frequency", "replicate")
+
+
+class BatchSwarmState(s.SwarmState):
+    """
+    SwarmState of several independent replicates at once. The robots of every replicate are
+    laid end to end along the robot axis, replicate by replicate, so each batched update advances
+    all of them together. Robots only sense the grid of their own replicate and only message
+    robots of their own replicate.
+    """
+    def __init__(self, num_replicates, num_robots, config, rng=None) -> None:
+        """
+        params:
+          num_replicates: (int) number of replicates
+          num_robots: (int) number of robots in each replicate
+          config: (Config.RobotConfig) parameters shared by every robot
+          rng: (np.random.Generator) generator of every robot of every replicate
+        """
+        super().__init__(num_replicates * num_robots, config, rng)
+        # Replicate each robot belongs to
+        self.replicate = np.repeat(np.arange(num_replicates), num_robots)
+        # Replicates are searched for neighbours side by side, further apart than the communication range
+        self.replicate_spacing = config.grid_size[0] + config.communication_range
+
+    def find_neighbours(self, senders):
+        offset_position = self.position.copy()
+        offset_position[:, 0] += self.replicate * self.replicate_spacing
+        return si.find_pairs(offset_position, senders, self.config.communication_range, self.config.grid_size)
+
+    def get_square_colours(self, env_grid):
+        """
+        parameters:
+          env_grid: (np.ndarray) grids of every replicate, indexed [replicate, row, col]
+        """
+        col = np.floor(self.position[:, 0]).astype(int)
+        row = np.floor(self.position[:, 1]).astype(int)
+        return env_grid[self.replicate, row, col]
+
+    def keep(self, mask):
+        """
+        Drop robots, e.g. those of finished replicates, so later updates skip them entirely.
+        params:
+          mask: (np.ndarray) boolean selection of the robots to keep
+        """
+        for name in ROBOT_ARRAYS:
+            setattr(self, name, getattr(self, name)[mask])
+        self.num_robots = int(np.count_nonzero(mask))
+
+    def get_replicate_states(self, num_replicates, num_states):
+        """
+        Count the number of robots of each replicate in each state
+        return: (np.ndarray) shape (num_replicates, num_states)
+        """
+        counts = np.bincount(self.replicate * num_states + self.decision_state, minlength=num_replicates * num_states)
+        return counts.reshape(num_replicates, num_states)
+
+
+class Replicate:
+    """
+    View of one replicate of a BatchEnvironment, with the attributes of an Environment the
+    stopping criteria, recorders and experiments use.
+    """
+    def __init__(self, batch, index, recorder, stopping) -> None:
+        self.batch = batch
+        self.index = index
+        self.time = 0
+        self.num_robots = batch.num_robots
+        self.num_states = batch.num_states
+        self.majority_colour = batch.majority_colour
+        self.recorder = recorder
+        self.stopping = stopping
+        self.stopped_by = None
+        self.adaptation_time = None
+        # Whether the replicate is still being advanced
+        self.active = True
+
+    @property
+    def grid(self):
+        return self.batch.grids[self.index]
+
+    @property
+    def state_history(self):
+        return getattr(self.recorder, "state_history", None)
+
+    @property
+    def time_history(self):
+        return getattr(self.recorder, "time_history", None)
+
+    @property
+    def grid_colour_hist(self):
+        return getattr(self.recorder, "grid_colour_history", None)
+
+    def robots_mask(self):
+        return self.batch.swarm.replicate == self.index
+
+    def get_robot_positions(self):
+        return self.batch.swarm.position[self.robots_mask()]
+
+    def get_robot_decision_states(self):
+        return self.batch.swarm.decision_state[self.robots_mask()]
+
+    def get_pending_evidence(self):
+        return int(np.count_nonzero(self.batch.swarm.sample_evidence[self.robots_mask()]))
+
+    def get_grid_proportions(self):
+        return (np.bincount(self.grid.ravel(), minlength=self.num_states)[1:] / self.grid.size).tolist()
+
+    def record_state(self, state):
+        """
+        Record the state of the replicate at the batch's current time and check its stopping criteria.
+        params:
+          state: (List : int) number of robots of the replicate in each state
+        return: (bool) True if a stopping criterion has been met
+        """
+        self.time = self.batch.time
+        self.recorder.record(self.time, state, self.get_grid_proportions())
+        if self.recorder.wants_robots:
+            self.recorder.record_robots(self.time, self.get_robot_positions(), self.get_robot_decision_states())
+        met = [criterion for criterion in self.stopping if criterion.check(self, state)]
+        if met:
+            self.stopped_by = type(met[0]).__name__
+            self.recorder.flush()
+            return True
+        return False
+
+
+class BatchEnvironment:
+    """
+    Runs several replicates of the same configuration as one vectorized swarm, with the
+    dynamics of the "swarm" engine. Each replicate has its own grid, recorder and stopping
+    criteria, and is dropped from the swarm as soon as it stops.
+    """
+    def __init__(self, config, seeds, recorders=None, stopping=stop.default_criteria, profiler=None, grid=None) -> None:
+        """
+        params:
+          config: (Config.EnvironmentConfig) configuration of every replicate, its engine is ignored
+          seeds: (List : np.random.SeedSequence) seed of each replicate. Each replicate's grid comes from its
+                 own seed as in Environment, the robots of all replicates share one stream derived from all of them
+          recorders: (List : Recorder.Recorder) recorder of each replicate, ListRecorder's by default
+          stopping: (Callable) stopping() returns a fresh list of criteria for a replicate
+          profiler: (Profiler.Profiler) instruments the run, the one of an active Profiler.profiling() block by default
+          grid: (np.ndarray) fixed grid every replicate runs on, the shared grid the worker is attached to
+                (SharedGrid.active) by default. Only copied if the run changes it.
+        """
+        self.config = config
+        self.num_replicates = len(seeds)
+        self.num_robots = config.num_robots
+        self.colour_prob = list(config.colour_prob)
+        self.majority_colour = np.argmax(self.colour_prob) + 1
+        self.num_states = len(self.colour_prob) + 1
+        self.interval = config.interval
+        self.experiment_length = config.experiment_length
+        self.time = 0
+        self.grid_version = 0
+
+        seeds = [seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed) for seed in seeds]
+        grid_seeds, robot_seeds = zip(*(seed.spawn(2) for seed in seeds))
+        self.grid_rngs = [e.spawn_random(grid_seed) for grid_seed in grid_seeds]
+        if grid is None:
+            grid = sg.active
+        if grid is None:
+            self.grids = np.stack([e.create_grid(config.grid_size, self.colour_prob, rng) for rng in self.grid_rngs])
+        else:
+            e.check_grid(grid, config.grid_size)
+            # One read-only view of the grid for every replicate
+            self.grids = np.broadcast_to(grid, (self.num_replicates,) + grid.shape)
+        robot_entropy = np.concatenate([robot_seed.generate_state(4) for robot_seed in robot_seeds])
+        self.swarm = BatchSwarmState(self.num_replicates, self.num_robots, config.robot, np.random.default_rng(robot_entropy))
+
+        if recorders is None:
+            recorders = [rec.ListRecorder() for _ in range(self.num_replicates)]
+        self.replicates = [Replicate(self, i, recorders[i], stopping()) for i in range(self.num_replicates)]
+        for replicate, state in zip(self.replicates, self.get_states()):
+            replicate.recorder.record(0, state, replicate.get_grid_proportions())
+
+        self.gradual_change = config.gradual_change
+        if self.gradual_change != None:
+            self.change_time = self.gradual_change.change_time
+            self.change_rate = 0.1 / (self.change_time / 300)
+        self.profiler = pr.active if profiler is None else profiler
+        if self.profiler is not None:
+            self.profiler.attach(self)
+
+    def run(self):
+        """
+        Advance every replicate until it stops or the experiment ends.
+        return: (List : bool) for each replicate, True if it was stopped by a stopping criterion
+        """
+        while self.time < self.experiment_length and self.swarm.num_robots > 0:
+            self.apply_gradual_change()
+            self.swarm.step(self.grids, self.time)
+            if self.time % RECORD_INTERVAL == 0:
+                self.record_state()
+            self.time += self.interval
+        for replicate in self.replicates:
+            if replicate.active:
+                replicate.time = self.time
+                replicate.adaptation_time = None
+            replicate.recorder.flush()
+        return [replicate.stopped_by is not None for replicate in self.replicates]
+
+    def record_state(self):
+        """
+        Record the state of every active replicate, dropping those that have stopped.
+        """
+        finished = []
+        for replicate, state in zip(self.replicates, self.get_states()):
+            if replicate.active and replicate.record_state(state):
+                replicate.active = False
+                finished.append(replicate.index)
+        if finished:
+            self.swarm.keep(~np.isin(self.swarm.replicate, finished))
+
+    def apply_gradual_change(self):
+        """
+        Shift the colour proportions of every active replicate's grid, as Environment.apply_gradual_change
+        """
+        if self.gradual_change != None:
+            if self.time % 300 == 0 and self.time > 0 and self.time <= self.change_time:
+                self.colour_prob = [self.colour_prob[0] - self.change_rate, self.colour_prob[1] + self.change_rate]
+                if not self.grids.flags.writeable:
+                    self.grids = self.grids.copy()
+                for replicate in self.replicates:
+                    if replicate.active:
+                        e.update_grid(self.grids[replicate.index], self.colour_prob, self.grid_rngs[replicate.index])
+                self.grid_version += 1
+
+    def get_states(self):
+        """
+        Number of robots of each replicate in each state: undecided, colour 1, colour 2, ...
+        return: (List : List : int)
+        """
+        return self.swarm.get_replicate_states(self.num_replicates, self.num_states).tolist()
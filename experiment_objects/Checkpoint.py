@@ -0,0 +1,201 @@
+import dataclasses
+import json
+import os
+import numpy as np
+import experiment_objects.Config as c
+import experiment_objects.Environment as e
+import experiment_objects.Recorder as rec
+import experiment_objects.SpatialIndex as si
+
+# Per-robot attributes of the robot and event engines, stored as one array each. None (no sample
+# colour, no message) is stored as 0, which is never a colour or a message.
+ROBOT_ATTRIBUTES = ("position", "chosen_waypoint", "motion_vector", "sample_colour", "sample_colour_occurences", "sample_evidence",
+                    "self_evidence_estimate", "sample_count", "decision_state", "commited_estimation", "neighbour_message",
+                    "new_recruit", "broadcast_frequency")
+# Attributes restored as tuples and as values that may be None
+TUPLE_ATTRIBUTES = ("position", "chosen_waypoint", "motion_vector")
+OPTIONAL_ATTRIBUTES = ("sample_colour", "neighbour_message")
+
+
+class Checkpointer:
+    """
+    Passed to Environment.run to write a checkpoint every interval amount of time. The event engine
+    only calls it at those times, so interval should be a multiple of the tick interval.
+    """
+    def __init__(self, path_format, interval) -> None:
+        """
+        params:
+          path_format: (str) path of each checkpoint, formatted with its time e.g. "run_{time}.npz"
+          interval: (float) time between checkpoints
+        """
+        self.path_format = path_format
+        self.interval = interval
+
+    def __call__(self, environment):
+        if environment.time > 0 and environment.time % self.interval == 0:
+            save_checkpoint(environment, self.path_format.format(time=environment.time))
+
+
+def capture(environment):
+    """
+    Everything needed to continue a run from the environment's current time: the grid and its random
+    stream, every robot's state and random stream, the recorded history and the stopping criteria.
+    Taken between ticks (as Environment.run calls its checkpoint), env.time is the next tick to run.
+    params:
+      environment: (Environment)
+    return: (Dict : np.ndarray) arrays of the checkpoint, metadata as JSON under "meta"
+    """
+    env = environment
+    arrays = {"grid": np.array(env.grid), "grid_rng": random_state(env.rng)}
+    if env.swarm is None:
+        for name in ROBOT_ATTRIBUTES:
+            values = [getattr(robot, name) for robot in env.robots]
+            if name in OPTIONAL_ATTRIBUTES:
+                values = [0 if value is None else value for value in values]
+            arrays[f"robot_{name}"] = np.array(values)
+        arrays["robot_rng"] = np.stack([random_state(robot.rng) for robot in env.robots])
+    else:
+        for name, value in vars(env.swarm).items():
+            if isinstance(value, np.ndarray):
+                arrays[f"swarm_{name}"] = value
+    if env.state_history is not None:
+        arrays["state_history"] = np.array(env.state_history)
+        arrays["time_history"] = np.array(env.time_history)
+    if env.grid_colour_hist is not None:
+        arrays["grid_colour_hist"] = np.array(env.grid_colour_hist, dtype=float)
+    meta = {"config": dataclasses.asdict(env.config), "time": env.time, "grid_version": env.grid_version,
+            "colour_prob": list(env.colour_prob), "adaptation_time": env.adaptation_time, "stopped_by": env.stopped_by,
+            "stopping": [[type(criterion).__name__, vars(criterion)] for criterion in env.stopping]}
+    if env.swarm is not None:
+        meta["swarm"] = {name: value for name, value in vars(env.swarm).items() if isinstance(value, (int, float, np.integer, np.floating))}
+        meta["swarm_rng"] = env.swarm.rng.bit_generator.state
+    arrays["meta"] = np.array(json.dumps(meta, default=json_default))
+    return arrays
+
+
+def save_checkpoint(environment, path):
+    """
+    Write a compressed checkpoint of the environment, read back with load_checkpoint
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        np.savez_compressed(f, **capture(environment))
+
+
+def load_checkpoint(path):
+    """
+    return: (Dict : np.ndarray) checkpoint written by save_checkpoint, as capture returns it
+    """
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+
+def restore(checkpoint, config=None, recorder=None, stopping=None, profiler=None):
+    """
+    Build an Environment that continues from a checkpoint: running it gives exactly what the
+    checkpointed run would have, so runs can be resumed or several continuations forked from one state.
+    params:
+      checkpoint: (Dict or str) checkpoint from capture, or the path of one from save_checkpoint
+      config: (Config.EnvironmentConfig) config to continue with, e.g. another gradual change or engine,
+              the checkpointed one by default. Grid size and number of robots must match.
+      recorder: (Recorder.Recorder) receives the states from here on, a ListRecorder holding the history so far by default
+      stopping: (List : Stopping.StoppingCriterion) criteria of the continued run, those of the checkpoint by default
+      profiler: (Profiler.Profiler) instruments the continued run
+    return: (Environment)
+    """
+    if isinstance(checkpoint, str):
+        checkpoint = load_checkpoint(checkpoint)
+    meta = json.loads(str(checkpoint["meta"]))
+    if config is None:
+        config = config_from_dict(meta["config"])
+    # Robots are built and then overwritten, the placeholder recorder keeps the new start out of the history
+    env = e.Environment(config, recorder=rec.ListRecorder(), stopping=stopping, profiler=profiler, grid=np.array(checkpoint["grid"]))
+    env.rng.setstate(to_random_state(checkpoint["grid_rng"]))
+    env.time = meta["time"]
+    env.grid_version = meta["grid_version"]
+    env.colour_prob = meta["colour_prob"]
+    env.adaptation_time = meta["adaptation_time"]
+    env.stopped_by = meta["stopped_by"]
+    if stopping is None:
+        for criterion, (name, state) in zip(env.stopping, meta["stopping"]):
+            if type(criterion).__name__ == name:
+                vars(criterion).update(state)
+    if recorder is None:
+        recorder = rec.ListRecorder()
+        if "state_history" in checkpoint:
+            recorder.state_history = checkpoint["state_history"].tolist()
+            recorder.time_history = checkpoint["time_history"].tolist()
+        if "grid_colour_hist" in checkpoint:
+            recorder.grid_colour_history = checkpoint["grid_colour_hist"].tolist()
+    env.recorder = recorder
+    if "robot_rng" in checkpoint:
+        restore_robots(env, checkpoint)
+    else:
+        restore_swarm(env, checkpoint, meta)
+    return env
+
+
+def restore_robots(env, checkpoint):
+    if env.swarm is not None:
+        raise ValueError(f"Checkpoint of the robot or event engine cannot continue with the {env.engine} engine")
+    columns = {name: checkpoint[f"robot_{name}"].tolist() for name in ROBOT_ATTRIBUTES}
+    for i, robot in enumerate(env.robots):
+        for name in ROBOT_ATTRIBUTES:
+            value = columns[name][i]
+            if name in TUPLE_ATTRIBUTES:
+                value = tuple(value)
+            elif name in OPTIONAL_ATTRIBUTES and value == 0:
+                value = None
+            setattr(robot, name, value)
+        robot.rng.setstate(to_random_state(checkpoint["robot_rng"][i]))
+    env.neighbour_index = si.create_index(env.grid_size, env.config.robot.communication_range, [robot.position for robot in env.robots])
+
+
+def restore_swarm(env, checkpoint, meta):
+    if env.swarm is None or set(meta["swarm"]) - set(vars(env.swarm)):
+        raise ValueError(f"Checkpoint of a swarm engine cannot continue with the {env.engine} engine")
+    for name in checkpoint:
+        if name.startswith("swarm_"):
+            setattr(env.swarm, name[len("swarm_"):], np.array(checkpoint[name]))
+    for name, value in meta["swarm"].items():
+        setattr(env.swarm, name, value)
+    env.swarm.rng.bit_generator.state = meta["swarm_rng"]
+
+
+def random_state(rng):
+    """
+    State of a random.Random as an array: its version and Mersenne Twister state. The simulation draws
+    no normal variates, so gauss_next is always None and is not stored.
+    """
+    version, internal, _ = rng.getstate()
+    return np.array((version,) + internal, dtype=np.int64)
+
+
+def to_random_state(array):
+    """
+    Inverse of random_state, for random.Random.setstate
+    """
+    values = array.tolist()
+    return values[0], tuple(values[1:]), None
+
+
+def config_from_dict(values):
+    """
+    Rebuild an EnvironmentConfig from dataclasses.asdict (after a JSON round trip)
+    """
+    robot = dict(values["robot"], grid_size=tuple(values["robot"]["grid_size"]))
+    if robot["position"] is not None:
+        robot["position"] = tuple(robot["position"])
+    gradual_change = None if values["gradual_change"] is None else c.GradualChange(**values["gradual_change"])
+    return c.EnvironmentConfig(**dict(values, grid_size=tuple(values["grid_size"]), colour_prob=tuple(values["colour_prob"]),
+                                      robot=c.RobotConfig(**robot), gradual_change=gradual_change))
+
+
+def json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
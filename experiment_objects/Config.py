@@ -0,0 +1,96 @@
+"""
+Declared default configuration of the simulation, and the frozen config objects it is passed
+around in. Only plain values live here, so the simulation core can be imported by headless
+workers without the GUI or dataframe libraries.
+"""
+import hashlib
+import json
+from dataclasses import dataclass, asdict
+
+# Environment
+X_SQUARES = 20 # (number of cols)
+Y_SQUARES = 40 # (number of rows)
+GRID_SIZE = [X_SQUARES, Y_SQUARES]
+COLOUR_PROB = [0.8, 0.2]
+ENV_INTERVAL = 1
+EXPERIMENT_LENGTH = 100000
+NUM_ROBOTS = 50
+
+# Robot parameters
+UPDATE_INTERVAL = 200
+SAMPLE_CYCLE_LENGTH = 15
+SAMPLE_INTERVAL = 400
+SPEED = 0.01
+COMMUNICATION_RANGE = 2
+POSITION = None#[0,0]
+SAMPLE_COLOUR = None
+DECISION_STATE = 2
+COMMITED_ESTIMATION = 0.8
+
+
+@dataclass(frozen=True, slots=True)
+class RobotConfig:
+    """
+    Parameters shared by every robot, the initial values of the per-robot state included.
+    One instance is shared by all the robots of an environment.
+    """
+    # How often to update opinion
+    update_interval: int = UPDATE_INTERVAL
+    # Number of samples to take in a cycle
+    sample_cycle_length: int = SAMPLE_CYCLE_LENGTH
+    # Amount of time between each sample
+    sample_interval: int = SAMPLE_INTERVAL
+    # Speed the robot moves at
+    speed: float = SPEED
+    # Range of broadcast messages
+    communication_range: float = COMMUNICATION_RANGE
+    # How often the environment updates
+    env_interval: float = ENV_INTERVAL
+    # Size of grid
+    grid_size: tuple = tuple(GRID_SIZE)
+    # Initial colour to look for, random if None
+    sample_colour: int = SAMPLE_COLOUR
+    # Initial state: Uncommitted, colour 1, colour 2, etc.
+    decision_state: int = DECISION_STATE
+    # Initial estimation of concentration of colour committed to
+    commited_estimation: float = COMMITED_ESTIMATION
+    # Initial position, random if None
+    position: tuple = POSITION
+
+
+@dataclass(frozen=True, slots=True)
+class GradualChange:
+    """
+    Gradual change of the grid's colour proportions during the experiment.
+    """
+    # Proportion of majority colour at end of gradual change
+    final_proportion: float
+    # Time it takes to reach final proportion
+    change_time: float
+
+
+@dataclass(frozen=True, slots=True)
+class EnvironmentConfig:
+    """
+    Everything an Environment is built from, apart from its seed.
+    """
+    grid_size: tuple = tuple(GRID_SIZE)
+    colour_prob: tuple = tuple(COLOUR_PROB)
+    num_robots: int = NUM_ROBOTS
+    robot: RobotConfig = RobotConfig()
+    interval: float = ENV_INTERVAL
+    experiment_length: int = EXPERIMENT_LENGTH
+    gradual_change: GradualChange = None
+    # Engine that advances the robots, see Environment.ENGINES
+    engine: str = "robot"
+
+
+def config_key(config):
+    """
+    Stable hash of a config, the same in every process (unlike hash(), which is salted for strings).
+    Configs are keyed by it in cache.ResultCache.
+    params:
+      config: (EnvironmentConfig, RobotConfig or GradualChange)
+    return: (str) hex digest
+    """
+    return hashlib.sha256(json.dumps(asdict(config), sort_keys=True).encode()).hexdigest()
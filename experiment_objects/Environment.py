@@ -1,58 +1,105 @@
 import random
 import numpy as np
 import experiment_objects.Robot as r
-import main as m
+import experiment_objects.SwarmState as s
+import experiment_objects.Kernels as k
+import experiment_objects.SpatialIndex as si
+import experiment_objects.Scheduler as sch
+import experiment_objects.Recorder as rec
+import experiment_objects.Stopping as stop
+import experiment_objects.Profiler as pr
+import experiment_objects.SharedGrid as sg
 
-# Robot parameters
-UPDATE_INTERVAL = 200
-SAMPLE_CYCLE_LENGTH = 15
-SAMPLE_INTERVAL = 400
-SPEED = 0.01
-COMMUNICATION_RANGE = 2
-POSITION = None#[0,0]
-SAMPLE_COLOUR = None
-DECISION_STATE = 2
-COMMITED_ESTIMATION = 0.8
+# Engines that can advance the robots: one Robot object per robot, a single vectorized SwarmState,
+# Robot objects driven by the discrete-event EventScheduler in run, a SwarmState stepped robot by
+# robot by the Kernels (compiled when Numba is installed), or one slotted CompactRobot per robot
+ENGINES = ("robot", "swarm", "event", "compiled", "compact")
 
 
 class Environment:
     """
     Object containing the grid and robots for the experiment.
     """
-    def __init__(self, grid_size, colour_prob, num_robots, robot_params, interval, experiment_length, gradual_change=None) -> None:
+    def __init__(self, config, seed=None, recorder=None, stopping=None, profiler=None, grid=None) -> None:
+        """
+        params:
+          config: (Config.EnvironmentConfig) everything the environment and its robots are built from
+          seed: (int or np.random.SeedSequence) seed of every random draw of the run
+          recorder: (Recorder.Recorder) receives the recorded states, a ListRecorder by default
+          stopping: (List : Stopping.StoppingCriterion) criteria ending the run, Stopping.default_criteria() by default.
+                    Reset here, so a list can be reused run after run but not by two environments at once
+          profiler: (Profiler.Profiler) instruments the run, the one of an active Profiler.profiling() block by default
+          grid: (np.ndarray) fixed grid to run on instead of drawing one from the seed, the shared grid the worker
+                is attached to (SharedGrid.active) by default. Only copied if the run changes it.
+        """
+        self.config = config
+        grid_size = config.grid_size
+        colour_prob = list(config.colour_prob)
+        num_robots = config.num_robots
+        engine = config.engine
+        # Every random draw comes from streams spawned from this seed: one for the grid and one per robot
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        grid_seed, robot_seed = self.seed_sequence.spawn(2)
+        self.rng = spawn_random(grid_seed)
         self.grid_size = grid_size
-        self.grid = create_grid(grid_size, colour_prob)
+        if grid is None:
+            grid = sg.active
+        if grid is None:
+            self.grid = create_grid(grid_size, colour_prob, self.rng)
+        else:
+            check_grid(grid, grid_size)
+            self.grid = grid
+        # Incremented whenever the grid changes, so views of it know when to refresh
+        self.grid_version = 0
         self.colour_prob = colour_prob
         self.majority_colour = np.argmax(colour_prob) + 1
         self.num_states = len(colour_prob) + 1
         self.num_robots = num_robots
-        self.robots = [r.Robot(i, self, *robot_params) for i in range(num_robots)]
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown engine {engine}, expected one of {ENGINES}")
+        self.engine = engine
+        if engine == "swarm":
+            self.robots = []
+            self.swarm = s.SwarmState(num_robots, config.robot, rng=np.random.default_rng(robot_seed))
+        elif engine == "compiled":
+            self.robots = []
+            self.swarm = k.CompiledSwarmState(num_robots, config.robot, rng=np.random.default_rng(robot_seed))
+        else:
+            robot_seeds = robot_seed.spawn(num_robots)
+            robot_class = r.CompactRobot if engine == "compact" else r.Robot
+            self.robots = [robot_class(i, self, config.robot, rng=spawn_random(robot_seeds[i])) for i in range(num_robots)]
+            self.swarm = None
+            # Neighbour index used by Robot.find_all_neighbours
+            self.neighbour_index = si.create_index(grid_size, config.robot.communication_range, [robot.position for robot in self.robots])
         self.time = 0
-        self.interval = interval
-        self.experiment_length = experiment_length
-        self.state_history = [self.get_state()]
-        self.time_history = [0]
+        self.interval = config.interval
+        self.experiment_length = config.experiment_length
+        # Receives the state every time it is recorded, keeps the whole history in memory by default
+        self.recorder = rec.ListRecorder() if recorder is None else recorder
+        self.recorder.record(0, self.get_state(), self.get_grid_proportions())
         self.adaptation_time = None
-        if gradual_change == None:
-            self.gradual_change = gradual_change
-        else:
-            self.gradual_change = gradual_change
-            self.final_proportion = gradual_change[0] # proportion of majority colour at end of gradual change
-            self.change_time = gradual_change[1] # time it takes to reach final proportion
+        # Criteria checked at every recorded state, the run stops when any is met
+        self.stopping = stop.default_criteria() if stopping is None else stopping
+        for criterion in self.stopping:
+            criterion.reset()
+        self.stopped_by = None
+        self.gradual_change = config.gradual_change
+        if self.gradual_change != None:
+            self.final_proportion = self.gradual_change.final_proportion # proportion of majority colour at end of gradual change
+            self.change_time = self.gradual_change.change_time # time it takes to reach final proportion
             self.change_rate = 0.1 / (self.change_time / 300) # rate of change of proportion of majority colour
+        # Instrumentation is opt-in, without a profiler nothing is wrapped
+        self.profiler = pr.active if profiler is None else profiler
+        if self.profiler is not None:
+            self.profiler.attach(self)
 
     def run_for_visual(self):
         while self.time < self.experiment_length:
             if self.time % 100 == 0:
                 #print(f"Time: {self.time}")
                 pass
-            if self.gradual_change != None:
-                if self.time % 300 == 0 and self.time > 0 and self.time <= self.change_time:
-                    self.colour_prob = [self.colour_prob[0] - self.change_rate, self.colour_prob[1] + self.change_rate]
-                    self.grid = create_grid(self.grid_size, self.colour_prob)
-                    #print(f"Time: {self.time}, Colour Prob: {self.colour_prob}")
-            for robot in self.robots:
-                robot.step_robot(self.grid, self.robots)
+            self.apply_gradual_change()
+            self.step()
             if self.time % 200 == 0:
                 #print(f"{self.time}: {self.get_state()}")
                 #print(f"{self.time}: {self.get_sampling_colour_counts()}")
@@ -60,33 +107,130 @@ class Environment:
             self.time += self.interval
             yield None
     
-    def run(self):
+    def run(self, checkpoint=None):
+        """
+        params:
+          checkpoint: (Callable) checkpoint(environment) called between ticks, e.g. a Checkpoint.Checkpointer
+        return: (bool) True if a stopping criterion ended the run
+        """
+        if self.engine == "event":
+            return sch.EventScheduler(self, checkpoint).run()
         while self.time < self.experiment_length:
+            if checkpoint is not None:
+                checkpoint(self)
             #if self.time == 4000:
             #    self.grid = create_grid(self.grid_size, [0.9,0.1])
-            for robot in self.robots:
-                robot.step_robot(self.grid, self.robots)
+            self.apply_gradual_change()
+            self.step()
             if self.time % 200 == 0:
-                print(f"{self.time}: {self.get_state()}")
-                current_state = self.get_state()
-                self.state_history.append(current_state)
-                self.time_history.append(self.time)
-                if current_state[self.majority_colour] / self.num_robots > 0.7:
-                    if self.adaptation_time == None:
-                        self.adaptation_time = self.time
-                    else:
-                        if self.time - self.adaptation_time > 2 * 60 * 100:
-                            return True
-                else:
-                    self.adaptation_time = None
+                if self.record_state():
+                    return True
             self.time += self.interval
         self.adaptation_time = None
+        self.recorder.flush()
+        return False
+
+    def record_state(self):
+        """
+        Record the current state and check the stopping criteria.
+        return: (bool) True if a stopping criterion has been met
+        """
+        current_state = self.get_state()
+        self.recorder.record(self.time, current_state, self.get_grid_proportions())
+        if self.recorder.wants_robots:
+            self.recorder.record_robots(self.time, self.get_robot_positions(), self.get_robot_decision_states())
+        # Every criterion sees every state, so none are short-circuited
+        met = [criterion for criterion in self.stopping if criterion.check(self, current_state)]
+        if met:
+            self.stopped_by = type(met[0]).__name__
+            self.recorder.flush()
+            return True
         return False
 
+    def apply_gradual_change(self):
+        """
+        If gradual change is on, shift the colour proportions every 300 time until change_time,
+        flipping only as many squares as needed to reach the new proportions.
+        """
+        if self.gradual_change != None:
+            if self.time % 300 == 0 and self.time > 0 and self.time <= self.change_time:
+                self.colour_prob = [self.colour_prob[0] - self.change_rate, self.colour_prob[1] + self.change_rate]
+                if not self.grid.flags.writeable:
+                    # A shared grid stays as it is for the other runs
+                    self.grid = self.grid.copy()
+                update_grid(self.grid, self.colour_prob, self.rng)
+                self.grid_version += 1
+                #print(f"Time: {self.time}, Colour Prob: {self.colour_prob}")
+
+    def step(self):
+        """
+        Advance every robot by one tick with the selected engine
+        """
+        if self.swarm is None:
+            for robot in self.robots:
+                robot.step_robot(self.grid, self.robots)
+        else:
+            self.swarm.step(self.grid, self.time)
+
+    @property
+    def state_history(self):
+        """
+        History of recorded states, if the recorder keeps one
+        """
+        return getattr(self.recorder, "state_history", None)
+
+    @property
+    def time_history(self):
+        """
+        Times of the recorded states, if the recorder keeps them
+        """
+        return getattr(self.recorder, "time_history", None)
+
+    @property
+    def grid_colour_hist(self):
+        """
+        Proportion of each colour in the grid at every recorded state, if the recorder keeps them
+        """
+        return getattr(self.recorder, "grid_colour_history", None)
+
+    def get_robot_positions(self):
+        """
+        Position of every robot
+        return: (np.ndarray) shape (num_robots, 2)
+        """
+        if self.swarm is not None:
+            return self.swarm.position
+        return np.array([robot.position for robot in self.robots])
+
+    def get_robot_decision_states(self):
+        """
+        Decision state of every robot
+        return: (np.ndarray) shape (num_robots,)
+        """
+        if self.swarm is not None:
+            return self.swarm.decision_state
+        return np.array([robot.decision_state for robot in self.robots])
+
+    def get_pending_evidence(self):
+        """
+        Number of robots with sample evidence waiting for their next opinion update
+        """
+        if self.swarm is not None:
+            return int(np.count_nonzero(self.swarm.sample_evidence))
+        return sum(1 for robot in self.robots if robot.sample_evidence)
+
+    def get_grid_proportions(self):
+        """
+        Proportion of the grid's squares of each colour: colour 1, colour 2, ...
+        """
+        return (np.bincount(self.grid.ravel(), minlength=self.num_states)[1:] / self.grid.size).tolist()
+
     def get_state(self):
         """
         Count the number of robots in each state currently: undecided, colour 1, colour 2, ...
         """
+        if self.swarm is not None:
+            return self.swarm.get_state(self.num_states)
         state_count = [0 for i in range(self.num_states)]
         for robot in self.robots:
             state_count[robot.decision_state] += 1
@@ -96,6 +240,8 @@ class Environment:
         """
         Count the number of robots in each sampling colour currently: undecided, colour 1, colour 2, ...
         """
+        if self.swarm is not None:
+            return self.swarm.get_sampling_colour_counts(self.num_states)
         colour_count = [0 for i in range(self.num_states)]
         for robot in self.robots:
             if robot.sample_colour == None:
@@ -105,16 +251,63 @@ class Environment:
         return colour_count
             
 
-def create_grid(size, colour_prob):
+def create_grid(size, colour_prob, rng=random):
     """
     Create a grid from a distribution of colours
     params:
       size: (Tuple : int) # col, # row. number of rows and cols of squares in grid
       colour_prob: (List : float) probability distribution of each colour, where colour is represented by index + 1
-    return: (List[List : int])
+      rng: (random.Random) generator to draw the colours from, the global random module by default
+    return: (np.ndarray) uint8 array of shape (# row, # col)
     """
     colour_ints = [i + 1 for i in range(len(colour_prob))]
-    colours = random.choices(colour_ints, colour_prob, k=size[0] * size[1])
-    return [[colours[size[0] * row + col] for col in range(size[0])] for row in range(size[1])]
-    
-    
+    colours = rng.choices(colour_ints, colour_prob, k=size[0] * size[1])
+    return np.array(colours, dtype=np.uint8).reshape(size[1], size[0])
+
+
+def check_grid(grid, size):
+    """
+    Raise a ValueError if a given grid does not have the shape of the configured grid size
+    params:
+      grid: (np.ndarray) indexed [row, col]
+      size: (Tuple : int) # col, # row
+    """
+    if grid.shape != (size[1], size[0]):
+        raise ValueError(f"Grid of shape {grid.shape} does not match grid_size {tuple(size)}, expected shape {(size[1], size[0])}")
+
+
+def update_grid(grid, colour_prob, rng=random):
+    """
+    Change a grid in place to a new distribution of colours, flipping only as many randomly chosen
+    squares as needed so the count of each colour matches the new proportion. Squares that keep
+    their colour stay where they are.
+    params:
+      grid: (np.ndarray) grid from create_grid
+      colour_prob: (List : float) new probability distribution of each colour, where colour is represented by index + 1
+      rng: (random.Random) generator to choose the squares to flip
+    """
+    flat = grid.reshape(-1)
+    counts = np.bincount(flat, minlength=len(colour_prob) + 1)[1:]
+    targets = np.round(np.asarray(colour_prob) / sum(colour_prob) * flat.size).astype(int)
+    # Rounding can leave the targets a square or two off the grid size, give the difference to the largest colour
+    targets[np.argmax(targets)] += flat.size - targets.sum()
+    flipped = []
+    new_colours = []
+    for i, (count, target) in enumerate(zip(counts, targets)):
+        if count > target:
+            flipped.extend(rng.sample(np.flatnonzero(flat == i + 1).tolist(), count - target))
+        elif target > count:
+            new_colours.extend([i + 1] * (target - count))
+    rng.shuffle(new_colours)
+    flat[flipped] = new_colours
+
+
+def spawn_random(seed_sequence):
+    """
+    Create a standard library generator seeded from a NumPy SeedSequence. Robots draw one
+    number at a time, which random.Random does much faster than a NumPy Generator.
+    params:
+      seed_sequence: (np.random.SeedSequence)
+    return: (random.Random)
+    """
+    return random.Random(int(seed_sequence.generate_state(1, np.uint64)[0]))
@@ -0,0 +1,360 @@
+import argparse
+import math
+import numpy as np
+import experiment_objects.SwarmState as s
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Absolute tolerance of the np.isclose(x, 0) checks in Robot
+ATOL = 1e-8
+# Number of robots worth of waypoints drawn at a time for the kernels to consume
+WAYPOINT_BUFFER_ROBOTS = 64
+
+
+def jit(function):
+    """
+    Compile a kernel with Numba if it is installed, otherwise keep the pure-Python function
+    """
+    return function if njit is None else njit(cache=True)(function)
+
+
+@jit
+def motion_kernel(i, position, chosen_waypoint, motion_vector, step_size, waypoints, cursor):
+    """
+    Robot.motion_routine for robot i. A robot arriving at its waypoint takes the next waypoint from waypoints.
+    return: (int) cursor of the next unused waypoint
+    """
+    x = position[i, 0] - chosen_waypoint[i, 0]
+    y = position[i, 1] - chosen_waypoint[i, 1]
+    distance_to_waypoint = math.sqrt(x * x + y * y)
+    if distance_to_waypoint < step_size:
+        if distance_to_waypoint <= ATOL:
+            # Pick new waypoint
+            chosen_waypoint[i, 0] = waypoints[cursor, 0]
+            chosen_waypoint[i, 1] = waypoints[cursor, 1]
+            cursor += 1
+            x = chosen_waypoint[i, 0] - position[i, 0]
+            y = chosen_waypoint[i, 1] - position[i, 1]
+            magnitude = math.sqrt(x * x + y * y)
+            motion_vector[i, 0] = x / magnitude
+            motion_vector[i, 1] = y / magnitude
+        else:
+            position[i, 0] += motion_vector[i, 0] * distance_to_waypoint
+            position[i, 1] += motion_vector[i, 1] * distance_to_waypoint
+    else:
+        position[i, 0] += motion_vector[i, 0] * step_size
+        position[i, 1] += motion_vector[i, 1] * step_size
+    return cursor
+
+
+@jit
+def sampling_kernel(i, env_grid, position, sample_colour, sample_colour_occurences, sample_evidence, self_evidence_estimate,
+                    sample_count, decision_state, commited_estimation, new_recruit, broadcast_frequency, sample_cycle_length):
+    """
+    Robot.sampling_routine for robot i: start a sample, take a sample or handle the end of the sample cycle
+    """
+    square_colour = env_grid[int(math.floor(position[i, 1])), int(math.floor(position[i, 0]))]
+    if sample_colour[i] == 0:
+        sample_colour[i] = square_colour
+        sample_count[i] = 0
+        sample_colour_occurences[i] = 0
+    elif sample_count[i] < sample_cycle_length:
+        if square_colour == sample_colour[i]:
+            sample_colour_occurences[i] += 1
+        sample_count[i] += 1
+        if new_recruit[i]:
+            broadcast_frequency[i] = 2 * min(2 * sample_colour_occurences[i] / sample_cycle_length, 1)
+    else:
+        sample_colour_concentration = sample_colour_occurences[i] / sample_count[i]
+        if sample_colour[i] == decision_state[i] and decision_state[i] != 0:
+            # Update committed colour estimate
+            commited_estimation[i] = sample_colour_concentration
+            broadcast_frequency[i] = 2 * min(2 * commited_estimation[i], 1)
+        elif sample_colour_concentration > commited_estimation[i] or decision_state[i] == 0:
+            if sample_colour_concentration > 0:
+                # Store colour and concentration estimate of sample for update decision
+                sample_evidence[i] = sample_colour[i]
+                self_evidence_estimate[i] = sample_colour_concentration
+        new_recruit[i] = False
+        sample_colour[i] = 0
+
+
+@jit
+def cell_of(x, y, cell_size, num_cols, num_rows):
+    """
+    return: (int) index of the cell of the cell list a position is in, positions on the far edge of the grid are in the last cell
+    """
+    col = min(max(int(math.floor(x / cell_size)), 0), num_cols - 1)
+    row = min(max(int(math.floor(y / cell_size)), 0), num_rows - 1)
+    return row * num_cols + col
+
+
+@jit
+def insert_cell(i, cell, cell_head, cell_links):
+    """
+    Put robot i at the head of a cell. cell_links holds the next and previous robot in each robot's
+    cell and the robot's cell, -1 for no robot.
+    """
+    cell_links[2, i] = cell
+    cell_links[1, i] = -1
+    cell_links[0, i] = cell_head[cell]
+    if cell_head[cell] != -1:
+        cell_links[1, cell_head[cell]] = i
+    cell_head[cell] = i
+
+
+@jit
+def remove_cell(i, cell_head, cell_links):
+    """
+    Take robot i out of its cell
+    """
+    following = cell_links[0, i]
+    preceding = cell_links[1, i]
+    if preceding != -1:
+        cell_links[0, preceding] = following
+    else:
+        cell_head[cell_links[2, i]] = following
+    if following != -1:
+        cell_links[1, following] = preceding
+
+
+@jit
+def build_cells(position, cell_head, cell_links, cell_size, num_cols, num_rows):
+    """
+    Fill the cell list with every robot's current position
+    """
+    cell_head[:] = -1
+    for i in range(position.shape[0]):
+        insert_cell(i, cell_of(position[i, 0], position[i, 1], cell_size, num_cols, num_rows), cell_head, cell_links)
+
+
+@jit
+def broadcast_kernel(i, position, decision_state, neighbour_message, communication_range, cell_head, cell_links, num_cols, num_rows):
+    """
+    Robot.broadcasting_routine for robot i: message its opinion to every robot within communication range.
+    Cells are at least communication_range wide, so only the 3x3 block of cells around robot i is checked.
+    """
+    if decision_state[i] != 0:
+        cell = cell_links[2, i]
+        col = cell % num_cols
+        row = cell // num_cols
+        for r in range(max(row - 1, 0), min(row + 2, num_rows)):
+            for c in range(max(col - 1, 0), min(col + 2, num_cols)):
+                j = cell_head[r * num_cols + c]
+                while j != -1:
+                    if j != i:
+                        x = position[i, 0] - position[j, 0]
+                        y = position[i, 1] - position[j, 1]
+                        if math.sqrt(x * x + y * y) < communication_range:
+                            neighbour_message[j] = decision_state[i]
+                    j = cell_links[0, j]
+
+
+@jit
+def opinion_update_kernel(i, coin, sample_colour, sample_colour_occurences, sample_evidence, self_evidence_estimate,
+                          sample_count, decision_state, commited_estimation, neighbour_message, new_recruit, broadcast_frequency):
+    """
+    Robot.opinion_update_routine for robot i. coin decides between discovery and social evidence when it has both.
+    """
+    discovery = False
+    social = False
+    if sample_evidence[i] != 0 and neighbour_message[i] != 0:
+        if coin > 0.5:
+            discovery = True
+        else:
+            social = True
+    elif sample_evidence[i] != 0:
+        discovery = True
+    elif neighbour_message[i] != 0:
+        social = True
+
+    if discovery:
+        decision_state[i] = sample_evidence[i]
+        commited_estimation[i] = self_evidence_estimate[i]
+    elif social:
+        if decision_state[i] == 0:
+            # Recruitment transition
+            decision_state[i] = neighbour_message[i]
+            sample_colour[i] = decision_state[i]
+            sample_count[i] = 0
+            sample_colour_occurences[i] = 0
+            commited_estimation[i] = 0
+            new_recruit[i] = True
+        elif decision_state[i] != neighbour_message[i]:
+            # Cross-inhibition transition
+            decision_state[i] = 0
+            commited_estimation[i] = 0
+            sample_colour[i] = 0
+        else:
+            return
+    else:
+        return
+    broadcast_frequency[i] = 2 * min(2 * commited_estimation[i], 1)
+    sample_evidence[i] = 0
+    self_evidence_estimate[i] = 0
+    if discovery:
+        sample_colour[i] = 0
+
+
+@jit
+def step_kernel(time, env_grid, position, chosen_waypoint, motion_vector, sample_colour, sample_colour_occurences, sample_evidence,
+                self_evidence_estimate, sample_count, decision_state, commited_estimation, neighbour_message, new_recruit,
+                broadcast_frequency, waypoints, cursor, coins, step_size, sample_interval, update_interval, sample_cycle_length,
+                communication_range, cell_head, cell_links, cell_size, num_cols, num_rows):
+    """
+    Advance every robot by one tick, one robot after the other exactly as Environment.step calls Robot.step_robot.
+    The cell list is rebuilt at the start of the tick and follows every robot as it moves.
+    return: (int) cursor of the next unused waypoint
+    """
+    sample_now = time % sample_interval <= ATOL
+    update_now = time % update_interval <= ATOL
+    build_cells(position, cell_head, cell_links, cell_size, num_cols, num_rows)
+    for i in range(position.shape[0]):
+        cursor = motion_kernel(i, position, chosen_waypoint, motion_vector, step_size, waypoints, cursor)
+        cell = cell_of(position[i, 0], position[i, 1], cell_size, num_cols, num_rows)
+        if cell != cell_links[2, i]:
+            remove_cell(i, cell_head, cell_links)
+            insert_cell(i, cell, cell_head, cell_links)
+        if sample_now:
+            sampling_kernel(i, env_grid, position, sample_colour, sample_colour_occurences, sample_evidence, self_evidence_estimate,
+                            sample_count, decision_state, commited_estimation, new_recruit, broadcast_frequency, sample_cycle_length)
+        if broadcast_frequency[i] != 0:
+            if time % ((1 / broadcast_frequency[i]) * 100) <= ATOL:
+                broadcast_kernel(i, position, decision_state, neighbour_message, communication_range, cell_head, cell_links, num_cols, num_rows)
+        if update_now:
+            opinion_update_kernel(i, coins[i], sample_colour, sample_colour_occurences, sample_evidence, self_evidence_estimate,
+                                  sample_count, decision_state, commited_estimation, neighbour_message, new_recruit, broadcast_frequency)
+            neighbour_message[i] = 0
+    return cursor
+
+
+class CompiledSwarmState(s.SwarmState):
+    """
+    SwarmState advanced by the per-robot kernels above, compiled with Numba when it is installed.
+    Unlike the batched SwarmState.step, robots are visited one after the other as in Robot.step_robot,
+    so each robot sees the moves and messages of the robots before it within the same tick.
+    Without Numba the kernels run as plain Python and the "swarm" engine is faster.
+    """
+    def __init__(self, num_robots, config, rng=None) -> None:
+        super().__init__(num_robots, config, rng)
+        # Waypoints drawn ahead of time for robots that arrive, and the next unused one
+        self.waypoints = self.random_points(WAYPOINT_BUFFER_ROBOTS * num_robots)
+        self.cursor = 0
+        # Coins of the last opinion update, one per robot
+        self.coins = np.zeros(num_robots)
+        # Cell list the broadcasts search, cells are communication range wide (any width when nothing is in range)
+        self.cell_size = float(config.communication_range) if config.communication_range > 0 else 1.0
+        self.num_cols = max(math.ceil(config.grid_size[0] / self.cell_size), 1)
+        self.num_rows = max(math.ceil(config.grid_size[1] / self.cell_size), 1)
+        # First robot of each cell, and the next and previous robot in its cell and the cell of each robot
+        self.cell_head = np.full(self.num_cols * self.num_rows, -1, dtype=np.int64)
+        self.cell_links = np.full((3, num_robots), -1, dtype=np.int64)
+
+    def step(self, env_grid, time):
+        # Every robot can arrive at its waypoint at most once per tick
+        if self.cursor + self.num_robots > len(self.waypoints):
+            self.waypoints = self.random_points(WAYPOINT_BUFFER_ROBOTS * self.num_robots)
+            self.cursor = 0
+        if time % self.config.update_interval <= ATOL:
+            self.coins = self.rng.uniform(0, 1, self.num_robots)
+        self.cursor = step_kernel(float(time), env_grid, self.position, self.chosen_waypoint, self.motion_vector, self.sample_colour,
+                                  self.sample_colour_occurences, self.sample_evidence, self.self_evidence_estimate, self.sample_count,
+                                  self.decision_state, self.commited_estimation, self.neighbour_message, self.new_recruit,
+                                  self.broadcast_frequency, self.waypoints, self.cursor, self.coins,
+                                  float(self.config.env_interval * self.config.speed), float(self.config.sample_interval),
+                                  float(self.config.update_interval), self.config.sample_cycle_length, float(self.config.communication_range),
+                                  self.cell_head, self.cell_links, self.cell_size, self.num_cols, self.num_rows)
+
+
+class ReplayRandom:
+    """
+    Stand-in for a Robot's random.Random that returns the numbers a CompiledSwarmState drew for it
+    """
+    def __init__(self) -> None:
+        self.waypoints = []
+        self.coin = None
+
+    def uniform(self, a, b):
+        if (a, b) == (0, 1):
+            coin, self.coin = self.coin, None
+            return coin
+        return self.waypoints.pop(0)
+
+
+def check_parity(environment, num_ticks):
+    """
+    Step an Environment of Robot's and a CompiledSwarmState copied from it side by side, feeding the
+    robots the random numbers the kernels drew, and compare every robot after every tick.
+    params:
+      environment: (Environment) freshly built with the "robot" engine
+      num_ticks: (int) number of ticks to compare
+    return: (int) first tick at which they differ, or None if they agree throughout
+    """
+    robots = environment.robots
+    swarm = CompiledSwarmState(len(robots), robots[0].config, np.random.default_rng(0))
+    swarm.position = np.array([robot.position for robot in robots], dtype=float)
+    swarm.chosen_waypoint = np.array([robot.chosen_waypoint for robot in robots], dtype=float)
+    swarm.motion_vector = np.array([robot.motion_vector for robot in robots], dtype=float)
+    swarm.sample_colour = np.array([robot.sample_colour or 0 for robot in robots])
+    swarm.decision_state = np.array([robot.decision_state for robot in robots])
+    swarm.commited_estimation = np.array([robot.commited_estimation for robot in robots], dtype=float)
+    swarm.broadcast_frequency = np.array([robot.broadcast_frequency for robot in robots], dtype=float)
+    for robot in robots:
+        robot.rng = ReplayRandom()
+
+    for tick in range(num_ticks):
+        environment.time = tick * environment.interval
+        previous_waypoints = swarm.chosen_waypoint.copy()
+        cursor = swarm.cursor
+        swarm.step(environment.grid, environment.time)
+        for i in np.flatnonzero((swarm.chosen_waypoint != previous_waypoints).any(axis=1)):
+            robots[i].rng.waypoints.extend(swarm.waypoints[cursor])
+            cursor += 1
+        if environment.time % swarm.config.update_interval <= ATOL:
+            for robot, coin in zip(robots, swarm.coins):
+                robot.rng.coin = coin
+        environment.step()
+        if not robots_match(robots, swarm):
+            return tick
+    return None
+
+
+def robots_match(robots, swarm):
+    """
+    Whether every Robot is in the same state as its counterpart in swarm
+    """
+    return (np.allclose([robot.position for robot in robots], swarm.position, rtol=0, atol=1e-9)
+            and [robot.decision_state for robot in robots] == swarm.decision_state.tolist()
+            and [robot.sample_colour or 0 for robot in robots] == swarm.sample_colour.tolist()
+            and [robot.sample_count for robot in robots] == swarm.sample_count.tolist()
+            and [robot.sample_colour_occurences for robot in robots] == swarm.sample_colour_occurences.tolist()
+            and [robot.sample_evidence for robot in robots] == swarm.sample_evidence.tolist()
+            and [robot.new_recruit for robot in robots] == swarm.new_recruit.tolist()
+            and np.allclose([robot.commited_estimation for robot in robots], swarm.commited_estimation)
+            and np.allclose([robot.broadcast_frequency for robot in robots], swarm.broadcast_frequency))
+
+
+def main():
+    import experiment_objects.Config as c
+    import experiment_objects.Environment as e
+    parser = argparse.ArgumentParser(description="Check the compiled kernels against Robot")
+    parser.add_argument("--ticks", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--communication-range", type=float, default=c.COMMUNICATION_RANGE)
+    args = parser.parse_args()
+    robot_config = c.RobotConfig(communication_range=args.communication_range)
+    environment = e.Environment(c.EnvironmentConfig(robot=robot_config, engine="robot"), args.seed)
+    print(f"Kernels: {'numba' if njit is not None else 'pure Python'}")
+    tick = check_parity(environment, args.ticks)
+    if tick is None:
+        print(f"Parity: kernels match Robot over {args.ticks} ticks")
+    else:
+        print(f"Parity: kernels differ from Robot at tick {tick}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
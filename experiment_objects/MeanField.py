@@ -0,0 +1,347 @@
+"""
+Population-level approximation of the simulation. Robots are not simulated: only the number of robots
+in each decision state and sample cycle phase is, with the probability of every transition estimated
+from the RobotConfig, the grid's colour proportions and the density of robots within communication range.
+Runs in milliseconds, so large parameter spaces can be screened before running the agent-based engines
+on the interesting regions.
+"""
+import argparse
+import math
+import time
+import numpy as np
+import experiment_objects.Recorder as rec
+import experiment_objects.Stopping as stop
+
+# How often the state is recorded, as in Environment.run
+RECORD_INTERVAL = 200
+# How often a gradual change shifts the colour proportions, as in Environment.apply_gradual_change
+CHANGE_INTERVAL = 300
+# Points the neighbour probability is integrated over
+INTEGRATION_POINTS = 1000
+# Layers robots are counted in: robots sampling a colour of the grid, robots still in the cycle they
+# started the run with, and recruits sampling the colour they were recruited to
+NORMAL, INITIAL, RECRUIT = range(3)
+LAYERS = 3
+
+
+def neighbour_probability(grid_size, communication_range):
+    """
+    Probability that two robots placed uniformly at random on the grid are within communication range,
+    edges included: the integral over the x distance of its density times the probability of a close
+    enough y distance.
+    params:
+      grid_size: (Tuple : int) # col, # row
+    return: (float)
+    """
+    width, height = grid_size
+    dx = np.linspace(0, width, INTEGRATION_POINTS)
+    density = 2 * (width - dx) / width ** 2
+    dy = np.minimum(np.sqrt(np.maximum(communication_range ** 2 - dx ** 2, 0)), height)
+    probability = np.where(dx < communication_range, 2 * dy / height - dy ** 2 / height ** 2, 0)
+    return float(np.clip(np.trapezoid(density * probability, dx), 0, 1))
+
+
+def binomial_pmf(trials, p):
+    """
+    return: (np.ndarray) array of shape (len(p), trials + 1), P(X = x) for X ~ Binomial(trials, p) of each p
+    """
+    x = np.arange(trials + 1)
+    p = np.asarray(p, dtype=float)[:, None]
+    coefficients = np.array([math.comb(trials, k) for k in x], dtype=float)
+    return coefficients * p ** x * (1 - p) ** (trials - x)
+
+
+def cycle_evidence(config, colour_prob, sample_prob=None, estimate=None):
+    """
+    Probability that a sample cycle ends with evidence for each colour, by decision state. The samples
+    of a cycle are taken far enough apart to be independent. An uncommitted robot gets evidence if any
+    sample matched, a committed one only if the concentration of another colour beats its estimate.
+    params:
+      config: (Config.RobotConfig)
+      colour_prob: (List : float) proportion of each colour on the grid
+      sample_prob: (List : float) probability of sampling each colour, colour_prob if None
+      estimate: (float) estimate committed robots hold, a cycle's sample of their colour if None
+    return: (np.ndarray) array of shape (states, states), [state, colour] with colour 0 unused
+    """
+    length = config.sample_cycle_length
+    sample_prob = np.asarray(colour_prob if sample_prob is None else sample_prob, dtype=float)
+    pmf = binomial_pmf(length, colour_prob)
+    # P(X > x) of each colour
+    survival = np.clip(1 - np.cumsum(pmf, axis=1), 0, 1)
+    num_colours = len(colour_prob)
+    evidence = np.zeros((num_colours + 1, num_colours + 1))
+    evidence[0, 1:] = sample_prob * (1 - pmf[:, 0])
+    for state in range(1, num_colours + 1):
+        if estimate is None:
+            beats = survival @ pmf[state - 1]
+        else:
+            beats = survival[:, min(math.floor(estimate * length), length)]
+        evidence[state, 1:] = sample_prob * beats
+        evidence[state, state] = 0
+    return evidence
+
+
+def initial_sample_prob(config, num_colours):
+    """
+    Probability of each colour being the one a robot samples in its first cycle, as Robot picks it
+    """
+    if config.sample_colour != None:
+        return np.eye(num_colours)[config.sample_colour - 1]
+    sample_prob = np.zeros(num_colours)
+    sample_prob[:2] = [0.2, 0.8]
+    return sample_prob
+
+
+def message_probability(counts, broadcasts, neighbour_chance):
+    """
+    Probability that the last message a robot received in an update interval is of each colour. Every
+    robot within range of a broadcaster is reached, and messages of different colours compete in
+    proportion to how often they are sent, as the latest one received is kept.
+    params:
+      counts: (np.ndarray) robots of each layer, state, phase and evidence
+      broadcasts: (np.ndarray) broadcasts per update interval of a robot of each layer, state and phase
+      neighbour_chance: (float) from neighbour_probability
+    return: (np.ndarray) probability of each message, index 0 (no message) unused
+    """
+    robots = counts.sum(axis=-1)
+    reach = neighbour_chance * np.minimum(broadcasts, 1)
+    # Rate of arrivals of each colour, -log of the chance none of its robots reached the robot
+    rate = -(robots * np.log1p(-np.minimum(reach, 1 - 1e-12))).sum(axis=(0, 2))
+    weight = (robots * broadcasts).sum(axis=(0, 2))
+    message = np.zeros(counts.shape[1])
+    if weight[1:].sum() > 0:
+        message[1:] = -np.expm1(-rate[1:].sum()) * weight[1:] / weight[1:].sum()
+    return message
+
+
+class MeanFieldEnvironment:
+    """
+    Stands in for an Environment: runs the same experiment on the number of robots in each state,
+    with the same recorder, stopping criteria, state_history format and adaptation_time.
+    Robots sample at the same times, so they are counted by their layer (NORMAL, INITIAL: still in the
+    cycle they started with, RECRUIT: sampling the colour they were recruited to), decision state,
+    phase in their sample cycle (0: no sample colour, then one more per sample event) and pending
+    evidence. The transitions of Robot's sampling and opinion updates move robots between them.
+    Deterministic by default, the expected counts (floats) of the mean-field equations. Stochastic
+    runs draw every robot's transition, a chain-binomial simulation of the master equation, with
+    whole counts.
+    """
+    def __init__(self, config, seed=None, recorder=None, stopping=None, stochastic=False) -> None:
+        """
+        params:
+          config: (Config.EnvironmentConfig) config of the experiment, its engine is ignored
+          seed: (int or np.random.SeedSequence) seed of a stochastic run
+          recorder: (Recorder.Recorder) receives the recorded states, a ListRecorder by default
+          stopping: (List : Stopping.StoppingCriterion) criteria ending the run, Stopping.default_criteria() by default.
+                    Reset here, so a list can be reused run after run but not by two environments at once
+          stochastic: (bool) draw the transitions instead of following the expected counts
+        """
+        self.config = config
+        self.robot_config = config.robot
+        self.grid_size = config.grid_size
+        self.colour_prob = list(config.colour_prob)
+        self.majority_colour = np.argmax(self.colour_prob) + 1
+        self.num_states = len(self.colour_prob) + 1
+        self.num_robots = config.num_robots
+        self.stochastic = stochastic
+        self.rng = np.random.default_rng(seed)
+        self.num_phases = self.robot_config.sample_cycle_length + 2
+        self.counts = np.zeros((LAYERS, self.num_states, self.num_phases, self.num_states), dtype=int if stochastic else float)
+        self.counts[INITIAL, self.robot_config.decision_state, 1, 0] = self.num_robots
+        self.neighbour_chance = neighbour_probability(self.grid_size, self.robot_config.communication_range)
+        self.initial_evidence = cycle_evidence(self.robot_config, self.colour_prob, initial_sample_prob(self.robot_config, len(self.colour_prob)),
+                                               self.robot_config.commited_estimation)
+        self.set_colour_prob(self.colour_prob)
+        self.time = 0
+        self.interval = config.interval
+        self.experiment_length = config.experiment_length
+        self.recorder = rec.ListRecorder() if recorder is None else recorder
+        self.recorder.record(0, self.get_state(), list(self.colour_prob))
+        self.adaptation_time = None
+        self.stopping = stop.default_criteria() if stopping is None else stopping
+        for criterion in self.stopping:
+            criterion.reset()
+        self.stopped_by = None
+        self.gradual_change = config.gradual_change
+        if self.gradual_change != None:
+            self.change_time = self.gradual_change.change_time
+            self.change_rate = 0.1 / (self.change_time / CHANGE_INTERVAL)
+        # Only the times something can happen are visited
+        intervals = [self.robot_config.update_interval, self.robot_config.sample_interval, RECORD_INTERVAL]
+        if self.gradual_change != None:
+            intervals.append(CHANGE_INTERVAL)
+        self.time_step = math.gcd(*(int(interval) for interval in intervals))
+
+    def run(self):
+        while self.time < self.experiment_length:
+            self.apply_gradual_change()
+            if self.time % self.robot_config.sample_interval == 0:
+                self.sampling_event()
+            if self.time % self.robot_config.update_interval == 0:
+                self.opinion_update_event()
+            if self.time % RECORD_INTERVAL == 0:
+                if self.record_state():
+                    return True
+            self.time += self.time_step
+        self.adaptation_time = None
+        self.recorder.flush()
+        return False
+
+    def record_state(self):
+        """
+        Record the current state and check the stopping criteria.
+        return: (bool) True if a stopping criterion has been met
+        """
+        current_state = self.get_state()
+        self.recorder.record(self.time, current_state, list(self.colour_prob))
+        met = [criterion for criterion in self.stopping if criterion.check(self, current_state)]
+        if met:
+            self.stopped_by = type(met[0]).__name__
+            self.recorder.flush()
+            return True
+        return False
+
+    def apply_gradual_change(self):
+        """
+        Shift the colour proportions as Environment.apply_gradual_change does
+        """
+        if self.gradual_change != None:
+            if self.time % CHANGE_INTERVAL == 0 and self.time > 0 and self.time <= self.change_time:
+                self.set_colour_prob([self.colour_prob[0] - self.change_rate, self.colour_prob[1] + self.change_rate])
+
+    def set_colour_prob(self, colour_prob):
+        """
+        Recompute what depends on the grid's colour proportions: the evidence a cycle ends with and how
+        often robots broadcast, from the estimate of their colour
+        """
+        self.colour_prob = colour_prob
+        self.evidence = cycle_evidence(self.robot_config, colour_prob)
+        config = self.robot_config
+        estimate = np.zeros((LAYERS, self.num_states, self.num_phases))
+        estimate[NORMAL, 1:] = np.asarray(colour_prob)[:, None]
+        estimate[INITIAL, 1:] = config.commited_estimation
+        # Recruits estimate from the samples of their first cycle so far, phase - 1 of them
+        samples_taken = np.maximum(np.arange(self.num_phases) - 1, 0)
+        estimate[RECRUIT, 1:] = np.asarray(colour_prob)[:, None] * samples_taken / config.sample_cycle_length
+        self.broadcasts = config.update_interval * 2 * np.minimum(2 * estimate, 1) / 100
+
+    def distribute(self, counts, probabilities):
+        """
+        Split counts between outcomes
+        params:
+          counts: (np.ndarray) robots in each cell
+          probabilities: (np.ndarray) probability of each outcome, the last axis
+        return: (np.ndarray) robots of each cell taking each outcome, shape counts.shape + (outcomes,)
+        """
+        probabilities = np.clip(probabilities, 0, None)
+        probabilities = probabilities / probabilities.sum(axis=-1, keepdims=True)
+        if self.stochastic:
+            return self.rng.multinomial(counts, probabilities)
+        return counts[..., None] * probabilities
+
+    def sampling_event(self):
+        """
+        Every robot starts, continues or ends its sample cycle, as Robot.sampling_routine. Robots ending
+        a cycle may gain evidence for a colour, otherwise they keep the evidence they had.
+        """
+        counts = np.zeros_like(self.counts)
+        counts[:, :, 1:] = self.counts[:, :, :-1]
+        ending = self.counts[:, :, -1]
+        for layer, evidence in ((NORMAL, self.evidence), (INITIAL, self.initial_evidence)):
+            for state in range(self.num_states):
+                outcomes = self.distribute(ending[layer, state], np.concatenate([[1 - evidence[state, 1:].sum()], evidence[state, 1:]]))
+                counts[NORMAL, state, 0] += outcomes[:, 0]
+                counts[NORMAL, state, 0, 1:] += outcomes[:, 1:].sum(axis=0)
+        # A recruit's first cycle samples its own colour, ending with a new estimate but no evidence
+        counts[NORMAL, :, 0] += ending[RECRUIT]
+        self.counts = counts
+
+    def opinion_update_event(self):
+        """
+        Every robot updates its opinion as Robot.opinion_update_routine: with both evidence and a message
+        it takes either at even odds. Discovery moves to the colour of the evidence, a message recruits an
+        uncommitted robot and cross-inhibits a robot of another colour.
+        """
+        message = message_probability(self.counts, self.broadcasts, self.neighbour_chance)
+        any_message = message.sum()
+        counts = np.zeros_like(self.counts)
+        for state in range(self.num_states):
+            for evidence in range(self.num_states):
+                # Outcomes: nothing happens, discovery, a social transition from a message of each colour
+                social = message[1:] / 2 if evidence else message[1:]
+                discovery = 1 - any_message / 2 if evidence else 0
+                outcomes = self.distribute(self.counts[:, state, :, evidence], np.concatenate([[1 - discovery - social.sum(), discovery], social]))
+                counts[:, state, :, evidence] += outcomes[..., 0]
+                counts[NORMAL, evidence, 0, 0] += outcomes[..., 1].sum()
+                for colour in range(1, self.num_states):
+                    moved = outcomes[..., colour + 1]
+                    if state == 0:
+                        counts[RECRUIT, colour, 1, 0] += moved.sum()
+                    elif colour != state:
+                        counts[NORMAL, 0, 0, 0] += moved.sum()
+                    else:
+                        # A message of its own colour changes nothing, evidence is kept for the next update
+                        counts[:, state, :, evidence] += moved
+        self.counts = counts
+
+    @property
+    def state_history(self):
+        return getattr(self.recorder, "state_history", None)
+
+    @property
+    def time_history(self):
+        return getattr(self.recorder, "time_history", None)
+
+    @property
+    def grid_colour_hist(self):
+        return getattr(self.recorder, "grid_colour_history", None)
+
+    def get_state(self):
+        """
+        Number of robots in each state currently: undecided, colour 1, colour 2, ...
+        """
+        return self.counts.sum(axis=(0, 2, 3)).tolist()
+
+    def get_pending_evidence(self):
+        """
+        Number of robots with sample evidence waiting for their next opinion update
+        """
+        return self.counts[..., 1:].sum()
+
+
+def main():
+    import dataclasses
+    import experiment_objects.Config as c
+    import experiment_objects.Environment as e
+    parser = argparse.ArgumentParser(description="Compare the mean-field approximation with the agent-based simulation")
+    parser.add_argument("--num-robots", type=int, default=c.NUM_ROBOTS)
+    parser.add_argument("--communication-range", type=float, default=c.COMMUNICATION_RANGE)
+    parser.add_argument("--runs", type=int, default=10, help="runs of the stochastic approximation and of the simulation")
+    parser.add_argument("--engine", default="swarm", help="engine of the simulation, see Environment.ENGINES, 'none' to skip it")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    config = c.EnvironmentConfig(num_robots=args.num_robots, robot=dataclasses.replace(c.RobotConfig(), communication_range=args.communication_range),
+                                 engine=args.engine)
+    seeds = np.random.SeedSequence(args.seed).spawn(args.runs)
+
+    def report(label, make):
+        start = time.perf_counter()
+        times = []
+        for seed in seeds:
+            environment = make(seed)
+            environment.run()
+            times.append(environment.adaptation_time)
+        adapted = [t for t in times if t is not None]
+        mean = f"{np.mean(adapted):.0f}" if adapted else "-"
+        print(f"{label:<14} adapted {len(adapted)}/{len(times)}, mean adaptation time {mean}, {(time.perf_counter() - start) / len(times) * 1e3:.1f} ms per run")
+
+    deterministic = MeanFieldEnvironment(config)
+    deterministic.run()
+    print(f"{'mean-field':<14} adaptation time {deterministic.adaptation_time}")
+    report("chain-binomial", lambda seed: MeanFieldEnvironment(config, seed, stochastic=True))
+    if args.engine != "none":
+        report(args.engine, lambda seed: e.Environment(config, seed))
+
+
+if __name__ == "__main__":
+    main()
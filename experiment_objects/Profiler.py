@@ -0,0 +1,144 @@
+import contextlib
+import time
+import numpy as np
+
+# Profiler every new Environment attaches to while profiling() is active
+active = None
+
+# Routines timed on each object, Environment.step and Robot.step_robot include the time of the routines they call
+ENVIRONMENT_ROUTINES = ("step", "record_state", "apply_gradual_change")
+ROBOT_ROUTINES = ("step_robot", "motion_routine", "sampling_routine", "broadcasting_routine", "opinion_update_routine")
+SWARM_ROUTINES = ("step", "motion_routine", "sampling_routine", "broadcasting_routine", "deliver_messages", "opinion_update_routine")
+
+
+class Profiler:
+    """
+    Opt-in instrumentation of a run: call counts and cumulative time of each routine, and the number
+    of broadcasts and of messages they delivered. Attaching replaces the routines of the environment's
+    objects with timed wrappers, so an environment without a profiler runs exactly as before.
+    """
+    def __init__(self) -> None:
+        self.calls = {}
+        self.time = {}
+        # Broadcasts that reached the neighbour search, and the neighbours they messaged
+        self.broadcasts = 0
+        self.messages = 0
+        # Timed subclass of each slotted robot class, see profiled_class
+        self.profiled_classes = {}
+
+    def attach(self, environment):
+        """
+        Instrument an Environment (or BatchEnvironment) and its robots or swarm
+        """
+        for name in ENVIRONMENT_ROUTINES:
+            if hasattr(environment, name):
+                self.wrap(environment, name, f"Environment.{name}")
+        for robot in getattr(environment, "robots", []):
+            if not hasattr(robot, "__dict__"):
+                # Slotted robots (Robot.CompactRobot) can not hold wrappers, they become a timed subclass instead
+                robot.__class__ = self.profiled_class(type(robot))
+                continue
+            for name in ROBOT_ROUTINES:
+                self.wrap(robot, name, f"Robot.{name}")
+            self.wrap(robot, "find_all_neighbours", "Robot.find_all_neighbours", self.count_neighbours)
+        if environment.swarm is not None:
+            for name in SWARM_ROUTINES:
+                self.wrap(environment.swarm, name, f"SwarmState.{name}", self.count_pairs if name == "broadcasting_routine" else None)
+
+    def wrap(self, obj, name, label, count=None):
+        """
+        Replace obj.name with a wrapper timing every call under label
+        params:
+          count: (Callable) optional count(result) called with the result of every call
+        """
+        setattr(obj, name, self.timed(getattr(obj, name), label, count))
+
+    def timed(self, method, label, count=None):
+        """
+        return: (Callable) method, timing every call under label
+        """
+        calls, times = self.calls, self.time
+        calls.setdefault(label, 0)
+        times.setdefault(label, 0.0)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            times[label] += time.perf_counter() - start
+            calls[label] += 1
+            if count is not None:
+                count(result)
+            return result
+        return timed
+
+    def profiled_class(self, cls):
+        """
+        Subclass of a slotted robot class with the same layout whose routines are timed, so its
+        robots can be instrumented by switching their class
+        """
+        if cls not in self.profiled_classes:
+            routines = {name: self.timed(getattr(cls, name), f"Robot.{name}") for name in ROBOT_ROUTINES}
+            routines["find_all_neighbours"] = self.timed(cls.find_all_neighbours, "Robot.find_all_neighbours", self.count_neighbours)
+            self.profiled_classes[cls] = type(cls.__name__, (cls,), dict(routines, __slots__=(), __module__=cls.__module__))
+        return self.profiled_classes[cls]
+
+    def count_neighbours(self, neighbours):
+        self.broadcasts += 1
+        self.messages += len(neighbours)
+
+    def count_pairs(self, pairs):
+        senders, receivers = pairs
+        self.broadcasts += np.unique(senders).size
+        self.messages += receivers.size
+
+    def report(self):
+        """
+        return: (Dict) JSON friendly counts and times, combined across runs with merge
+        """
+        return {"routines": {label: {"calls": self.calls[label], "time": self.time[label]} for label in self.calls},
+                "broadcasts": self.broadcasts, "messages": self.messages}
+
+
+@contextlib.contextmanager
+def profiling():
+    """
+    Attach a new Profiler to every Environment created within the block
+    return: (Profiler)
+    """
+    global active
+    previous, active = active, Profiler()
+    try:
+        yield active
+    finally:
+        active = previous
+
+
+def merge(reports):
+    """
+    Sum the reports of several runs
+    params:
+      reports: (List : Dict) reports from Profiler.report
+    return: (Dict)
+    """
+    merged = {"routines": {}, "broadcasts": 0, "messages": 0}
+    for report in reports:
+        for label, routine in report["routines"].items():
+            total = merged["routines"].setdefault(label, {"calls": 0, "time": 0.0})
+            total["calls"] += routine["calls"]
+            total["time"] += routine["time"]
+        merged["broadcasts"] += report["broadcasts"]
+        merged["messages"] += report["messages"]
+    return merged
+
+
+def format_report(report):
+    """
+    Table of a report, slowest routine first
+    return: (str)
+    """
+    lines = [f"{'routine':<34}{'calls':>12}{'total s':>12}{'per call us':>14}"]
+    for label, routine in sorted(report["routines"].items(), key=lambda item: -item[1]["time"]):
+        per_call = routine["time"] / routine["calls"] * 1e6 if routine["calls"] else 0
+        lines.append(f"{label:<34}{routine['calls']:>12}{routine['time']:>12.3f}{per_call:>14.2f}")
+    per_broadcast = report["messages"] / report["broadcasts"] if report["broadcasts"] else 0
+    lines.append(f"broadcasts: {report['broadcasts']}, messages: {report['messages']}, neighbours per broadcast: {per_broadcast:.2f}")
+    return "\n".join(lines)
@@ -0,0 +1,209 @@
+import json
+import os
+import numpy as np
+
+
+class Recorder:
+    """
+    Receives the state of an Environment every time it is recorded during a run.
+    Subclasses decide what to keep, so memory does not have to grow with the length of the run.
+    """
+    # Whether record_robots should be called, gathering per-robot traces is skipped otherwise
+    wants_robots = False
+
+    def record(self, time, state, proportions=None):
+        """
+        params:
+          time: (float) Current time of the environment
+          state: (List : int) number of robots in each state: undecided, colour 1, colour 2, ...
+          proportions: (List : float) proportion of the grid of each colour: colour 1, colour 2, ...
+        """
+        raise NotImplementedError
+
+    def record_robots(self, time, positions, decision_states):
+        """
+        Per-robot trace, only called if wants_robots is set
+        params:
+          time: (float) Current time of the environment
+          positions: (np.ndarray) shape (num_robots, 2)
+          decision_states: (np.ndarray) shape (num_robots,)
+        """
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class ListRecorder(Recorder):
+    """
+    Keeps the whole history in memory, as lists of states, times and grid colour proportions.
+    """
+    def __init__(self) -> None:
+        self.state_history = []
+        self.time_history = []
+        self.grid_colour_history = []
+
+    def record(self, time, state, proportions=None):
+        self.state_history.append(state)
+        self.time_history.append(time)
+        if proportions is not None:
+            self.grid_colour_history.append(proportions)
+
+
+class FileRecorder(Recorder):
+    """
+    Streams every record to an append-only binary file of fixed-size records, and optionally the
+    position and decision state of every robot to a second file. Nothing is kept in memory.
+    Read back with read_records.
+    """
+    def __init__(self, path, robots=False) -> None:
+        """
+        params:
+          path: (str) file to append state records to, robot traces go to path + ".robots"
+          robots: (bool) also record per-robot traces
+        """
+        self.path = path
+        self.wants_robots = robots
+        self.file = None
+        self.robot_file = None
+
+    def record(self, time, state, proportions=None):
+        if self.file is None:
+            fields = [("time", "<f8"), ("state", "<i4", (len(state),))]
+            if proportions is not None:
+                fields.append(("proportions", "<f8", (len(proportions),)))
+            self.dtype = np.dtype(fields)
+            self.file = open_records(self.path, self.dtype)
+        values = (time, state) if len(self.dtype) == 2 else (time, state, proportions)
+        self.file.write(np.array(values, dtype=self.dtype).tobytes())
+
+    def record_robots(self, time, positions, decision_states):
+        if self.robot_file is None:
+            num_robots = len(decision_states)
+            self.robot_dtype = np.dtype([("time", "<f8"), ("position", "<f4", (num_robots, 2)), ("decision_state", "u1", (num_robots,))])
+            self.robot_file = open_records(self.path + ".robots", self.robot_dtype)
+        self.robot_file.write(np.array((time, positions, decision_states), dtype=self.robot_dtype).tobytes())
+
+    def flush(self):
+        for f in (self.file, self.robot_file):
+            if f is not None:
+                f.flush()
+
+    def close(self):
+        for f in (self.file, self.robot_file):
+            if f is not None:
+                f.close()
+        self.file = None
+        self.robot_file = None
+
+
+class DownsampleRecorder(Recorder):
+    """
+    Forwards only every stride-th record to another recorder.
+    """
+    def __init__(self, recorder, stride) -> None:
+        self.recorder = recorder
+        self.stride = stride
+        self.count = 0
+        self.robot_count = 0
+
+    @property
+    def wants_robots(self):
+        return self.recorder.wants_robots
+
+    def record(self, time, state, proportions=None):
+        if self.count % self.stride == 0:
+            self.recorder.record(time, state, proportions)
+        self.count += 1
+
+    def record_robots(self, time, positions, decision_states):
+        if self.robot_count % self.stride == 0:
+            self.recorder.record_robots(time, positions, decision_states)
+        self.robot_count += 1
+
+    def flush(self):
+        self.recorder.flush()
+
+    def close(self):
+        self.recorder.close()
+
+
+class AggregateRecorder(Recorder):
+    """
+    Keeps only running aggregates of each state count: mean, variance, min, max, and the last state
+    and grid colour proportions.
+    """
+    def __init__(self) -> None:
+        self.count = 0
+        self.mean = None
+        self.sum_squares = None
+        self.min = None
+        self.max = None
+        self.last_state = None
+        self.last_time = None
+        self.last_proportions = None
+
+    def record(self, time, state, proportions=None):
+        state = np.asarray(state, dtype=float)
+        self.count += 1
+        if self.mean is None:
+            self.mean = state.copy()
+            self.sum_squares = np.zeros_like(state)
+            self.min = state.copy()
+            self.max = state.copy()
+        else:
+            # Welford's online update
+            delta = state - self.mean
+            self.mean += delta / self.count
+            self.sum_squares += delta * (state - self.mean)
+            np.minimum(self.min, state, out=self.min)
+            np.maximum(self.max, state, out=self.max)
+        self.last_state = state
+        self.last_time = time
+        self.last_proportions = proportions
+
+    @property
+    def variance(self):
+        return self.sum_squares / max(self.count - 1, 1)
+
+
+def open_records(path, dtype):
+    """
+    Open an append-only record file, writing its dtype alongside it as path + ".json". Records are only
+    appended to an existing file of the same dtype, as the old ones would be unreadable under another header.
+    params:
+      path: (str)
+      dtype: (np.dtype) structured dtype of one record
+    return: file object
+    """
+    descr = json.loads(json.dumps(dtype.descr))
+    if os.path.exists(path) and os.path.getsize(path) > 0:
+        try:
+            with open(path + ".json") as f:
+                existing = json.load(f)
+        except FileNotFoundError:
+            existing = None
+        if existing != descr:
+            raise ValueError(f"{path} holds records of another dtype, remove it or record to another path")
+    else:
+        with open(path + ".json", "w") as f:
+            json.dump(descr, f)
+    return open(path, "ab")
+
+
+def read_records(path, mmap=True):
+    """
+    Load a file written by FileRecorder
+    params:
+      path: (str) path of the state records or the robot traces
+      mmap: (bool) memory-map the file instead of reading it
+    return: (np.ndarray) structured array with one element per record
+    """
+    with open(path + ".json") as f:
+        dtype = np.dtype([tuple(field[:2]) + tuple(tuple(shape) for shape in field[2:]) for field in json.load(f)])
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode="r")
+    return np.fromfile(path, dtype=dtype)
@@ -2,43 +2,40 @@ import random
 import numpy as np
 import math
 
-class Robot:
+# Absolute tolerance of np.isclose(value, 0), which CompactRobot checks with plain floats
+ATOL = 1e-08
+
+class RobotBase:
     """
-    Simulated robot.
+    Behaviour of a simulated robot, shared by Robot and the slotted CompactRobot. Declares no state
+    of its own, so a subclass with __slots__ has no __dict__.
     """
-    def __init__(self, id, environment, update_interval, sample_cycle_length, sample_interval, speed, communication_range, env_interval, grid_size, sample_colour, decision_state, commited_estimation, position) -> None:
+    __slots__ = ()
+
+    def __init__(self, id, environment, config, rng=None) -> None:
         # ID (index in robots list)
         self.id = id
+        # Random number generator of this robot, the global random module if not given
+        self.rng = random if rng is None else rng
         # Environment the robot is within
         self.environment = environment
-        # How often to update opinion
-        self.update_interval = update_interval
-        # Number of samples to take in a cycle
-        self.sample_cycle_length = sample_cycle_length
-        # Amount of time between each sample
-        self.sample_interval = sample_interval
-        # Speed the robot moves at
-        self.speed = speed
-        # Range of broadcast messages
-        self.communication_range = communication_range
-        # How often the environment updates
-        self.env_interval = env_interval
-        # Size of grid
-        self.grid_size = grid_size
+        # Parameters shared by every robot (Config.RobotConfig), only the state that varies is stored per robot
+        self.config = config
+        grid_size = config.grid_size
         # Current position of Robot
-        if position == None:
-            self.position = random.uniform(0, grid_size[0]), random.uniform(0, grid_size[1])
+        if config.position == None:
+            self.position = self.rng.uniform(0, grid_size[0]), self.rng.uniform(0, grid_size[1])
         else:
-            self.position = position
+            self.position = config.position
 
         # The colour the robot is looking for
-        if sample_colour == None:
-            if random.uniform(0,1) > 0.2:
+        if config.sample_colour == None:
+            if self.rng.uniform(0,1) > 0.2:
                 self.sample_colour = 2
             else:
                 self.sample_colour = 1
         else:
-            self.sample_colour = sample_colour
+            self.sample_colour = config.sample_colour
         # Number of occurences in sample of sample_colour
         self.sample_colour_occurences = 0
         # Is there self-evidence to be considered in the opinion update routine, non-zero if there is: int representing colour
@@ -49,36 +46,34 @@ class Robot:
         self.sample_count = 0
 
         # Current state of Robot: Uncommitted, colour 1, colour 2, etc.
-        self.decision_state = decision_state
+        self.decision_state = config.decision_state
         # Current estimation of concentration of colour Robot is committed to
-        self.commited_estimation = commited_estimation
+        self.commited_estimation = config.commited_estimation
         # The last recieved message from a neighbour within the last update interval
         self.neighbour_message = None
         # Is Robot newly recruited
         self.new_recruit = False
         # Broadcast frequency
-        self.broadcast_frequency = 2 * min(2 * commited_estimation, 1)
+        self.broadcast_frequency = 2 * min(2 * config.commited_estimation, 1)
         # Destination for current path
-        self.chosen_waypoint = None
         self.choose_random_waypoint()
         # Normalised direction vector to current waypoint 
-        self.motion_vector = None
         self.get_motion_vector()
     
     def step_robot(self, env_grid, robots):
         """
         Function to be called at each update of the environment
         parameters:
-          env_grid: (List[List : int]) The current grid of the environment
+          env_grid: (np.ndarray) The current grid of the environment, indexed [row, col]
           robots: (List : Robot) List of all Robot's in the environment
         """
         self.motion_routine()
-        if np.isclose(self.environment.time % self.sample_interval, 0):
+        if np.isclose(self.environment.time % self.config.sample_interval, 0):
             self.sampling_routine(env_grid)
         if self.broadcast_frequency != 0:
             if np.isclose(self.environment.time %  ((1 / self.broadcast_frequency) * 100), 0):
                 self.broadcasting_routine(robots)
-        if np.isclose(self.environment.time % self.update_interval, 0):
+        if np.isclose(self.environment.time % self.config.update_interval, 0):
             self.opinion_update_routine()
             self.neighbour_message = None
         
@@ -88,7 +83,7 @@ class Robot:
         Pick new waypoint if destination reached.
         """
         distance_to_waypoint = self.get_distance_to_point(self.chosen_waypoint)
-        step_size = self.env_interval * self.speed
+        step_size = self.config.env_interval * self.config.speed
         if distance_to_waypoint < step_size:
             if np.isclose(distance_to_waypoint, 0):
                 # Pick new waypoint
@@ -104,7 +99,7 @@ class Robot:
         Given current evidence and state, update opinion
         """
         if self.sample_evidence and self.neighbour_message != None:
-            if random.uniform(0,1) > 0.5:
+            if self.rng.uniform(0,1) > 0.5:
                 self.discovery_transition()
             else:
                 self.social_transition()
@@ -117,12 +112,12 @@ class Robot:
         """
         The sample routine to be called every after every sample_interval length of time.
         parameters:
-          env_grid: (List[List : int]) The current grid of the environment
+          env_grid: (np.ndarray) The current grid of the environment, indexed [row, col]
         """
         if self.sample_colour == None:
             self.start_sample_routine(env_grid)
         else:
-            if self.sample_count < self.sample_cycle_length:
+            if self.sample_count < self.config.sample_cycle_length:
                 self.take_sample(env_grid)
             else:
                 self.handle_end_of_sample_cycle()
@@ -142,7 +137,7 @@ class Robot:
         """
         Choose a coordinate uniformly at random from the grid
         """
-        self.chosen_waypoint = random.uniform(0, self.grid_size[0]), random.uniform(0, self.grid_size[1])
+        self.chosen_waypoint = self.rng.uniform(0, self.config.grid_size[0]), self.rng.uniform(0, self.config.grid_size[1])
     
     def get_motion_vector(self):
         """
@@ -163,6 +158,7 @@ class Robot:
           y: (float) y direction vector
         """
         self.position = self.position[0] + x, self.position[1] + y
+        self.environment.neighbour_index.move(self.id, self.position)
 
     def get_distance_to_point(self, point):
         """
@@ -225,10 +221,10 @@ class Robot:
     def start_sample_routine(self, env_grid):
         """
         parameters:
-          env_grid: (List[List : int]) The current grid of the environment
+          env_grid: (np.ndarray) The current grid of the environment, indexed [row, col]
         """
         col, row = self.get_square_robot_is_over()
-        self.sample_colour = env_grid[row][col]
+        self.sample_colour = int(env_grid[row, col])
         self.sample_count = 0
         self.sample_colour_occurences = 0
 
@@ -236,13 +232,13 @@ class Robot:
         """
         Take a sample of the environment. If new recruit, update broadcast frequency.
         parameters:
-          env_grid: (List[List : int]) The current grid of the environment
+          env_grid: (np.ndarray) The current grid of the environment, indexed [row, col]
         """
         if self.is_robot_over_sample_colour(env_grid):
             self.sample_colour_occurences += 1
         self.sample_count += 1
         if self.new_recruit:
-            self.broadcast_frequency = 2 * min(2 * self.sample_colour_occurences / self.sample_cycle_length, 1)
+            self.broadcast_frequency = 2 * min(2 * self.sample_colour_occurences / self.config.sample_cycle_length, 1)
 
     def handle_end_of_sample_cycle(self):
         sample_colour_concentration = self.sample_colour_occurences / self.sample_count
@@ -264,11 +260,11 @@ class Robot:
         """
         Return whether the sample_colour is present at the current square
         parameters:
-          env_grid: (List[List : int]) The current grid of the environment
+          env_grid: (np.ndarray) The current grid of the environment, indexed [row, col]
         return: (bool) True if the sample_colour is present, False otherwise
         """
         col, row = self.get_square_robot_is_over()
-        return env_grid[row][col] == self.sample_colour
+        return env_grid[row, col] == self.sample_colour
     
     def get_square_robot_is_over(self):
         """
@@ -279,14 +275,158 @@ class Robot:
     # Broadcast helper functions
     def find_all_neighbours(self, robots):
         """
-        Find all neighbours within communication range
+        Find all neighbours within communication range. Only the robots the environment's
+        spatial index offers as candidates are checked.
         return: (List : int) List of indices of neighbours
         """
         neighbour_indices = []
-        for i, robot in enumerate(robots):
-            if self.get_distance_to_point(robot.position) < self.communication_range:
+        for i in self.environment.neighbour_index.candidates(self.position):
+            if self.get_distance_to_point(robots[i].position) < self.config.communication_range:
                 if i == self.id:
                     continue
                 else:
                     neighbour_indices.append(i)
+        neighbour_indices.sort()
+        return neighbour_indices
+
+
+class Robot(RobotBase):
+    """
+    Simulated robot.
+    """
+
+
+class CompactRobot(RobotBase):
+    """
+    Robot of the "compact" engine, behaving exactly as Robot. Its state lives in __slots__ (it has no
+    __dict__) and its position, waypoint and motion vector are plain floats updated in place with math,
+    so a tick allocates no tuples or NumPy scalars. position, chosen_waypoint and motion_vector are
+    still readable and assignable as tuples.
+    """
+    __slots__ = ("id", "rng", "environment", "config", "x", "y", "waypoint_x", "waypoint_y", "motion_x", "motion_y",
+                 "sample_colour", "sample_colour_occurences", "sample_evidence", "self_evidence_estimate", "sample_count",
+                 "decision_state", "commited_estimation", "neighbour_message", "new_recruit", "broadcast_frequency")
+
+    @property
+    def position(self):
+        return self.x, self.y
+
+    @position.setter
+    def position(self, position):
+        self.x, self.y = position
+
+    @property
+    def chosen_waypoint(self):
+        return self.waypoint_x, self.waypoint_y
+
+    @chosen_waypoint.setter
+    def chosen_waypoint(self, waypoint):
+        self.waypoint_x, self.waypoint_y = waypoint
+
+    @property
+    def motion_vector(self):
+        return self.motion_x, self.motion_y
+
+    @motion_vector.setter
+    def motion_vector(self, motion_vector):
+        self.motion_x, self.motion_y = motion_vector
+
+    def step_robot(self, env_grid, robots):
+        """
+        Function to be called at each update of the environment
+        parameters:
+          env_grid: (np.ndarray) The current grid of the environment, indexed [row, col]
+          robots: (List : CompactRobot) List of all Robot's in the environment
+        """
+        time = self.environment.time
+        self.motion_routine()
+        if abs(time % self.config.sample_interval) <= ATOL:
+            self.sampling_routine(env_grid)
+        if self.broadcast_frequency != 0:
+            if abs(time % ((1 / self.broadcast_frequency) * 100)) <= ATOL:
+                self.broadcasting_routine(robots)
+        if abs(time % self.config.update_interval) <= ATOL:
+            self.opinion_update_routine()
+            self.neighbour_message = None
+
+    def motion_routine(self):
+        """
+        Handle motion of Robot. Move towards current waypoint at each timestep.
+        Pick new waypoint if destination reached.
+        """
+        x = self.x - self.waypoint_x
+        y = self.y - self.waypoint_y
+        distance_to_waypoint = math.sqrt(x * x + y * y)
+        step_size = self.config.env_interval * self.config.speed
+        if distance_to_waypoint < step_size:
+            if distance_to_waypoint <= ATOL:
+                # Pick new waypoint
+                self.choose_random_waypoint()
+                self.get_motion_vector()
+            else:
+                self.update_position(self.motion_x * distance_to_waypoint, self.motion_y * distance_to_waypoint)
+        else:
+            self.update_position(self.motion_x * step_size, self.motion_y * step_size)
+
+    # Motion helper functions
+    def choose_random_waypoint(self):
+        """
+        Choose a coordinate uniformly at random from the grid
+        """
+        self.waypoint_x = self.rng.uniform(0, self.config.grid_size[0])
+        self.waypoint_y = self.rng.uniform(0, self.config.grid_size[1])
+
+    def get_motion_vector(self):
+        """
+        Find the normalised direction vector to the chosen waypoint from the Robot's position.
+        """
+        x = self.waypoint_x - self.x
+        y = self.waypoint_y - self.y
+        magnitude = math.sqrt(x**2 + y**2)
+        self.motion_x = x / magnitude
+        self.motion_y = y / magnitude
+
+    def update_position(self, x, y):
+        """
+        Move the robot.
+        params:
+          x: (float) x direction vector
+          y: (float) y direction vector
+        """
+        self.x += x
+        self.y += y
+        self.environment.neighbour_index.move(self.id, (self.x, self.y))
+
+    def get_distance_to_point(self, point):
+        """
+        Get the distance from the Robot's current position to a point
+        params:
+          point: (Tuple : float)
+        """
+        x = self.x - point[0]
+        y = self.y - point[1]
+        return math.sqrt(x * x + y * y)
+
+    def get_square_robot_is_over(self):
+        """
+        Given the Robot's current position, get the row and col index of the square it is currently on.
+        """
+        return math.floor(self.x), math.floor(self.y)
+
+    # Broadcast helper functions
+    def find_all_neighbours(self, robots):
+        """
+        Find all neighbours within communication range. Only the robots the environment's
+        spatial index offers as candidates are checked.
+        return: (List : int) List of indices of neighbours
+        """
+        neighbour_indices = []
+        communication_range = self.config.communication_range
+        for i in self.environment.neighbour_index.candidates((self.x, self.y)):
+            robot = robots[i]
+            x = self.x - robot.x
+            y = self.y - robot.y
+            if math.sqrt(x * x + y * y) < communication_range and i != self.id:
+                neighbour_indices.append(i)
+        neighbour_indices.sort()
         return neighbour_indices
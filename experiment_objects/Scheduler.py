@@ -0,0 +1,278 @@
+import heapq
+import math
+import numpy as np
+
+# Phase of each event within a tick, in the order Robot.step_robot runs its routines
+WAYPOINT = 0
+SAMPLE = 1
+BROADCAST = 2
+UPDATE = 3
+# How often the environment records its state
+RECORD_INTERVAL = 200
+# Absolute tolerance of the np.isclose(x, 0) checks in Robot
+ATOL = 1e-8
+
+
+class EventScheduler:
+    """
+    Discrete-event replacement for the tick loop in Environment.run.
+    A priority queue holds the next waypoint arrival, sample, broadcast and opinion update of
+    every robot, ordered by (tick, robot id, phase) exactly as the tick loop visits them, so the
+    same events happen in the same order (and draw the same random numbers) without visiting
+    idle ticks. Motion between events is piecewise linear and is evaluated analytically, so
+    positions can differ from the tick loop by floating point rounding only.
+    """
+    def __init__(self, environment, checkpoint=None) -> None:
+        """
+        params:
+          environment: (Environment) environment to run, from its current time
+          checkpoint: (Checkpoint.Checkpointer) called at the start of every tick at a multiple of its interval
+        """
+        self.env = environment
+        self.checkpoint = checkpoint
+        self.robots = environment.robots
+        self.num_robots = len(self.robots)
+        self.interval = environment.interval
+        self.start_tick = round(environment.time / self.interval)
+        # Ticks whose time is still before the end of the experiment
+        self.num_ticks = math.ceil(environment.experiment_length / self.interval)
+        self.queue = []
+        # Ticks at which a periodic check passes, keyed by period
+        self.fire_ticks = {}
+
+        # Current straight line segment of each robot: the tick it started, its start position and length
+        self.segment_tick = [self.start_tick - 1] * self.num_robots
+        self.segment_start = [robot.position for robot in self.robots]
+        self.segment_length = [0.0] * self.num_robots
+        # Broadcast frequency the pending broadcast of each robot was scheduled with, and its version
+        self.broadcast_frequency = [robot.broadcast_frequency for robot in self.robots]
+        self.broadcast_version = [0] * self.num_robots
+        # Tick robot positions were last brought up to date for a broadcast, and the highest id moved to it
+        self.synced_tick = None
+        self.synced_upto = -1
+
+        for i, robot in enumerate(self.robots):
+            self.start_segment(i, self.start_tick - 1, robot.position)
+            self.push(self.next_fire(robot.config.sample_interval, self.start_tick), i, SAMPLE)
+            if robot.broadcast_frequency != 0:
+                self.push(self.next_fire((1 / robot.broadcast_frequency) * 100, self.start_tick), i, BROADCAST)
+            self.push(self.next_fire(robot.config.update_interval, self.start_tick), i, UPDATE)
+        self.push(self.next_record(self.start_tick), self.num_robots, 0)
+        if environment.gradual_change != None:
+            self.push(self.next_grid_change(self.start_tick), -1, 0, 0)
+        if checkpoint is not None:
+            self.checkpoint_ticks = round(checkpoint.interval / self.interval)
+            self.push(self.next_checkpoint(self.start_tick), -2, 0, 0)
+
+    def run(self):
+        """
+        Process events in order until the experiment ends or the swarm has adapted.
+        return: (bool) True if the run stopped early after adapting, as Environment.run
+        """
+        while self.queue:
+            tick, i, phase, version = heapq.heappop(self.queue)
+            self.env.time = tick * self.interval
+            if i == -2:
+                # Checkpoints are taken between ticks, before the tick's grid change
+                self.save_checkpoint(tick)
+                self.push(self.next_checkpoint(tick + 1), -2, 0, 0)
+                continue
+            if i == -1:
+                # Grid changes happen at the start of a tick, before any robot moves
+                self.env.apply_gradual_change()
+                self.push(self.next_grid_change(tick + 1), -1, 0, 0)
+                continue
+            if i == self.num_robots:
+                if self.env.recorder.wants_robots:
+                    self.finish(tick)
+                if self.env.record_state():
+                    self.finish(tick)
+                    self.env.time = tick * self.interval
+                    return True
+                self.push(self.next_record(tick + 1), i, 0)
+                continue
+            robot = self.robots[i]
+            if phase == WAYPOINT:
+                arrival = self.position_at(i, tick)
+                robot.choose_random_waypoint()
+                robot.position = arrival
+                robot.get_motion_vector()
+                self.start_segment(i, tick, arrival)
+            elif phase == SAMPLE:
+                self.place(i, tick)
+                robot.sampling_routine(self.env.grid)
+                self.reschedule_broadcast(i, tick)
+                self.push(self.next_fire(robot.config.sample_interval, tick + 1), i, SAMPLE)
+            elif phase == BROADCAST:
+                if version != self.broadcast_version[i]:
+                    continue
+                self.sync_positions(i, tick)
+                robot.broadcasting_routine(self.robots)
+                self.push(self.next_fire((1 / robot.broadcast_frequency) * 100, tick + 1), i, BROADCAST, version)
+            else:
+                robot.opinion_update_routine()
+                robot.neighbour_message = None
+                self.reschedule_broadcast(i, tick + 1)
+                self.push(self.next_fire(robot.config.update_interval, tick + 1), i, UPDATE)
+        self.finish(self.num_ticks - 1)
+        self.env.time = self.num_ticks * self.interval
+        self.env.adaptation_time = None
+        self.env.recorder.flush()
+        return False
+
+    def save_checkpoint(self, tick):
+        """
+        Call the checkpoint with every robot where the tick loop leaves it before the given tick
+        """
+        self.finish(tick - 1)
+        self.checkpoint(self.env)
+
+    def finish(self, tick):
+        """
+        Move every robot to where the tick loop would have left it after the given tick.
+        params:
+          tick: (int) last tick processed
+        """
+        for i in range(self.num_robots):
+            self.place(i, tick)
+
+    def push(self, tick, i, phase, version=None):
+        """
+        Queue an event, ignoring events past the end of the experiment.
+        params:
+          tick: (int or None) tick of the event
+          i: (int) robot id, num_robots for the environment's record event, -1 for a grid change or -2 for a checkpoint
+          phase: (int) WAYPOINT, SAMPLE, BROADCAST or UPDATE
+          version: (int) broadcast version, defaults to the robot's current one
+        """
+        if tick is None or tick >= self.num_ticks:
+            return
+        if version is None:
+            version = self.broadcast_version[i] if i < self.num_robots else 0
+        heapq.heappush(self.queue, (tick, i, phase, version))
+
+    def reschedule_broadcast(self, i, from_tick):
+        """
+        Replace the pending broadcast of robot i if its broadcast frequency has changed.
+        params:
+          i: (int) robot id
+          from_tick: (int) first tick the new broadcast can happen at
+        """
+        frequency = self.robots[i].broadcast_frequency
+        if frequency == self.broadcast_frequency[i]:
+            return
+        self.broadcast_frequency[i] = frequency
+        self.broadcast_version[i] += 1
+        if frequency != 0:
+            self.push(self.next_fire((1 / frequency) * 100, from_tick), i, BROADCAST)
+
+    # Timing helper functions
+    def get_fire_ticks(self, period):
+        """
+        Get every tick at which np.isclose(time % period, 0) holds, the check Robot.step_robot uses.
+        params:
+          period: (float)
+        return: (np.ndarray) sorted ticks
+        """
+        ticks = self.fire_ticks.get(period)
+        if ticks is None:
+            times = np.arange(self.num_ticks) * self.interval
+            ticks = np.flatnonzero(np.isclose(times % period, 0))
+            self.fire_ticks[period] = ticks
+        return ticks
+
+    def next_fire(self, period, from_tick):
+        """
+        Get the first tick at or after from_tick at which a routine with the given period runs
+        return: (int or None) None if it does not run again before the end of the experiment
+        """
+        ticks = self.get_fire_ticks(period)
+        index = np.searchsorted(ticks, from_tick)
+        return int(ticks[index]) if index < ticks.size else None
+
+    def next_record(self, from_tick):
+        """
+        Get the first tick at or after from_tick at which the environment records its state
+        """
+        ticks = self.fire_ticks.get("record")
+        if ticks is None:
+            ticks = np.flatnonzero(np.arange(self.num_ticks) * self.interval % RECORD_INTERVAL == 0)
+            self.fire_ticks["record"] = ticks
+        index = np.searchsorted(ticks, from_tick)
+        return int(ticks[index]) if index < ticks.size else None
+
+    def next_grid_change(self, from_tick):
+        """
+        Get the first tick at or after from_tick at which gradual change updates the grid
+        """
+        ticks = self.fire_ticks.get("grid")
+        if ticks is None:
+            times = np.arange(self.num_ticks) * self.interval
+            ticks = np.flatnonzero((times % 300 == 0) & (times > 0) & (times <= self.env.change_time))
+            self.fire_ticks["grid"] = ticks
+        index = np.searchsorted(ticks, from_tick)
+        return int(ticks[index]) if index < ticks.size else None
+
+    def next_checkpoint(self, from_tick):
+        """
+        Get the first tick after the start of the run, at or after from_tick, at which the checkpoint is called
+        """
+        tick = max(from_tick, self.start_tick + 1)
+        tick = -(-tick // self.checkpoint_ticks) * self.checkpoint_ticks
+        return tick if tick < self.num_ticks else None
+
+    # Motion helper functions
+    def start_segment(self, i, tick, position):
+        """
+        Start a new straight line segment of robot i towards its chosen waypoint and queue
+        the tick at which it will pick its next waypoint, following Robot.motion_routine:
+        full steps while the waypoint is at least a step away, then one partial step, then
+        a new waypoint once the distance is close to 0.
+        params:
+          i: (int) robot id
+          tick: (int) tick at the end of which the robot is at position
+          position: (Tuple : float) x, y
+        """
+        robot = self.robots[i]
+        step_size = robot.config.env_interval * robot.config.speed
+        length = math.sqrt((robot.chosen_waypoint[0] - position[0]) ** 2 + (robot.chosen_waypoint[1] - position[1]) ** 2)
+        self.segment_tick[i] = tick
+        self.segment_start[i] = position
+        self.segment_length[i] = length
+        full_steps = math.floor(length / step_size)
+        if length - full_steps * step_size <= ATOL:
+            self.push(tick + full_steps + 1, i, WAYPOINT)
+        else:
+            self.push(tick + full_steps + 2, i, WAYPOINT)
+
+    def position_at(self, i, tick):
+        """
+        Get the position of robot i at the end of a tick within its current segment
+        return: (Tuple : float) x, y
+        """
+        robot = self.robots[i]
+        travelled = min((tick - self.segment_tick[i]) * robot.config.env_interval * robot.config.speed, self.segment_length[i])
+        x, y = self.segment_start[i]
+        return x + robot.motion_vector[0] * travelled, y + robot.motion_vector[1] * travelled
+
+    def place(self, i, tick):
+        """
+        Move robot i to its position at the end of a tick and update the neighbour index
+        """
+        robot = self.robots[i]
+        robot.position = self.position_at(i, tick)
+        self.env.neighbour_index.move(i, robot.position)
+
+    def sync_positions(self, i, tick):
+        """
+        Bring positions up to date for a broadcast by robot i: as in the tick loop, robots up to
+        and including i have already moved this tick while the rest are where the last tick left them.
+        """
+        if self.synced_tick != tick:
+            for j in range(self.num_robots):
+                self.place(j, tick if j <= i else tick - 1)
+            self.synced_tick = tick
+        else:
+            for j in range(self.synced_upto + 1, i + 1):
+                self.place(j, tick)
+        self.synced_upto = i
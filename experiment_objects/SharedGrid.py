@@ -0,0 +1,77 @@
+import hashlib
+from multiprocessing import shared_memory
+import numpy as np
+
+# Grid this worker process is attached to, used by every Environment built in it that is not given one
+active = None
+# Shared memory this process is attached to, kept open for as long as the process uses its grids
+attached = {}
+
+
+class SharedGrid:
+    """
+    A grid placed once in shared memory, so pool workers can use it without copying or unpickling it.
+    Owned by the process that creates it, which frees the memory on close. The grid is read-only,
+    an Environment that changes its grid (gradual change) works on its own copy.
+    """
+    def __init__(self, grid) -> None:
+        """
+        params:
+          grid: (np.ndarray) grid from Environment.create_grid
+        """
+        grid = np.ascontiguousarray(grid)
+        self.memory = shared_memory.SharedMemory(create=True, size=max(grid.nbytes, 1))
+        self.grid = np.ndarray(grid.shape, grid.dtype, buffer=self.memory.buf)
+        self.grid[:] = grid
+        self.grid.flags.writeable = False
+        # All a worker needs to attach, small enough to send to every worker
+        self.spec = (self.memory.name, grid.shape, grid.dtype.str)
+
+    def close(self):
+        self.grid = None
+        try:
+            self.memory.close()
+        except BufferError:
+            # Views of the grid are still alive in this process, the memory is freed with them
+            pass
+        self.memory.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def attach(spec):
+    """
+    View of a shared grid without copying it, attaching to its shared memory once per process
+    params:
+      spec: (Tuple) SharedGrid.spec
+    return: (np.ndarray) read-only grid
+    """
+    name, shape, dtype = spec
+    if name not in attached:
+        attached[name] = shared_memory.SharedMemory(name=name)
+    grid = np.ndarray(shape, dtype, buffer=attached[name].buf)
+    grid.flags.writeable = False
+    return grid
+
+
+def initialise_worker(spec):
+    """
+    Pool initializer attaching a worker to a shared grid, which every Environment it builds then uses
+    params:
+      spec: (Tuple) SharedGrid.spec
+    """
+    global active
+    active = attach(spec)
+
+
+def grid_key(grid):
+    """
+    Stable hash of a grid, to key cached runs of a fixed grid with
+    return: (str) hex digest
+    """
+    grid = np.ascontiguousarray(grid)
+    return hashlib.sha256(f"{grid.shape}{grid.dtype.str}".encode() + grid.tobytes()).hexdigest()
@@ -0,0 +1,208 @@
+import math
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Use the k-d tree once the communication range covers the grid in fewer than this many cells per axis
+MIN_CELLS_PER_AXIS = 3
+
+
+class CellList:
+    """
+    Uniform grid spatial index with square cells the size of the communication range.
+    Every robot is stored in the cell it is over, so all neighbours within range of a
+    robot are in the 3x3 block of cells around it. Kept up to date incrementally by move.
+    """
+    def __init__(self, cell_size, positions) -> None:
+        self.cell_size = cell_size
+        # Robot ids in each occupied cell, keyed by (col, row) of the cell
+        self.cells = {}
+        # Cell each robot is currently in
+        self.robot_cells = []
+        for i, position in enumerate(positions):
+            cell = self.get_cell(position)
+            self.robot_cells.append(cell)
+            self.cells.setdefault(cell, set()).add(i)
+
+    def get_cell(self, position):
+        """
+        Get the cell a position is in
+        params:
+          position: (Tuple : float) x, y
+        return: (Tuple : int) col, row
+        """
+        return math.floor(position[0] / self.cell_size), math.floor(position[1] / self.cell_size)
+
+    def move(self, id, position):
+        """
+        Update the index after robot id has moved, only touching the cells if it changed cell.
+        params:
+          id: (int) ID of the robot that moved
+          position: (Tuple : float) new position of the robot
+        """
+        cell = self.get_cell(position)
+        old_cell = self.robot_cells[id]
+        if cell != old_cell:
+            self.cells[old_cell].discard(id)
+            if not self.cells[old_cell]:
+                del self.cells[old_cell]
+            self.cells.setdefault(cell, set()).add(id)
+            self.robot_cells[id] = cell
+
+    def candidates(self, position):
+        """
+        Get ids of every robot in the 3x3 block of cells around a position
+        params:
+          position: (Tuple : float) x, y
+        return: (List : int)
+        """
+        col, row = self.get_cell(position)
+        ids = []
+        for c in range(col - 1, col + 2):
+            for r in range(row - 1, row + 2):
+                cell = self.cells.get((c, r))
+                if cell:
+                    ids.extend(cell)
+        return ids
+
+
+class KDTree:
+    """
+    k-d tree spatial index for communication ranges too large for a CellList to prune anything.
+    The tree is built with an extra skin around the communication range and only rebuilt once
+    some robot has moved more than half the skin since the last build.
+    """
+    def __init__(self, communication_range, positions, skin=None) -> None:
+        self.skin = communication_range / 4 if skin is None else skin
+        self.radius = communication_range + self.skin
+        self.positions = np.array(positions, dtype=float)
+        self.build()
+
+    def build(self):
+        """
+        Rebuild the tree from the current positions
+        """
+        self.built_positions = self.positions.copy()
+        self.tree = cKDTree(self.built_positions)
+        self.stale = False
+
+    def move(self, id, position):
+        """
+        Record the new position of robot id, flagging the tree for rebuild if it left the skin.
+        params:
+          id: (int) ID of the robot that moved
+          position: (Tuple : float) new position of the robot
+        """
+        x, y = position
+        self.positions[id, 0] = x
+        self.positions[id, 1] = y
+        built_x, built_y = self.built_positions[id]
+        if (x - built_x) ** 2 + (y - built_y) ** 2 > (self.skin / 2) ** 2:
+            self.stale = True
+
+    def candidates(self, position):
+        """
+        Get ids of every robot that could be within communication range of a position
+        params:
+          position: (Tuple : float) x, y
+        return: (List : int)
+        """
+        if self.stale:
+            self.build()
+        return self.tree.query_ball_point(position, self.radius)
+
+
+class BruteForce:
+    """
+    Index that offers every robot as a candidate, used when no better index applies.
+    """
+    def __init__(self, num_robots, communication_range) -> None:
+        self.ids = [] if communication_range <= 0 else list(range(num_robots))
+
+    def move(self, id, position):
+        pass
+
+    def candidates(self, position):
+        return self.ids
+
+
+def create_index(grid_size, communication_range, positions):
+    """
+    Create the spatial index best suited to a communication range: a CellList for small ranges,
+    a KDTree when the range spans most of the grid (if scipy is installed).
+    params:
+      grid_size: (List : int) # col, # row of the grid
+      communication_range: (float) Range of broadcast messages
+      positions: (List[Tuple : float]) position of each robot, indexed by id
+    return: CellList, KDTree or BruteForce
+    """
+    if communication_range <= 0:
+        return BruteForce(len(positions), communication_range)
+    if min(grid_size) / communication_range >= MIN_CELLS_PER_AXIS:
+        return CellList(communication_range, positions)
+    if cKDTree is not None:
+        return KDTree(communication_range, positions)
+    return BruteForce(len(positions), communication_range)
+
+
+def find_pairs(positions, senders, communication_range, grid_size):
+    """
+    Vectorized neighbour search: find every robot strictly within communication range of each sender.
+    Uses a sorted cell list for small ranges and a k-d tree (if scipy is installed) for large ones.
+    params:
+      positions: (np.ndarray) shape (n, 2) position of every robot
+      senders: (np.ndarray) ids of the robots to find neighbours of
+      communication_range: (float) Range of broadcast messages
+      grid_size: (List : int) # col, # row of the grid
+    return: (Tuple : np.ndarray) sender and receiver ids of each pair, ordered by sender
+    """
+    if communication_range <= 0 or senders.size == 0:
+        empty = np.zeros(0, dtype=int)
+        return empty, empty
+    if min(grid_size) / communication_range >= MIN_CELLS_PER_AXIS:
+        pair_senders, receivers = cell_list_candidates(positions, senders, communication_range)
+    elif cKDTree is not None:
+        neighbours = cKDTree(positions).query_ball_point(positions[senders], communication_range)
+        counts = np.array([len(n) for n in neighbours])
+        pair_senders = np.repeat(senders, counts)
+        receivers = np.fromiter((i for n in neighbours for i in n), dtype=int, count=counts.sum())
+    else:
+        pair_senders = np.repeat(senders, positions.shape[0])
+        receivers = np.tile(np.arange(positions.shape[0]), senders.size)
+    offset = positions[pair_senders] - positions[receivers]
+    in_range = np.sqrt(np.square(offset[:, 0]) + np.square(offset[:, 1])) < communication_range
+    in_range &= pair_senders != receivers
+    return pair_senders[in_range], receivers[in_range]
+
+
+def cell_list_candidates(positions, senders, cell_size):
+    """
+    Candidate neighbour pairs from the 3x3 block of cells around each sender, without any Python loop over robots.
+    params:
+      positions: (np.ndarray) shape (n, 2) position of every robot
+      senders: (np.ndarray) ids of the robots to find neighbours of
+      cell_size: (float) side of each cell
+    return: (Tuple : np.ndarray) sender and receiver ids of each candidate pair, ordered by sender
+    """
+    cells = np.floor(positions / cell_size).astype(int)
+    # Pad by one cell each side so neighbouring cell ids never wrap around
+    cells -= cells.min(axis=0) - 1
+    num_rows = cells[:, 1].max() + 2
+    cell_ids = cells[:, 0] * num_rows + cells[:, 1]
+    order = np.argsort(cell_ids, kind="stable")
+    sorted_ids = cell_ids[order]
+
+    sender_cells = cell_ids[senders]
+    offsets = np.array([dc * num_rows + dr for dc in (-1, 0, 1) for dr in (-1, 0, 1)])
+    query = (sender_cells[:, None] + offsets[None, :]).ravel()
+    start = np.searchsorted(sorted_ids, query, side="left")
+    counts = np.searchsorted(sorted_ids, query, side="right") - start
+    total = counts.sum()
+    # Expand each (start, count) run into the indices it covers
+    run_offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    receivers = order[np.repeat(start, counts) + run_offsets]
+    pair_senders = np.repeat(np.repeat(senders, offsets.size), counts)
+    return pair_senders, receivers
@@ -0,0 +1,182 @@
+import math
+import numpy as np
+
+
+class StoppingCriterion:
+    """
+    Checked by the Environment every time it records its state. A run stops as soon as any of
+    its criteria says so.
+    """
+    def check(self, environment, state):
+        """
+        params:
+          environment: (Environment) the running environment
+          state: (List : int) number of robots in each state: undecided, colour 1, colour 2, ...
+        return: (bool) True to stop the run
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """
+        Forget what was seen of any previous run, called by every Environment given the criterion
+        """
+        pass
+
+
+class Adaptation(StoppingCriterion):
+    """
+    The original rule: stop once more than threshold of the robots have held the majority
+    colour for longer than hold_time. Sets environment.adaptation_time to when that started.
+    """
+    def __init__(self, threshold=0.7, hold_time=2 * 60 * 100) -> None:
+        self.threshold = threshold
+        self.hold_time = hold_time
+
+    def check(self, environment, state):
+        if state[environment.majority_colour] / environment.num_robots > self.threshold:
+            if environment.adaptation_time == None:
+                environment.adaptation_time = environment.time
+            elif environment.time - environment.adaptation_time > self.hold_time:
+                return True
+        else:
+            environment.adaptation_time = None
+        return False
+
+
+class AbsorbingState(StoppingCriterion):
+    """
+    Stop once every robot is in one of the given states (e.g. all uncommitted, or all committed to
+    the wrong colour) with no sample evidence pending, and that has held for hold_time. Robots start
+    in a single state, so the hold time is what keeps the criterion from stopping runs at once.
+    The evidence check only guards the window between a robot's sample and its next opinion update,
+    with the robot engine evidence is mostly consumed in the same tick it is found.
+    """
+    def __init__(self, states, hold_time) -> None:
+        """
+        params:
+          states: (List : int) states that count as absorbing
+          hold_time: (float) how long the state must hold before stopping, must be positive
+        """
+        if hold_time <= 0:
+            raise ValueError("AbsorbingState needs a positive hold_time, or it stops every run at its first record")
+        self.states = states
+        self.hold_time = hold_time
+        self.reset()
+
+    def reset(self):
+        self.since = None
+
+    def check(self, environment, state):
+        occupied = [i for i, count in enumerate(state) if count > 0]
+        if len(occupied) == 1 and occupied[0] in self.states and environment.get_pending_evidence() == 0:
+            if self.since is None:
+                self.since = environment.time
+            return environment.time - self.since >= self.hold_time
+        self.since = None
+        return False
+
+
+class Stalled(StoppingCriterion):
+    """
+    Stop once the number of robots in each state has not changed for window amount of time.
+    """
+    def __init__(self, window) -> None:
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self.last_state = None
+        self.since = None
+
+    def check(self, environment, state):
+        if state != self.last_state:
+            self.last_state = list(state)
+            self.since = environment.time
+            return False
+        return environment.time - self.since >= self.window
+
+
+class ReplicateConvergence:
+    """
+    Not a per-run criterion: decides when a cell of a sweep has enough replicates, once the
+    confidence interval of the mean of a metric is narrower than width, or its standard error
+    is below standard_error.
+    """
+    def __init__(self, metric, width=None, confidence=0.95, min_replicates=3, standard_error=None) -> None:
+        """
+        params:
+          metric: (Callable) metric(result) returns the value of one run, or None to ignore the run
+          width: (float) target full width of the confidence interval
+          confidence: (float) confidence level of the interval
+          min_replicates: (int) never converge with fewer runs than this
+          standard_error: (float) target standard error of the mean, used instead of width if given
+        """
+        if width is None and standard_error is None:
+            raise ValueError("ReplicateConvergence needs a target width or standard_error")
+        self.metric = metric
+        self.width = width
+        self.confidence = confidence
+        self.min_replicates = min_replicates
+        self.standard_error = standard_error
+
+    def values(self, results):
+        return np.array([v for v in map(self.metric, results) if v is not None], dtype=float)
+
+    def interval_width(self, results):
+        """
+        Full width of the normal confidence interval of the mean metric over results
+        return: (float) inf if there are too few runs
+        """
+        values = self.values(results)
+        if values.size < max(self.min_replicates, 2):
+            return math.inf
+        return 2 * normal_quantile(0.5 + self.confidence / 2) * values.std(ddof=1) / math.sqrt(values.size)
+
+    def uncertainty(self, results, pending=0):
+        """
+        Standard error or interval width of a cell over its target, as expected once pending runs have
+        finished too (the spread of the finished runs over the square root of all of them).
+        Above 1 the cell needs more runs.
+        params:
+          results: (List) results of the finished runs of a cell
+          pending: (int) runs of the cell still running
+        return: (float) inf if even the pending runs will not make enough, 0 if only they are waited for
+        """
+        values = self.values(results)
+        if values.size + pending < max(self.min_replicates, 2):
+            return math.inf
+        if values.size < max(self.min_replicates, 2):
+            return 0.0
+        standard_error = values.std(ddof=1) / math.sqrt(values.size + pending)
+        if self.standard_error is not None:
+            return standard_error / self.standard_error
+        return 2 * normal_quantile(0.5 + self.confidence / 2) * standard_error / self.width
+
+    def converged(self, results):
+        """
+        params:
+          results: (List) results of the finished runs of a cell
+        return: (bool)
+        """
+        return self.uncertainty(results) <= 1
+
+
+def normal_quantile(p):
+    """
+    Quantile of the standard normal distribution, by bisection on math.erf
+    """
+    low, high = -10.0, 10.0
+    for _ in range(100):
+        mid = (low + high) / 2
+        if 0.5 * (1 + math.erf(mid / math.sqrt(2))) < p:
+            low = mid
+        else:
+            high = mid
+    return (low + high) / 2
+
+
+def default_criteria():
+    """
+    Stopping criteria used when an Environment is not given any: the original adaptation rule
+    """
+    return [Adaptation()]
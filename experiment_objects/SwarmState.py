@@ -0,0 +1,248 @@
+import numpy as np
+import experiment_objects.SpatialIndex as si
+
+# Absolute tolerance of np.isclose, the scalar checks in Robot are np.isclose(x, 0)
+ATOL = 1e-8
+
+
+class SwarmState:
+    """
+    Structure-of-arrays version of a list of Robot's. Every per-robot attribute of Robot is
+    stored as a NumPy array indexed by robot id and the whole swarm is advanced with one batched
+    update per tick. The decision dynamics are the same as Robot.step_robot.
+    Colours and messages use 0 in place of None.
+    """
+    def __init__(self, num_robots, config, rng=None) -> None:
+        self.num_robots = num_robots
+        self.rng = np.random.default_rng() if rng is None else rng
+        # Parameters shared by every robot (Config.RobotConfig)
+        self.config = config
+
+        # Current position of each robot
+        if config.position == None:
+            self.position = self.random_points(num_robots)
+        else:
+            self.position = np.tile(np.asarray(config.position, dtype=float), (num_robots, 1))
+        # The colour each robot is looking for
+        if config.sample_colour == None:
+            self.sample_colour = np.where(self.rng.uniform(0, 1, num_robots) > 0.2, 2, 1)
+        else:
+            self.sample_colour = np.full(num_robots, config.sample_colour)
+        self.sample_colour_occurences = np.zeros(num_robots, dtype=int)
+        self.sample_evidence = np.zeros(num_robots, dtype=int)
+        self.self_evidence_estimate = np.zeros(num_robots)
+        self.sample_count = np.zeros(num_robots, dtype=int)
+
+        self.decision_state = np.full(num_robots, config.decision_state)
+        self.commited_estimation = np.full(num_robots, config.commited_estimation, dtype=float)
+        self.neighbour_message = np.zeros(num_robots, dtype=int)
+        self.new_recruit = np.zeros(num_robots, dtype=bool)
+        self.broadcast_frequency = get_broadcast_frequency(self.commited_estimation)
+        self.chosen_waypoint = self.random_points(num_robots)
+        self.motion_vector = np.zeros((num_robots, 2))
+        self.get_motion_vector(np.ones(num_robots, dtype=bool))
+
+    def step(self, env_grid, time):
+        """
+        Advance every robot by one tick. Equivalent to calling Robot.step_robot on each robot.
+        Messages broadcast in a tick which also has an opinion update are delivered in robot order:
+        a robot only hears senders with a lower id before its own update, higher ids land after it.
+        parameters:
+          env_grid: (np.ndarray) The current grid of the environment, indexed [row, col]
+          time: (float) Current time of the environment
+        """
+        self.motion_routine()
+        if time % self.config.sample_interval <= ATOL:
+            self.sampling_routine(env_grid)
+        senders, receivers = self.broadcasting_routine(time)
+        if time % self.config.update_interval <= ATOL:
+            # Opinions are broadcast before any robot updates
+            opinions = self.decision_state.copy()
+            self.deliver_messages(senders, receivers, opinions, senders < receivers)
+            self.opinion_update_routine()
+            self.neighbour_message[:] = 0
+            self.deliver_messages(senders, receivers, opinions, senders > receivers)
+        else:
+            self.deliver_messages(senders, receivers, self.decision_state)
+
+    def motion_routine(self):
+        """
+        Move every robot towards its waypoint, picking a new waypoint for those that have arrived.
+        """
+        offset = self.chosen_waypoint - self.position
+        distance_to_waypoint = np.sqrt(np.square(offset[:, 0]) + np.square(offset[:, 1]))
+        step_size = self.config.env_interval * self.config.speed
+        arrived = distance_to_waypoint < step_size
+        at_waypoint = arrived & (distance_to_waypoint <= ATOL)
+        step = np.where(arrived, distance_to_waypoint, step_size)
+        step[at_waypoint] = 0
+        self.position += self.motion_vector * step[:, None]
+        if at_waypoint.any():
+            self.chosen_waypoint[at_waypoint] = self.random_points(np.count_nonzero(at_waypoint))
+            self.get_motion_vector(at_waypoint)
+
+    def sampling_routine(self, env_grid):
+        """
+        The sample routine for every robot, to be called after every sample_interval length of time.
+        parameters:
+          env_grid: (np.ndarray) The current grid of the environment, indexed [row, col]
+        """
+        square_colour = self.get_square_colours(env_grid)
+        start = self.sample_colour == 0
+        take = ~start & (self.sample_count < self.config.sample_cycle_length)
+        end = ~start & ~take
+        # Start sample routine
+        self.sample_colour[start] = square_colour[start]
+        self.sample_count[start] = 0
+        self.sample_colour_occurences[start] = 0
+        # Take sample
+        self.sample_colour_occurences[take & (square_colour == self.sample_colour)] += 1
+        self.sample_count[take] += 1
+        recruits = take & self.new_recruit
+        self.broadcast_frequency[recruits] = get_broadcast_frequency(self.sample_colour_occurences[recruits] / self.config.sample_cycle_length)
+        # Handle end of sample cycle
+        if end.any():
+            self.handle_end_of_sample_cycle(end)
+
+    def broadcasting_routine(self, time):
+        """
+        Find which robots broadcast at this time and who is in range of them.
+        params:
+          time: (float) Current time of the environment
+        return: (Tuple : np.ndarray) sender and receiver ids of every message sent
+        """
+        broadcasting = (self.broadcast_frequency != 0) & (self.decision_state != 0)
+        period = (1 / self.broadcast_frequency[broadcasting]) * 100
+        broadcasting[broadcasting] = time % period <= ATOL
+        return self.find_neighbours(np.flatnonzero(broadcasting))
+
+    def find_neighbours(self, senders):
+        """
+        Find every robot within communication range of each sender.
+        params:
+          senders: (np.ndarray) ids of the broadcasting robots
+        return: (Tuple : np.ndarray) sender and receiver ids of every pair, ordered by sender
+        """
+        return si.find_pairs(self.position, senders, self.config.communication_range, self.config.grid_size)
+
+    def deliver_messages(self, senders, receivers, opinions, mask=None):
+        """
+        Set neighbour_message of each receiver to the opinion of the last robot (highest id) that
+        messaged it, matching the overwrite order of sequential Robot.broadcasting_routine calls.
+        params:
+          senders: (np.ndarray) sender id of each message
+          receivers: (np.ndarray) receiver id of each message
+          opinions: (np.ndarray) decision state of every robot when the messages were sent
+          mask: (np.ndarray) optional boolean selection of the messages to deliver
+        """
+        if mask is not None:
+            senders, receivers = senders[mask], receivers[mask]
+        if senders.size == 0:
+            return
+        latest = np.full(self.num_robots, -1)
+        np.maximum.at(latest, receivers, senders)
+        received = latest >= 0
+        self.neighbour_message[received] = opinions[latest[received]]
+
+    def opinion_update_routine(self):
+        """
+        Given current evidence and state, update the opinion of every robot
+        """
+        has_evidence = self.sample_evidence != 0
+        has_message = self.neighbour_message != 0
+        coin = self.rng.uniform(0, 1, self.num_robots) > 0.5
+        discovery = has_evidence & (~has_message | coin)
+        social = has_message & ~discovery
+        recruitment = social & (self.decision_state == 0)
+        cross_inhibition = social & ~recruitment & (self.decision_state != self.neighbour_message)
+
+        # Discovery transition
+        self.decision_state[discovery] = self.sample_evidence[discovery]
+        self.commited_estimation[discovery] = self.self_evidence_estimate[discovery]
+        # Recruitment transition
+        self.decision_state[recruitment] = self.neighbour_message[recruitment]
+        self.sample_colour[recruitment] = self.decision_state[recruitment]
+        self.sample_count[recruitment] = 0
+        self.sample_colour_occurences[recruitment] = 0
+        self.commited_estimation[recruitment] = 0
+        self.new_recruit[recruitment] = True
+        # Cross-inhibition transition
+        self.decision_state[cross_inhibition] = 0
+        self.commited_estimation[cross_inhibition] = 0
+
+        changed = discovery | recruitment | cross_inhibition
+        self.broadcast_frequency[changed] = get_broadcast_frequency(self.commited_estimation[changed])
+        self.sample_evidence[changed] = 0
+        self.self_evidence_estimate[changed] = 0
+        self.sample_colour[discovery | cross_inhibition] = 0
+
+    # Motion helper functions
+    def random_points(self, n):
+        """
+        Choose n coordinates uniformly at random from the grid
+        return: (np.ndarray) shape (n, 2)
+        """
+        return self.rng.uniform((0, 0), self.config.grid_size, (n, 2))
+
+    def get_motion_vector(self, mask):
+        """
+        Recalculate the normalised direction vector to the waypoint for the selected robots.
+        params:
+          mask: (np.ndarray) boolean selection of robots
+        """
+        offset = self.chosen_waypoint[mask] - self.position[mask]
+        magnitude = np.sqrt(np.square(offset[:, 0]) + np.square(offset[:, 1]))
+        self.motion_vector[mask] = offset / magnitude[:, None]
+
+    # Sampling helper functions
+    def get_square_colours(self, env_grid):
+        """
+        Get the colour of the square each robot is currently over.
+        parameters:
+          env_grid: (np.ndarray) The current grid of the environment, indexed [row, col]
+        return: (np.ndarray)
+        """
+        col = np.floor(self.position[:, 0]).astype(int)
+        row = np.floor(self.position[:, 1]).astype(int)
+        return env_grid[row, col]
+
+    def handle_end_of_sample_cycle(self, end):
+        """
+        Finish the sample cycle of the selected robots.
+        params:
+          end: (np.ndarray) boolean selection of robots at the end of their sample cycle
+        """
+        sample_colour_concentration = np.zeros(self.num_robots)
+        sample_colour_concentration[end] = self.sample_colour_occurences[end] / self.sample_count[end]
+        # Update committed colour estimate
+        update_estimate = end & (self.sample_colour == self.decision_state) & (self.decision_state != 0)
+        self.commited_estimation[update_estimate] = sample_colour_concentration[update_estimate]
+        self.broadcast_frequency[update_estimate] = get_broadcast_frequency(self.commited_estimation[update_estimate])
+        # Store colour and concentration estimate of sample for update decision
+        store_evidence = end & ~update_estimate & ((sample_colour_concentration > self.commited_estimation) | (self.decision_state == 0)) & (sample_colour_concentration > 0)
+        self.sample_evidence[store_evidence] = self.sample_colour[store_evidence]
+        self.self_evidence_estimate[store_evidence] = sample_colour_concentration[store_evidence]
+        self.new_recruit[end] = False
+        self.sample_colour[end] = 0
+
+    def get_state(self, num_states):
+        """
+        Count the number of robots in each state currently: undecided, colour 1, colour 2, ...
+        """
+        return np.bincount(self.decision_state, minlength=num_states).tolist()
+
+    def get_sampling_colour_counts(self, num_states):
+        """
+        Count the number of robots in each sampling colour currently: undecided, colour 1, colour 2, ...
+        """
+        return np.bincount(self.sample_colour, minlength=num_states).tolist()
+
+
+def get_broadcast_frequency(commited_estimation):
+    """
+    Broadcast frequency of a robot given its committed estimation, as in Robot
+    params:
+      commited_estimation: (np.ndarray)
+    return: (np.ndarray)
+    """
+    return 2 * np.minimum(2 * commited_estimation, 1)
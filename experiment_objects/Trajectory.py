@@ -0,0 +1,59 @@
+import dataclasses
+import json
+import os
+import numpy as np
+import experiment_objects.Recorder as rec
+
+# Ticks between recorded frames by default
+DEFAULT_STRIDE = 100
+
+
+def record_trajectory(environment, path, stride=DEFAULT_STRIDE):
+    """
+    Run an environment through run_for_visual, writing the position and decision state of every robot
+    every stride ticks to a binary trajectory file, and the grid every time it changes to path + ".grids".
+    Needs no display, so runs can be inspected later with frontend.Playback.
+    params:
+      environment: (Environment) freshly built environment
+      path: (str) trajectory file, replaced if it exists
+      stride: (int) ticks between frames
+    return: (int) number of frames written
+    """
+    num_robots = len(environment.get_robot_decision_states())
+    frame_dtype = np.dtype([("time", "<f8"), ("grid_version", "<u4"), ("position", "<f4", (num_robots, 2)), ("decision_state", "u1", (num_robots,))])
+    grid_dtype = np.dtype([("grid_version", "<u4"), ("grid", "u1", environment.grid.shape)])
+    for old in (path, path + ".grids"):
+        if os.path.exists(old):
+            os.remove(old)
+    with open(path + ".config.json", "w") as f:
+        json.dump(dataclasses.asdict(environment.config), f)
+    frames = rec.open_records(path, frame_dtype)
+    grids = rec.open_records(path + ".grids", grid_dtype)
+    written_version = None
+    num_frames = 0
+    def write_frame():
+        nonlocal written_version, num_frames
+        if environment.grid_version != written_version:
+            grids.write(np.array((environment.grid_version, environment.grid), dtype=grid_dtype).tobytes())
+            written_version = environment.grid_version
+        frames.write(np.array((environment.time, environment.grid_version, environment.get_robot_positions(), environment.get_robot_decision_states()), dtype=frame_dtype).tobytes())
+        num_frames += 1
+
+    try:
+        write_frame()
+        for tick, _ in enumerate(environment.run_for_visual(), 1):
+            if tick % stride == 0:
+                write_frame()
+    finally:
+        frames.close()
+        grids.close()
+    return num_frames
+
+
+def read_trajectory(path, mmap=True):
+    """
+    Load a file written by record_trajectory
+    return: (Tuple : np.ndarray) frames with fields time, grid_version, position and decision_state,
+            and grids with fields grid_version and grid
+    """
+    return rec.read_records(path, mmap), rec.read_records(path + ".grids", mmap)
@@ -0,0 +1,136 @@
+import argparse
+import os
+import numpy as np
+import experiments.storage as storage
+
+# Bootstrap resamples of the replicates and width of the confidence intervals by default
+DEFAULT_RESAMPLES = 1000
+DEFAULT_CONFIDENCE = 0.95
+# Samples of every replicate loaded at once, so a cell never has to fit in memory
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def bootstrap_weights(num_replicates, num_resamples=DEFAULT_RESAMPLES, rng=None):
+    """
+    How many times each replicate is drawn in each bootstrap resample. The same weights are used for
+    every chunk of a cell, so the intervals are those of resampling whole runs.
+    return: (np.ndarray) array of shape (num_resamples, num_replicates)
+    """
+    rng = np.random.default_rng(rng)
+    return rng.multinomial(num_replicates, np.full(num_replicates, 1 / num_replicates), size=num_resamples)
+
+
+def bootstrap_interval(values, weights, confidence=DEFAULT_CONFIDENCE):
+    """
+    Percentile bootstrap confidence interval of the mean over the first axis of values
+    params:
+      values: (np.ndarray) array of shape (replicates, ...)
+      weights: (np.ndarray) weights from bootstrap_weights
+    return: (Tuple : np.ndarray) lower and upper bounds, of shape values.shape[1:]
+    """
+    means = (weights @ values.reshape(len(values), -1)).reshape((len(weights),) + values.shape[1:]) / len(values)
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(means, [alpha, 1 - alpha], axis=0)
+    return lower, upper
+
+
+def summarise_history(directory, column="state_history", proportions=True, num_resamples=DEFAULT_RESAMPLES,
+                      confidence=DEFAULT_CONFIDENCE, chunk_size=DEFAULT_CHUNK_SIZE, seed=None):
+    """
+    Mean, standard deviation and bootstrap confidence interval over the replicates of a cell at every sample,
+    reading chunk_size samples of every replicate at a time. Runs that stopped early keep their final state.
+    params:
+      directory: (str) directory written by storage.NpyWriter
+      column: (str) array column to summarise
+      proportions: (bool) divide each row by its sum, e.g. state counts by the number of robots
+      seed: (int) seed of the bootstrap resamples
+    return: (Dict : np.ndarray) time of each sample (time_history of the longest run, or the sample index),
+            mean, std, lower and upper of shape (samples, ...), and the number of replicates and robots
+    """
+    runs = storage.open_cell(directory, column)
+    if not runs:
+        raise FileNotFoundError(f"No {column} arrays in {directory}")
+    num_samples = max(len(run) for run in runs)
+    weights = bootstrap_weights(len(runs), num_resamples, seed)
+    summary = {name: np.empty((num_samples,) + runs[0].shape[1:]) for name in ("mean", "std", "lower", "upper")}
+    robots = None
+    for start in range(0, num_samples, chunk_size):
+        stop = min(start + chunk_size, num_samples)
+        chunk = storage.pad_runs(runs, start, stop).astype(float)
+        if proportions:
+            totals = chunk.sum(axis=-1, keepdims=True)
+            if robots is None:
+                robots = int(totals[0, 0, 0])
+            chunk /= totals
+        summary["mean"][start:stop] = chunk.mean(axis=0)
+        summary["std"][start:stop] = chunk.std(axis=0, ddof=1) if len(runs) > 1 else 0
+        summary["lower"][start:stop], summary["upper"][start:stop] = bootstrap_interval(chunk, weights, confidence)
+    times = storage.open_cell(directory, "time_history")
+    time_lengths = [len(run) for run in times]
+    if times and max(time_lengths) == num_samples:
+        summary["time"] = np.asarray(times[int(np.argmax(time_lengths))])
+    else:
+        summary["time"] = np.arange(num_samples)
+    summary["replicates"] = len(runs)
+    summary["robots"] = robots
+    return summary
+
+
+def summarise_scalars(directory, column, num_resamples=DEFAULT_RESAMPLES, confidence=DEFAULT_CONFIDENCE, seed=None):
+    """
+    Mean, standard deviation and bootstrap confidence interval of a scalar column over the replicates of a cell.
+    Empty values (e.g. the adaptation time of a run that never adapted) are left out.
+    return: (Dict) mean, std, lower, upper and the number of replicates with a value
+    """
+    values = storage.load_scalars(directory).get(column)
+    values = np.array([] if values is None else [value for value in values if value is not None], dtype=float)
+    if len(values) == 0:
+        return {"mean": np.nan, "std": np.nan, "lower": np.nan, "upper": np.nan, "replicates": 0}
+    lower, upper = bootstrap_interval(values, bootstrap_weights(len(values), num_resamples, seed), confidence)
+    return {"mean": values.mean(), "std": values.std(ddof=1) if len(values) > 1 else 0.0,
+            "lower": float(lower), "upper": float(upper), "replicates": len(values)}
+
+
+def summarise_sweep(path_format, cells, column="state_history", **kwargs):
+    """
+    Summarise the histories of every cell of a sweep, one cell at a time
+    params:
+      path_format: (str) path_format the sweep was written with
+      cells: (List : Dict) parameter values of each cell, e.g. sweep.expand_grid(PARAM_GRID)
+      kwargs: passed on to summarise_history
+    return: (Generator) params and summary of each cell
+    """
+    for params in cells:
+        yield params, summarise_history(path_format.format(**params), column, **kwargs)
+
+
+def summarise_sweep_scalars(path_format, cells, column, **kwargs):
+    """
+    Summarise a scalar column of every cell of a sweep
+    return: (List : Tuple) params and summary of each cell
+    """
+    return [(params, summarise_scalars(path_format.format(**params), column, **kwargs)) for params in cells]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the replicates of result directories written by storage.NpyWriter")
+    parser.add_argument("directories", nargs="+")
+    parser.add_argument("--scalar", default="adaptation_time", help="scalar column to summarise")
+    parser.add_argument("--column", default="state_history", help="array column whose final sample is summarised")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES)
+    parser.add_argument("--confidence", type=float, default=DEFAULT_CONFIDENCE)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    for directory in args.directories:
+        print(directory)
+        scalars = summarise_scalars(directory, args.scalar, args.resamples, args.confidence, args.seed)
+        print(f"  {args.scalar}: {scalars['mean']:.6g} (std {scalars['std']:.6g}, {args.confidence:.0%} CI "
+              f"{scalars['lower']:.6g} to {scalars['upper']:.6g}) over {scalars['replicates']} replicates")
+        if storage.open_cell(directory, args.column):
+            history = summarise_history(directory, args.column, num_resamples=args.resamples, confidence=args.confidence, seed=args.seed)
+            final = ", ".join(f"{mean:.3f} [{lower:.3f}, {upper:.3f}]" for mean, lower, upper in zip(history["mean"][-1], history["lower"][-1], history["upper"][-1]))
+            print(f"  final {args.column}: {final} over {history['replicates']} replicates of {history['robots']} robots")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import argparse
+import dataclasses
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import shutil
+import numpy as np
+import experiment_objects.Config as c
+
+DEFAULT_DIRECTORY = "./results/cache"
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Packages whose source defines the simulation and the results of the experiments, any change to them invalidates cached runs
+SOURCE_PACKAGES = [os.path.join(ROOT, "experiment_objects"), os.path.join(ROOT, "experiments")]
+
+
+class ResultCache:
+    """
+    On-disk cache of simulation results, content-addressed by a hash of everything that
+    determines a run: the function that ran it, its full argument list, its seed and the version
+    of the simulation code.
+    Results of each code version live in their own directory so stale versions can be pruned.
+    """
+    def __init__(self, directory=DEFAULT_DIRECTORY, version=None) -> None:
+        self.root = directory
+        self.version = code_version() if version is None else version
+        self.directory = os.path.join(directory, self.version)
+
+    def key(self, run_args, seed, function=None):
+        """
+        Get the key of a run
+        params:
+          run_args: (List or Config.EnvironmentConfig) every argument the run is built from, e.g. the Environment config
+          seed: (np.random.SeedSequence) seed of the run
+          function: (Callable) function the run's result comes from, e.g. an experiment's run_test
+        return: (str) hex digest
+        """
+        content = json.dumps([run_args, seed_key(seed), function_key(function), self.version], sort_keys=True, default=json_default)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + ".pkl")
+
+    def __contains__(self, key):
+        return os.path.exists(self.path(key))
+
+    def get(self, key):
+        """
+        Load a cached result
+        return: the result, or None if the run is not cached
+        """
+        try:
+            with open(self.path(key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, result):
+        """
+        Store a result. Written to a temporary file first so a crash never leaves a partial entry.
+        """
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = path + ".tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+    def prune(self, keep_current=True):
+        """
+        Delete the results of other code versions.
+        params:
+          keep_current: (bool) keep the results of the current code version
+        return: (List : str) versions deleted
+        """
+        if not os.path.isdir(self.root):
+            return []
+        removed = []
+        for version in sorted(os.listdir(self.root)):
+            if keep_current and version == self.version:
+                continue
+            shutil.rmtree(os.path.join(self.root, version))
+            removed.append(version)
+        return removed
+
+
+def seed_key(seed):
+    """
+    JSON friendly identity of a seed
+    params:
+      seed: (np.random.SeedSequence, int or None)
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return [seed.entropy, list(seed.spawn_key)]
+    return seed
+
+
+def json_default(value):
+    """
+    JSON friendly form of the values json can not encode: config dataclasses become their Config.config_key,
+    so configs are hashed the same way everywhere
+    """
+    if dataclasses.is_dataclass(value):
+        return c.config_key(value)
+    return repr(value)
+
+
+def function_key(function):
+    """
+    Identity of the function a result comes from: its qualified name and the hash of its module's
+    source, so results of different functions, or of a changed one, never share a key
+    params:
+      function: (Callable) or None
+    return: (List : str) or None
+    """
+    if function is None:
+        return None
+    path = inspect.getsourcefile(function)
+    return [f"{function.__module__}.{function.__qualname__}", None if path is None else source_hash(path)]
+
+
+@functools.lru_cache(maxsize=None)
+def source_hash(path):
+    """
+    return: (str) hex digest of a source file
+    """
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def code_version():
+    """
+    Hash of the simulation and experiment source code
+    return: (str) first 16 hex digits of the hash of every module in SOURCE_PACKAGES
+    """
+    digest = hashlib.sha256()
+    for package in SOURCE_PACKAGES:
+        for name in sorted(os.listdir(package)):
+            if name.endswith(".py"):
+                digest.update(f"{os.path.basename(package)}/{name}".encode())
+                with open(os.path.join(package, name), "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the simulation result cache")
+    parser.add_argument("command", choices=["info", "prune"], help="info: list cached versions, prune: delete stale code versions")
+    parser.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    parser.add_argument("--all", action="store_true", help="with prune, also delete the current version")
+    args = parser.parse_args()
+    cache = ResultCache(args.directory)
+    if args.command == "prune":
+        for version in cache.prune(keep_current=not args.all):
+            print(f"Removed {version}")
+    else:
+        print(f"Current version: {cache.version}")
+        if os.path.isdir(cache.root):
+            for version in sorted(os.listdir(cache.root)):
+                count = sum(len(files) for _, _, files in os.walk(os.path.join(cache.root, version)))
+                print(f"{version}: {count} runs{' (current)' if version == cache.version else ''}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
-import multiprocessing
-import experiment_objects.Environment as e
-import experiment_objects.Robot as r
+from dataclasses import replace
+import experiment_objects.Config as c
+import experiment_objects.Stopping as stop
+import experiments.sweep as sweep
 
 # Env
 X_SQUARES = 20
@@ -9,6 +10,13 @@ GRID_SIZE = [X_SQUARES, Y_SQUARES]
 COLOUR_PROB = [0.9, 0.1]
 ENV_INTERVAL = 1
 NUM_STEPS = 100000
+ENGINE = "robot" # "robot", "swarm", "event", "compiled" or "compact", see Environment.ENGINES
+BATCH_SIZE = None # Replicates each worker runs together as one vectorized batch, None to run one Environment per task
+SEED = 1 # Fixed so a re-launched sweep can reuse cached runs
+STOPPING = "adaptation" # Stopping criteria of each run, "adaptation" or "early", see sweep.Experiment.stopping_criteria
+# Time a run must hold one wrong state, or keep every state count unchanged, before "early" stopping ends it
+ABSORBED_TIME = 2 * 60 * 100
+STALLED_TIME = 2 * 60 * 100
 
 # Robots
 UPDATE_INTERVAL = 200
@@ -22,16 +30,28 @@ DECISION_STATE = 2
 COMMITED_ESTIMATION = 0.8
 
 NUM_ROBOTS = 50
-ROBOT_PARAMS = [UPDATE_INTERVAL, SAMPLE_CYCLE_LENGTH, SAMPLE_INTERVAL, SPEED, COMMUNICATION_RANGE, ENV_INTERVAL, GRID_SIZE, SAMPLE_COLOUR, DECISION_STATE, COMMITED_ESTIMATION, POSITION]
+ROBOT_CONFIG = c.RobotConfig(UPDATE_INTERVAL, SAMPLE_CYCLE_LENGTH, SAMPLE_INTERVAL, SPEED, COMMUNICATION_RANGE, ENV_INTERVAL, tuple(GRID_SIZE), SAMPLE_COLOUR, DECISION_STATE, COMMITED_ESTIMATION, POSITION)
+ENVIRONMENT_CONFIG = c.EnvironmentConfig(tuple(GRID_SIZE), tuple(COLOUR_PROB), NUM_ROBOTS, ROBOT_CONFIG, ENV_INTERVAL, NUM_STEPS, None, ENGINE)
 
-def run_repeat_simulation(num_runs):
-    env_params = [[X_SQUARES,Y_SQUARES], COLOUR_PROB, NUM_ROBOTS, ROBOT_PARAMS, ENV_INTERVAL, NUM_STEPS]
-    pool_arguments = [env_params for i in range(num_runs)]
-    with multiprocessing.Pool() as pool:
-        sim_stats = pool.starmap(run_test, pool_arguments)
-    return sim_stats
+# Sweep definition: one cell, repeated
+PARAM_GRID = {"communication_range": [COMMUNICATION_RANGE]}
+# Target width of the 95% confidence interval of the mean adaptation time of each cell of an adaptive sweep, see sweep.Experiment.adaptive_convergence
+ADAPTATION_CI_WIDTH = 2000
+RESULT_COLUMNS = ["adapted", "adaptation_time", "stopped_by"]
 
-def run_test(*env_params):
-    env = e.Environment(*env_params)
-    adapted = env.run()
-    return [adapted, env.adaptation_time]
\ No newline at end of file
+def environment_config(params):
+    """
+    Environment config (everything but the seed) of a cell of the sweep
+    """
+    return replace(ENVIRONMENT_CONFIG, robot=replace(ROBOT_CONFIG, communication_range=params["communication_range"]))
+
+def get_result(env):
+    """
+    Result columns of a finished Environment or batch Replicate. A run only adapted if the adaptation
+    rule stopped it, not when another criterion ended it early.
+    """
+    adapted = env.stopped_by == stop.Adaptation.__name__
+    return [adapted, env.adaptation_time if adapted else None, env.stopped_by]
+
+EXPERIMENT = sweep.Experiment(ENVIRONMENT_CONFIG, environment_config, get_result, RESULT_COLUMNS, PARAM_GRID, SEED, BATCH_SIZE,
+                               STOPPING, ABSORBED_TIME, STALLED_TIME)
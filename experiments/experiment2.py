@@ -1,6 +1,8 @@
-import multiprocessing
-import experiment_objects.Environment as e
-import experiment_objects.Robot as r
+import numpy as np
+from dataclasses import replace
+import experiment_objects.Config as c
+import experiment_objects.Stopping as stop
+import experiments.sweep as sweep
 
 # Env
 X_SQUARES = 20
@@ -9,7 +11,14 @@ GRID_SIZE = [X_SQUARES, Y_SQUARES]
 COLOUR_PROB = [0.2, 0.8]
 ENV_INTERVAL = 1
 NUM_STEPS = 100000
-GRADUAL_CHANGE = [0.2, 36000]
+GRADUAL_CHANGE = c.GradualChange(0.2, 36000)
+ENGINE = "robot" # "robot", "swarm", "event", "compiled" or "compact", see Environment.ENGINES
+BATCH_SIZE = None # Replicates each worker runs together as one vectorized batch, None to run one Environment per task
+SEED = 2 # Fixed so a re-launched sweep can reuse cached runs
+STOPPING = "adaptation" # Stopping criteria of each run, "adaptation" or "early", see sweep.Experiment.stopping_criteria
+# Time a run must hold one wrong state, or keep every state count unchanged, before "early" stopping ends it
+ABSORBED_TIME = 2 * 60 * 100
+STALLED_TIME = GRADUAL_CHANGE.change_time
 
 # Robots
 UPDATE_INTERVAL = 200
@@ -23,21 +32,33 @@ DECISION_STATE = 2
 COMMITED_ESTIMATION = 0.8
 
 NUM_ROBOTS = 50
-#ROBOT_PARAMS = [UPDATE_INTERVAL, SAMPLE_CYCLE_LENGTH, SAMPLE_INTERVAL, SPEED, COMMUNICATION_RANGE, ENV_INTERVAL, GRID_SIZE, SAMPLE_COLOUR, DECISION_STATE, COMMITED_ESTIMATION, POSITION]
+# Sample cycle length is set per cell by environment_config
+ROBOT_CONFIG = c.RobotConfig(UPDATE_INTERVAL, c.SAMPLE_CYCLE_LENGTH, SAMPLE_INTERVAL, SPEED, 0, ENV_INTERVAL, tuple(GRID_SIZE), SAMPLE_COLOUR, DECISION_STATE, COMMITED_ESTIMATION, POSITION)
+ENVIRONMENT_CONFIG = c.EnvironmentConfig(tuple(GRID_SIZE), tuple(COLOUR_PROB), NUM_ROBOTS, ROBOT_CONFIG, ENV_INTERVAL, NUM_STEPS, GRADUAL_CHANGE, ENGINE)
 
-def run_repeat_simulation(num_runs, sample_len):
-    ROBOT_PARAMS = [UPDATE_INTERVAL, sample_len, SAMPLE_INTERVAL, SPEED, 0, ENV_INTERVAL, GRID_SIZE, SAMPLE_COLOUR, DECISION_STATE, COMMITED_ESTIMATION, POSITION]
-    env_params = [[X_SQUARES,Y_SQUARES], COLOUR_PROB, NUM_ROBOTS, ROBOT_PARAMS, ENV_INTERVAL, NUM_STEPS, GRADUAL_CHANGE]
-    pool_arguments = [env_params for i in range(num_runs)]
-    with multiprocessing.Pool() as pool:
-        sim_stats = pool.starmap(run_test, pool_arguments)
-    return sim_stats
+# Sweep definition
+PARAM_GRID = {"sample_len": [1,2,3,4,5,6,7,8,9,15,25,45]}
+# Target width of the 95% confidence interval of the mean adaptation time of each cell of an adaptive sweep, see sweep.Experiment.adaptive_convergence
+ADAPTATION_CI_WIDTH = 2000
+RESULT_COLUMNS = ["adapted", "adaptation_time", "state_history", "time_history", "color_history", "stopped_by"]
 
-def run_test(*env_params):
-    env = e.Environment(*env_params)
-    adapted = env.run()
-    if env.adaptation_time == None:
+def environment_config(params):
+    """
+    Environment config (everything but the seed) of a cell of the sweep
+    """
+    return replace(ENVIRONMENT_CONFIG, robot=replace(ROBOT_CONFIG, sample_cycle_length=params["sample_len"]))
+
+def get_result(env):
+    """
+    Result columns of a finished Environment or batch Replicate. A run only adapted if the adaptation
+    rule stopped it, not when another criterion ended it early.
+    """
+    adapted = env.stopped_by == stop.Adaptation.__name__
+    if not adapted:
         adapt_time = -1
     else:
         adapt_time = env.adaptation_time
-    return [adapted, adapt_time, env.state_history, env.time_history, env.grid_colour_hist]
\ No newline at end of file
+    return [adapted, adapt_time, np.array(env.state_history, dtype=np.int32), np.array(env.time_history, dtype=np.int64), np.array(env.grid_colour_hist), env.stopped_by]
+
+EXPERIMENT = sweep.Experiment(ENVIRONMENT_CONFIG, environment_config, get_result, RESULT_COLUMNS, PARAM_GRID, SEED, BATCH_SIZE,
+                               STOPPING, ABSORBED_TIME, STALLED_TIME)
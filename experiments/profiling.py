@@ -0,0 +1,60 @@
+import argparse
+import json
+import os
+import experiment_objects.Profiler as pr
+
+
+class ProfileWriter:
+    """
+    on_profile callback appending the profile of each finished task of a sweep as a line of JSON.
+    """
+    def __init__(self, path) -> None:
+        self.path = path
+
+    def __call__(self, params, replicates, report):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"params": params, "replicates": replicates, "report": report}, default=repr) + "\n")
+
+
+def load_profiles(path):
+    """
+    Load the profiles written by ProfileWriter
+    return: (List : Dict) params, replicates and report of each task
+    """
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def summarise(profiles, by=None):
+    """
+    Merge the reports of a sweep
+    params:
+      profiles: (List : Dict) from load_profiles
+      by: (str) parameter to merge each of its values separately, the whole sweep at once if None
+    return: (Dict) merged report for each value of by, keyed by None if by is None
+    """
+    groups = {}
+    for profile in profiles:
+        key = None if by is None else profile["params"].get(by)
+        groups.setdefault(key, []).append(profile["report"])
+    return {key: pr.merge(reports) for key, reports in groups.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise the per-routine profile of a sweep")
+    parser.add_argument("paths", nargs="+", help="files written by ProfileWriter")
+    parser.add_argument("--by", help="summarise each value of this sweep parameter separately")
+    args = parser.parse_args()
+    profiles = [profile for path in args.paths for profile in load_profiles(path)]
+    print(f"{len(profiles)} tasks, {sum(len(profile['replicates']) for profile in profiles)} runs")
+    for key, report in sorted(summarise(profiles, args.by).items(), key=lambda item: str(item[0])):
+        if args.by is not None:
+            print(f"\n{args.by} = {key}")
+        print(pr.format_report(report))
+
+
+if __name__ == "__main__":
+    main()
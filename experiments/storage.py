@@ -0,0 +1,174 @@
+import argparse
+import ast
+import csv
+import glob
+import os
+import numpy as np
+
+# Fixed-width type each array column is stored as
+ARRAY_DTYPES = {"state_history": np.int32, "time_history": np.int64, "color_history": np.float64}
+SCALARS_FILE = "scalars.csv"
+
+
+class NpyWriter:
+    """
+    on_result callback storing each finished run in one directory per parameter cell: every
+    array column as its own memory-mappable .npy file per replicate, e.g. state_history_0003.npy
+    with shape (samples, num_states), and the scalar columns appended to scalars.csv.
+    """
+    def __init__(self, path_format, columns, array_dtypes=ARRAY_DTYPES) -> None:
+        """
+        params:
+          path_format: (str) directory of a cell, formatted with the cell's params e.g. "exp2_{sample_len}"
+          columns: (List : str) names of the values in each result
+          array_dtypes: (Dict) columns to store as arrays, and their dtype
+        """
+        self.path_format = path_format
+        self.columns = columns
+        self.array_dtypes = array_dtypes
+
+    def __call__(self, params, replicate, result):
+        directory = self.path_format.format(**params)
+        os.makedirs(directory, exist_ok=True)
+        scalars = {}
+        for column, value in zip(self.columns, result):
+            if column in self.array_dtypes:
+                if value is not None:
+                    np.save(array_path(directory, column, replicate), np.asarray(value, dtype=self.array_dtypes[column]))
+            else:
+                scalars[column] = value
+        scalars_path = os.path.join(directory, SCALARS_FILE)
+        new_file = not os.path.exists(scalars_path)
+        with open(scalars_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["replicate"] + list(scalars))
+            writer.writerow([replicate] + list(scalars.values()))
+
+
+def array_path(directory, column, replicate):
+    return os.path.join(directory, f"{column}_{replicate:04d}.npy")
+
+
+def open_cell(directory, column="state_history"):
+    """
+    Open one array column of every replicate of a cell without reading it
+    return: (List : np.memmap) array of each replicate, ordered by replicate
+    """
+    return [np.load(path, mmap_mode="r") for path in sorted(glob.glob(os.path.join(directory, f"{column}_*.npy")))]
+
+
+def pad_runs(runs, start=0, stop=None, fill=None):
+    """
+    Rows start to stop of every run as a single ndarray. Runs that ended before stop (that stopped
+    early) are padded with their final row.
+    params:
+      runs: (List : np.ndarray) arrays of shape (samples, ...), e.g. from open_cell
+      start: (int) first row
+      stop: (int) end of the rows, the length of the longest run by default
+      fill: (List) row to pad with, the final row of each run if None
+    return: (np.ndarray) array of shape (runs, stop - start, ...)
+    """
+    if stop is None:
+        stop = max(len(run) for run in runs)
+    padded = np.empty((len(runs), stop - start) + runs[0].shape[1:], dtype=runs[0].dtype)
+    for i, run in enumerate(runs):
+        rows = run[start:stop]
+        padded[i, :len(rows)] = rows
+        padded[i, len(rows):] = run[-1] if fill is None else fill
+    return padded
+
+
+def load_cell(directory, column="state_history", fill=None):
+    """
+    Load one array column of every replicate of a cell as a single ndarray, without parsing.
+    Shorter runs (that stopped early) are padded up to the longest one.
+    params:
+      directory: (str) directory written by NpyWriter
+      column: (str) array column to load
+      fill: (List) row to pad with, the final row of each run if None
+    return: (Tuple : np.ndarray) array of shape (replicates, samples, ...), length of each run
+    """
+    runs = open_cell(directory, column)
+    return pad_runs(runs, fill=fill), np.array([run.shape[0] for run in runs])
+
+
+def load_sweep(path_format, cells, column="state_history"):
+    """
+    Load one array column of every cell of a sweep as a single ndarray
+    params:
+      path_format: (str) path_format the sweep was written with
+      cells: (List : Dict) parameter values of each cell, e.g. sweep.expand_grid(PARAM_GRID)
+      column: (str) array column to load
+    return: (Tuple : np.ndarray) array of shape (cells, replicates, samples, ...) padded with each run's
+            final row, length of each run with shape (cells, replicates)
+    """
+    loaded = [load_cell(path_format.format(**params), column) for params in cells]
+    num_replicates = max(runs.shape[0] for runs, _ in loaded)
+    max_length = max(runs.shape[1] for runs, _ in loaded)
+    first = loaded[0][0]
+    stacked = np.zeros((len(cells), num_replicates, max_length) + first.shape[2:], dtype=first.dtype)
+    lengths = np.zeros((len(cells), num_replicates), dtype=int)
+    for i, (runs, run_lengths) in enumerate(loaded):
+        stacked[i, :runs.shape[0], :runs.shape[1]] = runs
+        stacked[i, :runs.shape[0], runs.shape[1]:] = runs[:, -1:]
+        lengths[i, :runs.shape[0]] = run_lengths
+    return stacked, lengths
+
+
+def load_scalars(directory):
+    """
+    Load the scalar columns of every replicate of a cell
+    return: (Dict : np.ndarray) values of each column, ordered by replicate
+    """
+    with open(os.path.join(directory, SCALARS_FILE), newline="") as f:
+        # A replicate written twice (e.g. by a re-run) keeps its latest row
+        rows = {int(row["replicate"]): row for row in csv.DictReader(f)}
+    rows = [rows[replicate] for replicate in sorted(rows)]
+    if not rows:
+        return {}
+    return {column: np.array([parse_value(row[column]) for row in rows]) for column in rows[0]}
+
+
+def parse_value(text):
+    """
+    Parse a CSV cell written from a Python value, empty cells are None and strings (e.g. stopped_by) are kept as they are
+    """
+    if not text:
+        return None
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def convert_csv(path, directory=None):
+    """
+    Convert a results CSV with stringified lists (as written by pandas or CsvWriter) into an NpyWriter directory.
+    params:
+      path: (str) CSV file
+      directory: (str) output directory, the CSV path without its extension by default
+    return: (str) output directory
+    """
+    if directory is None:
+        directory = os.path.splitext(path)[0]
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    columns = [column for column in rows[0] if column not in ("", "replicate")]
+    writer = NpyWriter(directory, columns)
+    for i, row in enumerate(rows):
+        replicate = int(row.get("replicate") or row.get("") or i)
+        writer({}, replicate, [parse_value(row[column]) for column in columns])
+    return directory
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert results CSVs to columnar .npy directories")
+    parser.add_argument("paths", nargs="+", help="CSV files to convert")
+    args = parser.parse_args()
+    for path in args.paths:
+        print(f"{path} -> {convert_csv(path)}")
+
+
+if __name__ == "__main__":
+    main()
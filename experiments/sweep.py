@@ -0,0 +1,441 @@
+import contextlib
+import csv
+import functools
+import itertools
+import multiprocessing
+import os
+import queue
+import numpy as np
+import experiment_objects.Batch as b
+import experiment_objects.Environment as e
+import experiment_objects.MeanField as mf
+import experiment_objects.Profiler as pr
+import experiment_objects.SharedGrid as sg
+import experiment_objects.Stopping as stop
+import experiments.cache as ch
+
+
+def run_sweep(run_test, param_grid, num_replicates, seed=None, on_result=None, processes=None, chunksize=1, cache=None, key_args=None, convergence=None, run_batch=None, batch_size=1, on_profile=None, budget=None, grid=None):
+    """
+    Run every (parameter cell, replicate) pair of a sweep on one long-lived process pool.
+    Tasks are handed out a chunk at a time and collected in completion order, so a slow
+    replicate never holds back the other cells. With a cache, runs that already completed
+    are loaded instead of re-run, so a re-launched sweep only computes what is missing.
+    params:
+      run_test: (Callable) module level function run_test(params, seed) returning the result of one run
+      param_grid: (Dict : List) values of each parameter, every combination is a cell of the sweep
+      num_replicates: (int) number of runs of each cell, the most any cell gets with convergence
+      seed: (int) seed of the sweep, each run gets the independent child stream cell_seed(seed, cell, replicate)
+      on_result: (Callable) called as on_result(params, replicate, result) in this process as each new run finishes
+      processes: (int) number of worker processes, all cores by default
+      chunksize: (int) number of runs handed to a worker at a time
+      cache: (cache.ResultCache) cache to load finished runs from and store new ones in, needs a fixed seed.
+             Runs are keyed by the function that ran them (run_test or run_batch) as well as by key_args
+      key_args: (Callable) key_args(params) returns everything a run is built from (e.g. its Environment config) to key the cache with, params by default
+      convergence: (Stopping.ReplicateConvergence) if given, replicates are allocated adaptively: every free worker is given
+                   a run of the cell furthest from its target, and a cell gets no more runs once it has converged
+      run_batch: (Callable) module level function run_batch(params, seeds) returning the results of several replicates
+                 of a cell run together. If given, each task is a block of batch_size replicates run with it instead of run_test
+      batch_size: (int) number of replicates in each block with run_batch
+      on_profile: (Callable) if given, every task is profiled and on_profile(params, replicates, report) is called
+                  in this process with the Profiler.report of each finished task
+      budget: (int) with convergence, the most runs the whole sweep may start (cached runs are free)
+      grid: (np.ndarray) fixed grid every run uses instead of drawing its own, placed once in shared memory that the
+            workers attach to, so replicates only differ in their robots' random streams
+    return: (List[Tuple]) (params, replicate, result) of every run, ordered by cell then replicate
+    """
+    cells = expand_grid(param_grid)
+    entropy = np.random.SeedSequence(seed).entropy
+    if run_batch is None:
+        worker, batch_size = run_task, 1
+    else:
+        worker, run_test = run_batch_task, run_batch
+    if on_profile is not None:
+        worker = functools.partial(profile_task, worker)
+    grid_key = None if grid is None else sg.grid_key(grid)
+    results = {}
+    # Finished results of each cell, as convergence sees them
+    cell_results = [[] for _ in cells]
+    keys = {}
+    def plan(cell, first):
+        """
+        Task running the block of replicates of a cell starting at first, None if all of them are cached.
+        Replicates run together in fixed blocks, so a replicate always shares its batch with the same
+        replicates and its result does not depend on which of them were already cached.
+        """
+        params = cells[cell]
+        block = range(first, min(first + batch_size, num_replicates))
+        seeds = [cell_seed(entropy, cell, replicate) for replicate in block]
+        if cache is not None:
+            run_args = params if key_args is None else key_args(params)
+            if run_batch is not None:
+                run_args = [run_args, "batch", batch_size]
+            if grid_key is not None:
+                run_args = [run_args, "grid", grid_key]
+            block_keys = [cache.key(run_args, run_seed, run_test) for run_seed in seeds]
+            cached = [cache.get(key) for key in block_keys]
+            if all(result is not None for result in cached):
+                results.update({(cell, replicate): result for replicate, result in zip(block, cached)})
+                cell_results[cell].extend(cached)
+                return None
+            keys.update({(cell, replicate): key for replicate, key in zip(block, block_keys)})
+        if run_batch is None:
+            return (run_test, cell, params, first, seeds[0])
+        return (run_test, cell, params, list(block), seeds)
+    def finished(cell, replicate, result):
+        results[cell, replicate] = result
+        cell_results[cell].append(result)
+        if cache is not None:
+            cache.put(keys[cell, replicate], result)
+        if on_result is not None:
+            on_result(cells[cell], replicate, result)
+    def collect(outcome):
+        if on_profile is not None:
+            outcome, report = outcome
+            on_profile(cells[outcome[0][0]], [replicate for _, replicate, _ in outcome], report)
+        for cell, replicate, result in outcome:
+            finished(cell, replicate, result)
+
+    if convergence is None:
+        tasks = [plan(cell, first) for cell in range(len(cells)) for first in range(0, num_replicates, batch_size)]
+        tasks = [task for task in tasks if task is not None]
+        if tasks:
+            with worker_pool(processes, grid) as pool:
+                for outcome in pool.imap_unordered(worker, tasks, chunksize):
+                    collect(outcome)
+    else:
+        allocator = ReplicateAllocator(len(cells), num_replicates, batch_size, plan, cell_results, convergence, budget)
+        with worker_pool(processes, grid) as pool:
+            run_adaptive(pool, allocator, collect, processes or os.cpu_count(), worker)
+    return [(cells[cell], replicate, results[cell, replicate]) for cell, replicate in sorted(results)]
+
+
+@contextlib.contextmanager
+def worker_pool(processes, grid=None):
+    """
+    Process pool, with every worker attached to grid in shared memory if it is given
+    params:
+      processes: (int) number of worker processes, all cores by default
+      grid: (np.ndarray) grid the workers' Environments run on
+    """
+    if grid is None:
+        with multiprocessing.Pool(processes) as pool:
+            yield pool
+        return
+    with sg.SharedGrid(grid) as shared, multiprocessing.Pool(processes, sg.initialise_worker, (shared.spec,)) as pool:
+        yield pool
+
+
+class ReplicateAllocator:
+    """
+    Decides which cell of an adaptive sweep runs next: the one whose metric is furthest from its
+    convergence target once the runs it has in flight are counted, so idle workers always go to
+    the cells that are still uncertain. Replicates of a cell are handed out in order, so every run
+    keeps the seed and cache key it would have in a fixed sweep.
+    """
+    def __init__(self, num_cells, num_replicates, batch_size, plan, cell_results, convergence, budget=None) -> None:
+        """
+        params:
+          num_cells: (int)
+          num_replicates: (int) most replicates of a cell
+          batch_size: (int) replicates in each task
+          plan: (Callable) plan(cell, first) returns the task of a block of replicates, None if it is cached
+          cell_results: (List : List) finished results of each cell, kept up to date by the caller
+          convergence: (Stopping.ReplicateConvergence)
+          budget: (int) most runs to start, unlimited if None
+        """
+        self.num_replicates = num_replicates
+        self.batch_size = batch_size
+        self.plan = plan
+        self.cell_results = cell_results
+        self.convergence = convergence
+        self.budget = budget
+        # First replicate of the next block of each cell, and the runs each has in flight
+        self.next_replicate = [0] * num_cells
+        self.in_flight = [0] * num_cells
+        self.started = 0
+
+    def priority(self, cell):
+        """
+        return: (float) how far the cell is from converging, None if it needs no more runs now
+        """
+        if self.next_replicate[cell] >= self.num_replicates:
+            return None
+        uncertainty = self.convergence.uncertainty(self.cell_results[cell], self.in_flight[cell])
+        return uncertainty if uncertainty > 1 else None
+
+    def next_task(self):
+        """
+        return: (Tuple) next task to run, None if no cell needs one until more runs finish
+        """
+        while self.budget is None or self.started < self.budget:
+            priorities = [(priority, -cell) for cell in range(len(self.next_replicate)) if (priority := self.priority(cell)) is not None]
+            if not priorities:
+                return None
+            cell = -max(priorities)[1]
+            first = self.next_replicate[cell]
+            self.next_replicate[cell] += self.batch_size
+            task = self.plan(cell, first)
+            # Cached blocks are already in the cell's results, look again
+            if task is not None:
+                runs = min(self.batch_size, self.num_replicates - first)
+                self.in_flight[cell] += runs
+                self.started += runs
+                return task
+        return None
+
+    def finished(self, outcome):
+        """
+        params:
+          outcome: (List : Tuple) (cell, replicate, result) of each run of a finished task
+        """
+        for cell, _, _ in outcome:
+            self.in_flight[cell] -= 1
+
+
+def run_adaptive(pool, allocator, collect, processes, worker=None):
+    """
+    Keep every worker busy with the tasks the allocator picks, asking it again as each one finishes.
+    params:
+      pool: (multiprocessing.Pool)
+      allocator: (ReplicateAllocator)
+      collect: (Callable) collect(outcome) called with what worker returned as each task finishes
+      processes: (int) number of workers, as many tasks are kept in flight
+      worker: (Callable) function running a task in a worker, run_task by default
+    """
+    if worker is None:
+        worker = run_task
+    done = queue.Queue()
+    in_flight = 0
+    while True:
+        while in_flight < processes:
+            task = allocator.next_task()
+            if task is None:
+                break
+            pool.apply_async(worker, (task,), callback=done.put, error_callback=done.put)
+            in_flight += 1
+        if in_flight == 0:
+            break
+        outcome = done.get()
+        in_flight -= 1
+        if isinstance(outcome, BaseException):
+            raise outcome
+        # Results are counted before the runs leave the allocator's in-flight count
+        collect(outcome)
+        allocator.finished(outcome[0] if isinstance(outcome, tuple) else outcome)
+
+
+def run_task(task):
+    """
+    Run one replicate of one cell in a worker
+    params:
+      task: (Tuple) run_test, cell index, params, replicate, seed
+    return: (List : Tuple) the (cell index, replicate, result) of the run
+    """
+    run_test, cell, params, replicate, seed = task
+    return [(cell, replicate, run_test(params, seed))]
+
+
+def run_batch_task(task):
+    """
+    Run a block of replicates of one cell together in a worker
+    params:
+      task: (Tuple) run_batch, cell index, params, replicates, seeds
+    return: (List : Tuple) (cell index, replicate, result) of each replicate
+    """
+    run_batch, cell, params, replicates, seeds = task
+    return [(cell, replicate, result) for replicate, result in zip(replicates, run_batch(params, seeds))]
+
+
+def profile_task(worker, task):
+    """
+    Run a task with every Environment it creates instrumented
+    params:
+      worker: (Callable) run_task or run_batch_task
+      task: (Tuple) task for worker
+    return: (Tuple) what worker returned, Profiler.report of the task
+    """
+    with pr.profiling() as profiler:
+        outcome = worker(task)
+    return outcome, profiler.report()
+
+
+def expand_grid(param_grid):
+    """
+    Expand a parameter grid into every combination of its values
+    params:
+      param_grid: (Dict : List) values of each parameter
+    return: (List : Dict) parameter values of each cell
+    """
+    names = list(param_grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_grid[name] for name in names))]
+
+
+def cell_seed(entropy, cell, replicate):
+    """
+    Seed of one replicate of a cell. Depends only on the sweep entropy and the position of the
+    run in the sweep, so any single replicate can be re-run on its own.
+    params:
+      entropy: (int) entropy of the sweep's SeedSequence
+      cell: (int) index of the parameter cell
+      replicate: (int)
+    return: (np.random.SeedSequence)
+    """
+    return np.random.SeedSequence(entropy, spawn_key=(cell, replicate))
+
+
+class CsvWriter:
+    """
+    on_result callback appending each finished run as a row of one CSV file per parameter cell.
+    """
+    def __init__(self, path_format, columns) -> None:
+        """
+        params:
+          path_format: (str) path of the file for a cell, formatted with the cell's params e.g. "exp2_{sample_len}.csv"
+          columns: (List : str) names of the values in each result
+        """
+        self.path_format = path_format
+        self.columns = columns
+
+    def __call__(self, params, replicate, result):
+        path = self.path_format.format(**params)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        new_file = not os.path.exists(path)
+        with open(path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(["replicate"] + self.columns)
+            writer.writerow([replicate] + list(result))
+
+
+class Experiment:
+    """
+    The runs of an experiment's sweep, built from the experiment's base config, its environment_config(params)
+    mapping a cell to the config of its runs and its get_result(env) returning the result columns of a
+    finished run. Picklable as long as those are module level functions, so workers can call its methods.
+    """
+    def __init__(self, base_config, environment_config, get_result, result_columns, param_grid, seed=None,
+                 batch_size=None, stopping="adaptation", absorbed_time=None, stalled_time=None) -> None:
+        """
+        params:
+          base_config: (Config.EnvironmentConfig) config every cell is derived from
+          environment_config: (Callable) environment_config(params) returns the config (everything but the seed) of a cell
+          get_result: (Callable) get_result(env) returns the result columns of a finished Environment or batch Replicate
+          result_columns: (List : str) names of the values get_result returns, one of them "adaptation_time"
+          param_grid: (Dict : List) values of each parameter, the sweep runs every combination
+          seed: (int) default seed of fixed_grid
+          batch_size: (int) replicates each worker runs together as one vectorized batch, None to run one Environment per task
+          stopping: (str) default stopping criteria of each run, "adaptation" or "early", see stopping_criteria
+          absorbed_time: (float) time a run must hold one wrong state before "early" stopping ends it
+          stalled_time: (float) time a run must keep every state count unchanged before "early" stopping ends it
+        """
+        self.base_config = base_config
+        self.environment_config = environment_config
+        self.get_result = get_result
+        self.result_columns = result_columns
+        self.param_grid = param_grid
+        self.seed = seed
+        self.batch_size = batch_size
+        self.stopping = stopping
+        self.absorbed_time = absorbed_time
+        self.stalled_time = stalled_time
+
+    def run_sweep(self, num_runs, seed=None, on_result=None, param_grid=None, cache=None, on_profile=None, convergence=None,
+                  budget=None, grid=None, stopping=None):
+        """
+        params:
+          num_runs: (int) replicates of each cell, the most a cell gets with convergence
+          param_grid: (Dict : List) the experiment's param_grid if None
+          stopping: (str) stopping criteria of every run, see stopping_criteria. Can also be swept as a "stopping" parameter
+          convergence: (Stopping.ReplicateConvergence) add replicates to each cell until it converges, e.g. adaptive_convergence()
+          budget: (int) with convergence, the most runs of the whole sweep
+          grid: (np.ndarray) fixed grid shared by every run, e.g. fixed_grid(), a new grid per run if None
+        """
+        param_grid = self.sweep_grid(param_grid, stopping)
+        return run_sweep(self.run_test, param_grid, num_runs, seed, on_result, cache=cache, key_args=self.run_key,
+                         run_batch=None if self.batch_size is None else self.run_batch, batch_size=self.batch_size or 1,
+                         on_profile=on_profile, convergence=convergence, budget=budget, grid=grid)
+
+    def run_mean_field_sweep(self, num_runs, seed=None, on_result=None, param_grid=None, cache=None, stopping=None):
+        """
+        Screen the sweep with the stochastic mean-field approximation (MeanField.MeanFieldEnvironment) in
+        place of the simulation, returning results in the same columns
+        """
+        param_grid = self.sweep_grid(param_grid, stopping)
+        return run_sweep(self.run_mean_field, param_grid, num_runs, seed, on_result, cache=cache, key_args=self.mean_field_key)
+
+    def run_repeat_simulation(self, num_runs, seed=None, **params):
+        """
+        Replicates of one cell, e.g. run_repeat_simulation(20, seed, sample_len=5)
+        params:
+          params: value of each parameter of the cell, the experiment's param_grid for the others
+        return: (List) result of each replicate
+        """
+        param_grid = dict(self.param_grid, **{name: [value] for name, value in params.items()})
+        return [result for params, replicate, result in self.run_sweep(num_runs, seed, param_grid=param_grid)]
+
+    def sweep_grid(self, param_grid=None, stopping=None):
+        param_grid = self.param_grid if param_grid is None else param_grid
+        return param_grid if stopping is None else dict(param_grid, stopping=[stopping])
+
+    def fixed_grid(self, seed=None):
+        """
+        One grid of the experiment's colour proportions, for sweeps that run every replicate on the same grid
+        """
+        seed = self.seed if seed is None else seed
+        return e.create_grid(self.base_config.grid_size, self.base_config.colour_prob, e.spawn_random(np.random.SeedSequence(seed)))
+
+    def adaptive_convergence(self, width):
+        """
+        Converge once the confidence interval of the mean adaptation time of a cell is narrower than width
+        """
+        return stop.ReplicateConvergence(self.adaptation_time, width)
+
+    def adaptation_time(self, result):
+        """
+        Metric adaptive sweeps converge on, runs that never adapted (None or -1) are left out
+        """
+        value = result[self.result_columns.index("adaptation_time")]
+        return None if value is None or value == -1 else value
+
+    def stopping_criteria(self, params):
+        """
+        Fresh stopping criteria of a run of a cell. "adaptation" is the original adaptation rule, "early" also
+        ends runs that lock onto a state other than the majority colour or stall, so sweeps spend no time on them.
+        """
+        stopping = params.get("stopping", self.stopping)
+        criteria = stop.default_criteria()
+        if stopping == "early":
+            colour_prob = self.base_config.colour_prob
+            wrong_states = [state for state in range(len(colour_prob) + 1) if state != np.argmax(colour_prob) + 1]
+            criteria += [stop.AbsorbingState(wrong_states, self.absorbed_time), stop.Stalled(self.stalled_time)]
+        elif stopping != "adaptation":
+            raise ValueError(f"Unknown stopping criteria {stopping}, expected 'adaptation' or 'early'")
+        return criteria
+
+    def run_key(self, params):
+        """
+        Everything a run of a cell is built from apart from its seed, to key the cache with. get_result
+        tells the experiments apart, as every experiment's runs come from the same run_test.
+        """
+        return [self.environment_config(params), params.get("stopping", self.stopping), ch.function_key(self.get_result)]
+
+    def mean_field_key(self, params):
+        return self.run_key(params) + ["mean_field"]
+
+    def run_test(self, params, seed):
+        env = e.Environment(self.environment_config(params), seed, stopping=self.stopping_criteria(params))
+        env.run()
+        return self.get_result(env)
+
+    def run_mean_field(self, params, seed):
+        env = mf.MeanFieldEnvironment(self.environment_config(params), seed, stopping=self.stopping_criteria(params), stochastic=True)
+        env.run()
+        return self.get_result(env)
+
+    def run_batch(self, params, seeds):
+        batch = b.BatchEnvironment(self.environment_config(params), seeds, stopping=functools.partial(self.stopping_criteria, params))
+        batch.run()
+        return [self.get_result(replicate) for replicate in batch.replicates]
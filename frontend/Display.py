@@ -0,0 +1,26 @@
+# Size in pixels of the longest side of the window
+WINDOW_SIZE = 1000
+DEPTH = 0
+FLAGS = 0
+# Frames drawn per second, the simulation speed does not depend on it
+FRAME_RATE = 60
+
+
+def get_square_size(grid_size):
+    """
+    Size in pixels of each square of the grid, so the grid fits the window
+    params:
+      grid_size: (List : int) # col, # row
+    """
+    return WINDOW_SIZE / max(grid_size)
+
+
+def get_display(grid_size):
+    """
+    Window size in pixels for a grid
+    params:
+      grid_size: (List : int) # col, # row
+    return: (Tuple : float) width, height
+    """
+    square_size = get_square_size(grid_size)
+    return grid_size[0] * square_size, grid_size[1] * square_size
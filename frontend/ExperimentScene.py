@@ -1,65 +1,168 @@
+import time
+import numpy as np
 import pygame
 from frontend.Scene import Scene
-import main as m
+import frontend.Display as d
+
+# Simulation ticks in one second of real time at speed 1 (the hold time of 2 * 60 * 100 ticks is two minutes)
+REAL_TIME_TICKS = 100
+# Share of each frame's period the simulation may use, the rest is left for rendering
+UPDATE_SHARE = 0.5
+# Longest a frame may spend advancing the simulation, ticks still owed after it are skipped
+MAX_UPDATE_TIME = UPDATE_SHARE / d.FRAME_RATE
+# Slowest and fastest speed, as multiples of real time
+MIN_SPEED = 1 / 16
+MAX_SPEED = 4096
+# Colour of each square colour and robot state indicator: none, colour 1, colour 2
+COLOURS = np.array([(0, 0, 0), (255, 153, 102), (102, 179, 255)], dtype=np.uint8)
+ROBOT_COLOUR = (0, 0, 0)
+# Above this many robots redrawing and updating the whole display is cheaper than doing it robot by robot
+MAX_DIRTY_RECTS = 2000
 
 class ExperimentScene(Scene):
 	def __init__(self, environment):
 		super().__init__()
 		self.env = environment
-		self.square_rects = self.create_grid_squares(m.SQUARE_SIZE)
+		self.square_size = d.get_square_size(self.env.grid_size)
+		self.display_size = tuple(round(size) for size in d.get_display(self.env.grid_size))
+		# Pre-rendered grid, redrawn only when env.grid_version changes
+		self.grid_surface = None
+		self.grid_version = None
+		# One sprite per decision state, and the rects robots were drawn at in the last frame
+		self.robot_radius = self.square_size * 3 / 10
+		self.robot_sprites = self.create_robot_sprites()
+		self.robot_rects = []
 		self.exp_generator = self.env.run_for_visual()
+		# Speed of the simulation as a multiple of real time, independent of the frame rate
+		self.speed = 1
+		self.paused = False
+		self.finished = False
+		# Ticks owed to the simulation but not yet run, carried between frames
+		self.owed_ticks = 0
+		self.last_update = time.perf_counter()
+		self.last_caption = 0
 
 	def render(self, screen):
-		self.render_grid(screen)
-		self.render_robots(screen)
+		"""
+		Draw the latest state. Only the parts of the screen under the robots change between frames
+		unless the grid has changed.
+		return: (List : pygame.Rect) areas of the screen that changed, None if all of it did
+		"""
+		full = self.render_grid(screen)
+		dirty = self.render_robots(screen)
+		if full or len(dirty) > MAX_DIRTY_RECTS:
+			return None
+		return dirty
 
 	def update(self):
-		next(self.exp_generator)
+		"""
+		Advance the simulation by as many ticks as real time and the speed call for since the last frame.
+		If they do not fit in MAX_UPDATE_TIME the rest are skipped, so the display keeps its frame rate
+		and always shows the latest state.
+		"""
+		now = time.perf_counter()
+		elapsed, self.last_update = now - self.last_update, now
+		if not self.paused and not self.finished:
+			self.owed_ticks += elapsed * self.speed * REAL_TIME_TICKS / self.env.interval
+			ticks = int(self.owed_ticks)
+			self.owed_ticks -= ticks
+			deadline = now + MAX_UPDATE_TIME
+			for _ in range(ticks):
+				if not self.step():
+					break
+				if time.perf_counter() > deadline:
+					self.owed_ticks = 0
+					break
+		if now - self.last_caption > 0.25:
+			self.last_caption = now
+			pygame.display.set_caption(self.get_caption())
+
+	def step(self):
+		"""
+		Advance the simulation by one tick
+		return: (bool) False once the experiment has ended
+		"""
+		try:
+			next(self.exp_generator)
+		except StopIteration:
+			self.finished = True
+		return not self.finished
 
 	def handle_events(self, events):
-		pass
+		"""
+		Space: pause or resume, right arrow or s: step one tick while paused,
+		up arrow or +: double the speed, down arrow or -: halve the speed
+		"""
+		for event in events:
+			if event.type != pygame.KEYDOWN:
+				continue
+			if event.key == pygame.K_SPACE:
+				self.paused = not self.paused
+				self.owed_ticks = 0
+			elif event.key in (pygame.K_RIGHT, pygame.K_s) and self.paused:
+				self.step()
+			elif event.key in (pygame.K_UP, pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+				self.speed = min(self.speed * 2, MAX_SPEED)
+			elif event.key in (pygame.K_DOWN, pygame.K_MINUS, pygame.K_KP_MINUS):
+				self.speed = max(self.speed / 2, MIN_SPEED)
+
+	def get_caption(self):
+		status = "finished" if self.finished else "paused" if self.paused else f"{self.speed:g}x"
+		return f"Experiment - time {self.env.time:g} - {status} (space: pause, right: step, up/down: speed)"
 	
-	def create_grid_squares(self, square_size):
+	def create_robot_sprites(self):
 		"""
-		Create rects for each square in the board
-		params:
-			square_size: (int) size of each square on the board
-		return: (2D list of pygame.Rects)
-		"""
-		board = [[0 for col in range(self.env.grid_size[0])] for row in range(self.env.grid_size[1])]
-		for row in range(self.env.grid_size[1]):
-			y_pos = row * square_size
-			for col in range(self.env.grid_size[0]):
-				x_pos = col * square_size
-				board[row][col] = pygame.Rect((x_pos, y_pos), (square_size, square_size))
-		return board
+		Pre-render a robot in each decision state: a black circle with a dot of its colour
+		return: (List : Surface) sprite of each decision state
+		"""
+		size = int(2 * self.robot_radius) + 2
+		centre = (size / 2, size / 2)
+		sprites = []
+		for state, colour in enumerate(COLOURS):
+			sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+			pygame.draw.circle(sprite, ROBOT_COLOUR, centre, self.robot_radius)
+			# State indicator
+			if state != 0:
+				pygame.draw.circle(sprite, colour, centre, self.square_size * 1 / 10)
+			sprites.append(sprite)
+		return sprites
+
+	def create_grid_surface(self):
+		"""
+		Render the grid into a Surface the size of the display, one pixel per square scaled up
+		return: (Surface)
+		"""
+		pixels = COLOURS[self.env.grid].swapaxes(0, 1)
+		return pygame.transform.scale(pygame.surfarray.make_surface(pixels), self.display_size)
 
 	def render_grid(self, screen):
 		"""
-		To be called in the scene's render function to render the grid.
+		To be called in the scene's render function to render the grid. The whole grid is only drawn
+		when it has changed (or there are too many robots to erase one by one), otherwise the robots of the
+		last frame are erased by redrawing the grid under them.
 		params:
 			screen: (Surface) The Surface to draw to
-			square_rects: (2D array of pygame.Rect's) Squares to draw
-		"""
-		for row in range(self.env.grid_size[1]):
-			for col in range(self.env.grid_size[0]):
-				if self.env.grid[row][col] == 1:
-					pygame.draw.rect(screen, (255,153,102), self.square_rects[row][col])
-				elif self.env.grid[row][col] == 2:
-					pygame.draw.rect(screen, (102,179,255), self.square_rects[row][col])
+		return: (bool) True if the whole grid was drawn
+		"""
+		if self.grid_version != self.env.grid_version or self.grid_surface is None:
+			self.grid_surface = self.create_grid_surface()
+			self.grid_version = self.env.grid_version
+		elif len(self.robot_rects) <= MAX_DIRTY_RECTS:
+			screen.blits([(self.grid_surface, rect, rect) for rect in self.robot_rects], doreturn=False)
+			return False
+		screen.blit(self.grid_surface, (0, 0))
+		return True
 
 	def render_robots(self, screen):
 		"""
-		Draws Robots on the board. To be called in the scene's render function after render_board.
+		Draws Robots on the board. To be called in the scene's render function after render_grid.
 		params:
 			screen: (Surface) The Surface to draw to
-			robots: (List : Robot) Robots in the experiment
-			square_size: (int) size of each square on the board
+		return: (List : pygame.Rect) areas the robots were drawn at in this frame and the last
 		"""
-		for robot in self.env.robots:
-			pygame.draw.circle(screen, (0,0,0), (robot.position[0] * m.SQUARE_SIZE, robot.position[1] * m.SQUARE_SIZE), m.SQUARE_SIZE * 3 / 10)
-			# State indicator
-			if robot.decision_state == 1:
-				pygame.draw.circle(screen, (255,153,102), (robot.position[0] * m.SQUARE_SIZE, robot.position[1] * m.SQUARE_SIZE), m.SQUARE_SIZE * 1 / 10)
-			elif robot.decision_state == 2:
-				pygame.draw.circle(screen, (102,179,255), (robot.position[0] * m.SQUARE_SIZE, robot.position[1] * m.SQUARE_SIZE), m.SQUARE_SIZE * 1 / 10)
+		corners = self.env.get_robot_positions() * self.square_size - self.robot_sprites[0].get_width() / 2
+		states = self.env.get_robot_decision_states()
+		rects = screen.blits([(self.robot_sprites[state], (x, y)) for (x, y), state in zip(corners.tolist(), states.tolist())])
+		dirty = self.robot_rects + rects
+		self.robot_rects = rects
+		return dirty
@@ -0,0 +1,121 @@
+import argparse
+import os
+import shutil
+import subprocess
+import experiment_objects.Trajectory as t
+
+
+class PlaybackEnvironment:
+    """
+    Stands in for an Environment in ExperimentScene, showing the frames of a trajectory file.
+    Each step of run_for_visual moves to the next frame.
+    """
+    def __init__(self, path) -> None:
+        self.frames, grids = t.read_trajectory(path)
+        self.grids = {int(version): grid for version, grid in zip(grids["grid_version"], grids["grid"])}
+        rows, cols = grids["grid"].shape[1:]
+        self.grid_size = (cols, rows)
+        # Time between frames, so ExperimentScene's speed is still a multiple of real time
+        self.interval = float(self.frames["time"][1] - self.frames["time"][0]) if len(self.frames) > 1 else 1
+        self.show(0)
+
+    def show(self, frame):
+        """
+        Move to a frame of the trajectory
+        """
+        self.frame = frame
+        self.time = float(self.frames["time"][frame])
+        self.grid_version = int(self.frames["grid_version"][frame])
+        self.grid = self.grids[self.grid_version]
+
+    def run_for_visual(self):
+        for frame in range(self.frame + 1, len(self.frames)):
+            self.show(frame)
+            yield None
+
+    def get_robot_positions(self):
+        return self.frames["position"][self.frame]
+
+    def get_robot_decision_states(self):
+        return self.frames["decision_state"][self.frame]
+
+
+def render_trajectory(path, directory=None, video=None, every=1, fps=30):
+    """
+    Render a trajectory file off-screen with ExperimentScene.render, to PNG frames and/or a video.
+    Needs no display.
+    params:
+      path: (str) file written by Trajectory.record_trajectory
+      directory: (str) directory to save each frame to as a PNG
+      video: (str) video file, an animated GIF if it ends with .gif, otherwise encoded with ffmpeg
+      every: (int) render every every-th frame
+      fps: (int) frames per second of the video
+    return: (int) number of frames rendered
+    """
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import pygame
+    from frontend.ExperimentScene import ExperimentScene
+    environment = PlaybackEnvironment(path)
+    scene = ExperimentScene(environment)
+    screen = pygame.Surface(scene.display_size)
+    if directory is not None:
+        os.makedirs(directory, exist_ok=True)
+    gif_frames = []
+    encoder = None
+    if video is not None and not video.endswith(".gif"):
+        if shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg is needed to write video other than .gif")
+        width, height = scene.display_size
+        encoder = subprocess.Popen(["ffmpeg", "-y", "-loglevel", "error", "-f", "rawvideo", "-pix_fmt", "rgb24", "-s", f"{width}x{height}",
+                                    "-r", str(fps), "-i", "-", "-pix_fmt", "yuv420p", video], stdin=subprocess.PIPE)
+    frames = range(0, len(environment.frames), every)
+    try:
+        for frame in frames:
+            environment.show(frame)
+            scene.render(screen)
+            if directory is not None:
+                pygame.image.save(screen, os.path.join(directory, f"frame_{frame:06d}.png"))
+            if encoder is not None:
+                encoder.stdin.write(pygame.image.tobytes(screen, "RGB"))
+            elif video is not None:
+                from PIL import Image
+                gif_frames.append(Image.frombytes("RGB", scene.display_size, pygame.image.tobytes(screen, "RGB")))
+    finally:
+        if encoder is not None:
+            encoder.stdin.close()
+            encoder.wait()
+    if gif_frames:
+        gif_frames[0].save(video, save_all=True, append_images=gif_frames[1:], duration=1000 / fps, loop=0)
+    return len(frames)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record runs headless and render them offline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="run a simulation without a display, writing a trajectory file")
+    record_parser.add_argument("path")
+    record_parser.add_argument("--stride", type=int, default=t.DEFAULT_STRIDE, help="ticks between frames")
+    record_parser.add_argument("--engine", default="robot")
+    record_parser.add_argument("--length", type=int, help="experiment length, the default configuration's if not given")
+    record_parser.add_argument("--seed", type=int)
+    render_parser = subparsers.add_parser("render", help="render a trajectory file to PNG frames and/or a video")
+    render_parser.add_argument("path")
+    render_parser.add_argument("--frames", help="directory to save PNG frames to")
+    render_parser.add_argument("--video", help="video file, .gif or anything ffmpeg can write")
+    render_parser.add_argument("--every", type=int, default=1, help="render every n-th frame")
+    render_parser.add_argument("--fps", type=int, default=30)
+    args = parser.parse_args()
+    if args.command == "record":
+        import dataclasses
+        import experiment_objects.Config as c
+        import experiment_objects.Environment as e
+        config = c.EnvironmentConfig(engine=args.engine)
+        if args.length is not None:
+            config = dataclasses.replace(config, experiment_length=args.length)
+        print(f"{t.record_trajectory(e.Environment(config, args.seed), args.path, args.stride)} frames written to {args.path}")
+    else:
+        print(f"{render_trajectory(args.path, args.frames, args.video, args.every, args.fps)} frames rendered")
+
+
+if __name__ == "__main__":
+    main()
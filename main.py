@@ -1,51 +1,35 @@
-import pygame
-import pandas as pd
-from pygame.locals import *
+from dataclasses import replace
 import experiment_objects.Environment as e
-import frontend.SceneManager as sm
-import experiment_objects.Robot as r
+import experiment_objects.Config as c
+import frontend.Display as d
 
 
-X_SQUARES = 20 # (number of cols)
-Y_SQUARES = 40 # (number of rows)
-COLOUR_PROB = [0.8, 0.2]
-ENV_INTERVAL = 1
-GRID_SIZE = [X_SQUARES, Y_SQUARES]
-EXPERIMENT_LENGTH = 100000
-NUM_ROBOTS = 50
+# The display runs the defaults of Config with slower robots and a gradual change
+VISUAL_CONFIG = replace(c.EnvironmentConfig(), robot=replace(c.RobotConfig(), speed=0.002), gradual_change=c.GradualChange(0.5, 10000))
 
-# Robot parameters
-UPDATE_INTERVAL = 200
-SAMPLE_CYCLE_LENGTH = 15
-SAMPLE_INTERVAL = 400
-SPEED = 0.002
-COMMUNICATION_RANGE = 2
-POSITION = None#[0,0]
-SAMPLE_COLOUR = None
-DECISION_STATE = 2
-COMMITED_ESTIMATION = 0.8
-
-SQUARE_SIZE = 1000 / max(X_SQUARES, Y_SQUARES)
-WIN_WIDTH = X_SQUARES * SQUARE_SIZE
-WIN_HEIGHT = Y_SQUARES * SQUARE_SIZE
+SQUARE_SIZE = d.get_square_size(VISUAL_CONFIG.grid_size)
+WIN_WIDTH, WIN_HEIGHT = d.get_display(VISUAL_CONFIG.grid_size)
 DISPLAY = (WIN_WIDTH, WIN_HEIGHT)
-DEPTH = 0
-FLAGS = 0
+DEPTH = d.DEPTH
+FLAGS = d.FLAGS
 
 
 def visualise():
+    # The GUI is only loaded here, so headless runs never import pygame
+    import pygame
+    from pygame.locals import QUIT
+    import frontend.SceneManager as sm
     pygame.init()
     screen = pygame.display.set_mode(DISPLAY, DEPTH, FLAGS)
     pygame.display.set_caption("Experiment")
     timer = pygame.time.Clock()
     running = True
 
-    ROBOT_PARAMS = [UPDATE_INTERVAL, SAMPLE_CYCLE_LENGTH, SAMPLE_INTERVAL, SPEED, COMMUNICATION_RANGE, ENV_INTERVAL, GRID_SIZE, SAMPLE_COLOUR, DECISION_STATE, COMMITED_ESTIMATION, POSITION]
-    env = e.Environment([X_SQUARES,Y_SQUARES], COLOUR_PROB, NUM_ROBOTS, ROBOT_PARAMS, ENV_INTERVAL, EXPERIMENT_LENGTH, [0.5, 10000])
+    env = e.Environment(VISUAL_CONFIG)
     manager = sm.SceneMananger(env)
 
     while running:
-        timer.tick(60)
+        timer.tick(d.FRAME_RATE)
 
         if pygame.event.get(QUIT):
             running = False
@@ -53,26 +37,32 @@ def visualise():
         
         manager.scene.handle_events(pygame.event.get())
         manager.scene.update()
-        manager.scene.render(screen)
-        pygame.display.flip()
+        dirty = manager.scene.render(screen)
+        if dirty is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(dirty)
     
     return 0
 
 
 import experiments.experiment1 as e1
 def experiment1():
-    print(e1.run_repeat_simulation(30))
+    print(e1.EXPERIMENT.run_repeat_simulation(30, e1.SEED))
 
 import experiments.experiment2 as e2
+import experiments.sweep as sweep
+import experiments.cache as cache
+import experiments.storage as storage
 
 def experiment2():
-    for c_range in [1,2,3,4,5,6,7,8,9,15,25,45]:#[0.5, 1.5, 2.5, 3.5, 4.5, 5.5, 6.5, 7.5, 8.5, 25, 45]: 
-        results = e2.run_repeat_simulation(20, c_range)
-        df = pd.DataFrame(results, columns=["adapted", "adaptation_time", "state_history", "time_history", "color_history"])
-        df.to_csv(f"./results/exp2/sample_len/exp2_{c_range}.csv")
+    # Results of each sample length are written to its directory as replicates finish, a re-launched
+    # sweep only runs the replicates missing from the cache
+    writer = storage.NpyWriter("./results/exp2/sample_len/exp2_{sample_len}", e2.RESULT_COLUMNS)
+    e2.EXPERIMENT.run_sweep(20, e2.SEED, on_result=writer, cache=cache.ResultCache())
 
 def main():
-    env = e.Environment([X_SQUARES,Y_SQUARES], COLOUR_PROB, None, 1, 15000)
+    env = e.Environment(c.EnvironmentConfig(experiment_length=15000))
     env.run()
     return 0
 
@@ -0,0 +1,44 @@
+import pytest
+import experiment_objects.Config as c
+import experiment_objects.Environment as e
+import experiment_objects.Kernels as k
+
+NUM_TICKS = 3000
+
+
+@pytest.fixture(params=["numba", "python"])
+def kernels(request, monkeypatch):
+    """
+    Run the kernels compiled with Numba, or as the pure-Python functions they are compiled from
+    """
+    if request.param == "numba":
+        if k.njit is None:
+            pytest.skip("numba is not installed")
+    else:
+        for name, function in vars(k).copy().items():
+            if hasattr(function, "py_func"):
+                monkeypatch.setattr(k, name, function.py_func)
+    return request.param
+
+
+@pytest.mark.parametrize("communication_range", [0, 2, 6, 45])
+def test_kernels_match_robot(kernels, communication_range):
+    robot_config = c.RobotConfig(communication_range=communication_range)
+    environment = e.Environment(c.EnvironmentConfig(robot=robot_config, engine="robot"), 0)
+    assert k.check_parity(environment, NUM_TICKS) is None
+
+
+def test_cell_list_holds_every_robot(kernels):
+    config = c.EnvironmentConfig(engine="compiled")
+    environment = e.Environment(config, 0)
+    for _ in range(100):
+        environment.step()
+    swarm = environment.swarm
+    for i, (x, y) in enumerate(swarm.position):
+        assert swarm.cell_links[2, i] == k.cell_of(x, y, swarm.cell_size, swarm.num_cols, swarm.num_rows)
+    members = []
+    for head in swarm.cell_head:
+        while head != -1:
+            members.append(int(head))
+            head = swarm.cell_links[0, head]
+    assert sorted(members) == list(range(config.num_robots))
@@ -0,0 +1,37 @@
+from dataclasses import replace
+import numpy as np
+import experiment_objects.Config as c
+import experiment_objects.Environment as e
+import experiment_objects.Profiler as pr
+import experiment_objects.Checkpoint as ck
+
+CONFIG = c.EnvironmentConfig(experiment_length=4000, robot=c.RobotConfig(communication_range=4))
+
+
+def run(engine, seed=1, profiler=None):
+    env = e.Environment(replace(CONFIG, engine=engine), seed, stopping=[], profiler=profiler)
+    env.run()
+    return env
+
+
+def test_compact_robot_has_no_dict():
+    env = e.Environment(c.EnvironmentConfig(engine="compact"), 1)
+    assert all(not hasattr(robot, "__dict__") for robot in env.robots)
+
+
+def test_compact_robot_matches_robot():
+    robot, compact = run("robot"), run("compact")
+    assert compact.state_history == robot.state_history
+    assert np.array_equal(compact.get_robot_positions(), robot.get_robot_positions())
+    for a, b in zip(robot.robots, compact.robots):
+        assert [getattr(a, name) for name in ck.ROBOT_ATTRIBUTES] == [getattr(b, name) for name in ck.ROBOT_ATTRIBUTES]
+
+
+def test_profiled_compact_robot():
+    profiler = pr.Profiler()
+    env = run("compact", profiler=profiler)
+    report = profiler.report()
+    assert not hasattr(env.robots[0], "__dict__")
+    assert report["routines"]["Robot.step_robot"]["calls"] == CONFIG.num_robots * CONFIG.experiment_length
+    assert report["broadcasts"] > 0
+    assert env.state_history == run("compact").state_history